@@ -0,0 +1,70 @@
+"""Compares the generated decoders with the generic `model_factory` decoding.
+
+Run with: uv run python scripts/benchmark_decoders.py
+"""
+
+import contextlib
+import io
+import json
+import time
+from dataclasses import fields
+from pathlib import Path
+
+from sounds import decoders
+from sounds.parser import parse_container, parse_menu, parse_schedule
+
+FIXTURES = Path(__file__).parent.parent / "tests" / "json"
+CASES = {
+    "menu.json": parse_menu,
+    "podcasts.json": parse_menu,
+    "news.json": parse_container,
+    "container.json": parse_container,
+    "schedule.json": parse_schedule,
+    "stations.json": parse_container,
+    "segments.json": parse_container,
+}
+
+
+def generic_decoder(model, validate=False):
+    """The decoding `model_factory` used before generated decoders."""
+    if model is None:
+        raise TypeError("Not a dataclass")
+    required_fields = {f.name for f in fields(model)}
+
+    def decode(node):
+        return model(**{k: v for k, v in node.items() if k in required_fields})
+
+    return decode
+
+
+def run(get_decoder, number: int) -> dict[str, float]:
+    decoders.get_decoder = get_decoder
+    results = {}
+    for filename, parse in CASES.items():
+        payload = json.loads((FIXTURES / filename).read_text())
+        timings = []
+        for _ in range(number):
+            # The parsers replace nested dicts with models, so parse a fresh copy
+            node = json.loads(json.dumps(payload))
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                parse(node)
+                timings.append(time.perf_counter() - start)
+        results[filename] = min(timings)
+    return results
+
+
+def main(number: int = 50) -> None:
+    generated = decoders.get_decoder
+    baseline = run(generic_decoder, number)
+    specialised = run(generated, number)
+    decoders.get_decoder = generated
+
+    print(f"{'fixture':<20}{'generic ms':>12}{'generated ms':>14}{'speedup':>10}")
+    for filename in CASES:
+        before, after = baseline[filename] * 1000, specialised[filename] * 1000
+        print(f"{filename:<20}{before:>12.2f}{after:>14.2f}{before / after:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Artwork for music segments, looked up from Spotify.
+
+Segments often have no image but link to the track on Spotify, whose oEmbed
+endpoint gives its album art. Lookups go through the client's shared session,
+run concurrently, and are cached by Spotify URI, including tracks with no
+artwork so they aren't looked up again for a while. The cache can be saved to
+a file to last between sessions.
+"""
+
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Iterable
+from urllib.parse import quote, urlparse
+
+from sounds import constants
+from sounds.base import Base
+from sounds.constants import URLs
+from sounds.exceptions import NotFoundError, SoundsException
+from sounds.models import Segment
+from sounds.utils import run_concurrently
+
+
+def spotify_uri(url: str) -> str:
+    """The Spotify URI of an open.spotify.com link, e.g. spotify:track:abc123."""
+    if url.startswith("spotify:"):
+        return url
+    parts = [part for part in urlparse(url).path.split("/") if part]
+    # Localised links have a leading intl-xx segment
+    if parts and parts[0].startswith("intl-"):
+        parts = parts[1:]
+    if len(parts) >= 2:
+        return f"spotify:{parts[0]}:{parts[1]}"
+    return url
+
+
+class SpotifyArtwork(Base):
+    """Looks up Spotify artwork, caching it by Spotify URI."""
+
+    def __init__(self, *args, cache_file: str | Path | None = None, **kwargs):
+        """
+        :param cache_file: Where the cache is loaded from and saved to, if anywhere
+        """
+        super().__init__(*args, **kwargs)
+        self.cache_file = Path(cache_file) if cache_file else None
+        # Artwork by Spotify URI, which doesn't change
+        self._images: dict[str, str] = {}
+        # Tracks with no artwork, and the UNIX timestamp to look them up again after
+        self._misses: dict[str, float] = {}
+        self._fetches: dict[str, asyncio.Future[str | None]] = {}
+        self._changed = False
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self._images)
+
+    async def get_image(self, spotify_url: str) -> str | None:
+        """Gets the artwork of a Spotify track, album or playlist, if it has any."""
+        uri = spotify_uri(spotify_url)
+        if uri in self._images:
+            return self._images[uri]
+        if self._misses.get(uri, 0) > time.time():
+            return None
+        if uri not in self._fetches:
+            # Shared by concurrent lookups, and shielded so a cancelled one
+            # doesn't cancel it for the others
+            future = asyncio.ensure_future(self._fetch(spotify_url, uri))
+            self._fetches[uri] = future
+            future.add_done_callback(lambda _: self._fetches.pop(uri, None))
+        return await asyncio.shield(self._fetches[uri])
+
+    async def add_images(
+        self,
+        segments: Iterable[Segment],
+        max_concurrent: int = constants.SPOTIFY_ARTWORK_MAX_CONCURRENT,
+    ) -> None:
+        """Fills in the image of each segment without one, from its Spotify link."""
+        missing = [
+            segment
+            for segment in segments
+            if not segment.image_url and segment.spotify_url
+        ]
+        results = await run_concurrently(
+            lambda segment: self.get_image(segment.spotify_url),
+            missing,
+            limit=max_concurrent,
+        )
+        for segment, result in zip(missing, results):
+            if isinstance(result, Exception):
+                self.logger.warning(
+                    f"Failed to get artwork for {segment.spotify_url}: {result}"
+                )
+            elif result:
+                segment.image_url = result
+
+    def load(self) -> None:
+        if not self.cache_file or not self.cache_file.exists():
+            return
+        try:
+            cached = json.loads(self.cache_file.read_text())
+            self._images.update(cached.get("images") or {})
+            self._misses.update(cached.get("misses") or {})
+        except OSError, ValueError, AttributeError:
+            self.logger.warning(f"Ignoring unreadable artwork cache {self.cache_file}")
+
+    def save(self) -> None:
+        """Saves the cache to `cache_file`, if anything has been looked up since."""
+        if not self.cache_file or not self._changed:
+            return
+        now = time.time()
+        misses = {uri: until for uri, until in self._misses.items() if until > now}
+        try:
+            self.cache_file.write_text(
+                json.dumps({"images": self._images, "misses": misses})
+            )
+            self._changed = False
+        except OSError as e:
+            self.logger.warning(f"Failed to save artwork cache: {e}")
+
+    async def _fetch(self, spotify_url: str, uri: str) -> str | None:
+        try:
+            json_resp = await self._get_json(
+                url_template=URLs.SPOTIFY_OEMBED,
+                url_args={"url": quote(spotify_url, safe="")},
+            )
+        except NotFoundError:
+            # Unknown to Spotify
+            json_resp = {}
+        except (SoundsException, TimeoutError) as e:
+            # Not a miss, so don't remember it
+            self.logger.warning(f"Failed to get artwork for {spotify_url}: {e}")
+            return None
+
+        image = json_resp.get("thumbnail_url") if isinstance(json_resp, dict) else None
+        self._changed = True
+        if image:
+            self._images[uri] = image
+            self._misses.pop(uri, None)
+        else:
+            self._misses[uri] = time.time() + constants.SPOTIFY_ARTWORK_MISS_TTL
+        return image
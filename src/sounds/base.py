@@ -1,20 +1,27 @@
+import asyncio
+import contextlib
 import json
 import logging
 import os
 from abc import ABC
-from typing import Literal, Optional
+from typing import AsyncIterator, Callable, Literal, Optional
 
 import aiohttp
 
+from sounds import constants
 from sounds.constants import FIXTURES_FOLDER, Fixtures, SignedInURLs, URLs
+from sounds.diff import ChangeFeed
 from sounds.exceptions import (
     APIResponseError,
     InvalidArgumentsError,
     NetworkError,
     NotFoundError,
+    ServerError,
     SoundsException,
     UnauthorisedError,
 )
+from sounds.identity import IdentityMap
+from sounds.pagination import paginate
 
 
 class Base(ABC):
@@ -28,6 +35,9 @@ class Base(ABC):
         logger: logging.Logger | None = None,
         timeout: Optional[aiohttp.ClientTimeout] = None,
         mock_session: bool = False,
+        identity_map: IdentityMap | None = None,
+        changes: ChangeFeed | None = None,
+        limiter: asyncio.Semaphore | None = None,
         *args,
         **kwargs,
     ):
@@ -38,6 +48,10 @@ class Base(ABC):
             self.logger = logging.getLogger(__name__)
         self._timeout = timeout or self.DEFAULT_TIMEOUT
         self.mock_session = mock_session
+        self.identity_map = identity_map
+        self.changes = changes
+        # Shared by all of a client's services to bound the requests in flight
+        self._limiter = limiter or contextlib.nullcontext()
 
     async def _make_request(
         self, method: Literal["GET"] | Literal["POST"], url: str, **kwargs
@@ -49,7 +63,8 @@ class Base(ABC):
             kwargs.setdefault("ssl", True)
             kwargs.setdefault("allow_redirects", True)
 
-            resp = await self._session.request(method, url, **kwargs)
+            async with self._limiter:
+                resp = await self._session.request(method, url, **kwargs)
 
             self.logger.debug(f"Response content type: {resp.content_type}")
             self.logger.debug(f"Response status: {resp.status}")
@@ -64,6 +79,8 @@ class Base(ABC):
                         message = json_resp["errors"][0]["message"]
                         if code == 401:
                             raise UnauthorisedError(message)
+                        elif code >= 500:
+                            raise ServerError(message)
                         else:
                             raise APIResponseError(message)
             return resp
@@ -119,8 +136,9 @@ class Base(ABC):
 
         try:
             self.logger.debug(f"Requesting URL {url}")
-            resp = await self._session.request(method="GET", url=url, **kwargs)
-            json_resp = await resp.json()
+            async with self._limiter:
+                resp = await self._session.request(method="GET", url=url, **kwargs)
+                json_resp = await resp.json()
 
             # Check if we got any errors in the API response
             if "errors" in json_resp.keys():
@@ -130,17 +148,41 @@ class Base(ABC):
                     raise UnauthorisedError(message)
                 elif code == 404:
                     raise NotFoundError(message)
+                elif code >= 500:
+                    raise ServerError(message)
                 else:
                     raise APIResponseError(message)
             return json_resp
         except aiohttp.ClientResponseError as e:
+            # Including an error page that isn't JSON
             if e.status == 401:
                 raise UnauthorisedError(e)
+            if e.status == 404:
+                raise NotFoundError(f"Request failed: {e}")
+            if e.status >= 500:
+                raise ServerError(f"Request failed: {e}")
             raise APIResponseError(f"Request failed: {e}")
         except aiohttp.ClientError as e:
             self.logger.error(f"HTTP request failed: {url} - {e}")
             raise SoundsException(f"Request failed: {e}")
 
+    def _get_pages[T](
+        self,
+        url_template: URLs | SignedInURLs,
+        url_args: dict,
+        parse_page: Callable[[dict], list[T]],
+        page_size: int = constants.PAGE_SIZE,
+    ) -> AsyncIterator[T]:
+        """Iterates over the items of a paged endpoint, whose template takes an offset and limit"""
+        return paginate(
+            lambda offset, limit: self._get_json(
+                url_template=url_template,
+                url_args={**url_args, "offset": offset, "limit": limit},
+            ),
+            parse_page,
+            page_size=page_size,
+        )
+
     async def _get_html(
         self,
         url: str | None = None,
@@ -156,10 +198,11 @@ class Base(ABC):
         self.logger.debug(f"Making HTTP {method} request to {url}")
 
         try:
-            resp = await self._session.request(method, url, **kwargs)
-            self.logger.debug(f"Response status: {resp.status}")
-            resp.raise_for_status()
-            return await resp.text()
+            async with self._limiter:
+                resp = await self._session.request(method, url, **kwargs)
+                self.logger.debug(f"Response status: {resp.status}")
+                resp.raise_for_status()
+                return await resp.text()
         except aiohttp.ClientResponseError as e:
             if e.status == 401:
                 raise UnauthorisedError(e)
@@ -167,3 +210,23 @@ class Base(ABC):
         except aiohttp.ClientError as e:
             self.logger.error(f"HTTP request failed: {method} {url} - {e}")
             raise SoundsException(f"Request failed: {e}")
+
+    async def _get_bytes(self, url: str, **kwargs) -> bytes:
+        """Gets a response body as bytes, e.g. a media segment"""
+        kwargs.setdefault("timeout", self._timeout)
+        kwargs.setdefault("ssl", True)
+        kwargs.setdefault("allow_redirects", True)
+        self.logger.debug(f"Making HTTP GET request to {url}")
+
+        try:
+            async with self._limiter:
+                resp = await self._session.request("GET", url, **kwargs)
+                resp.raise_for_status()
+                return await resp.read()
+        except aiohttp.ClientResponseError as e:
+            if e.status == 401:
+                raise UnauthorisedError(e)
+            raise APIResponseError(f"Request failed: {e}")
+        except aiohttp.ClientError as e:
+            self.logger.error(f"HTTP request failed: GET {url} - {e}")
+            raise SoundsException(f"Request failed: {e}")
@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable
+
+
+class RefreshingValue[T]:
+    """A value fetched by `loader` and cached until a time worked out from the value.
+
+    The first read waits for the value to load. Once loaded, reads always return
+    the cached value straight away, and a stale value is refreshed in the
+    background. Concurrent loads are shared rather than repeated.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], Awaitable[T]],
+        expires_at: Callable[[T], float],
+        logger: logging.Logger | None = None,
+        retry_after: float = 30,
+    ) -> None:
+        """
+        :param loader: Fetches a fresh value
+        :param expires_at: Given a freshly loaded value, returns the UNIX timestamp
+            at which it becomes stale
+        :param retry_after: Seconds to wait before retrying a failed background refresh
+        """
+        self._loader = loader
+        self._expires_at_for = expires_at
+        self.logger = logger or logging.getLogger(__name__)
+        self.retry_after = retry_after
+        self.expires_at = 0.0
+        self._value: T | None = None
+        self._loaded = False
+        self._task: asyncio.Task | None = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    @property
+    def is_stale(self) -> bool:
+        return time.time() >= self.expires_at
+
+    def peek(self) -> T | None:
+        """The cached value, if any, without loading or refreshing it."""
+        return self._value
+
+    async def get(self, refresh: bool = False) -> T:
+        """Gets the value, loading it if needed.
+
+        :param refresh: Wait for a fresh value rather than returning the cached one
+        """
+        if not self._loaded or refresh:
+            # Shielded, so a cancelled reader doesn't cancel the load for the others
+            return await asyncio.shield(self._start_refresh())
+        if self.is_stale:
+            self._start_refresh()
+        return self._value  # type: ignore[return-value]
+
+    def invalidate(self) -> None:
+        """Marks the value as stale, so the next read refreshes it."""
+        self.expires_at = 0.0
+
+    def clear(self) -> None:
+        """Forgets the value, so the next read waits for a fresh one."""
+        self._value = None
+        self._loaded = False
+        self.expires_at = 0.0
+
+    def _start_refresh(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._load())
+            self._task.add_done_callback(self._refreshed)
+        return self._task
+
+    async def _load(self) -> T:
+        value = await self._loader()
+        self._value = value
+        self._loaded = True
+        self.expires_at = self._expires_at_for(value)
+        return value
+
+    def _refreshed(self, task: asyncio.Task) -> None:
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            self.logger.warning(f"Failed to refresh cached value: {error}")
+            if self._loaded:
+                # Keep serving the previous value and try again later
+                self.expires_at = time.time() + self.retry_after
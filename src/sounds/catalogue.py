@@ -0,0 +1,210 @@
+"""The national and local station list, shared by the station and schedule services.
+
+The STATIONS payload embeds each station's current programme, so it is fetched
+and parsed once per programme change and every listing, lookup and current
+programme is answered from the same snapshot.
+"""
+
+import asyncio
+import itertools
+import time
+from typing import Any, Iterable
+
+from sounds import constants
+from sounds.base import Base
+from sounds.cache import RefreshingValue
+from sounds.constants import URLs
+from sounds.exceptions import SoundsException
+from sounds.models import LiveStation
+from sounds.parser import parse_node
+
+
+class StationIndex:
+    """The station catalogue, with each station keyed by everything it's known by.
+
+    Station ids don't always match network ids, e.g. bbc_radio_fourfm and
+    bbc_radio_four, so stations can be looked up by station id, URN, network id,
+    network key (e.g. radio4) or any of the network's service ids.
+    """
+
+    def __init__(
+        self, stations: list[LiveStation], networks: list[dict] | None = None
+    ) -> None:
+        """
+        :param stations: National and local stations
+        :param networks: Network nodes from the networks list, adding their ids,
+            keys and service ids as aliases
+        """
+        self.stations = stations
+        # UNIX timestamp, which programme progress is measured from
+        self.fetched_at = time.time()
+        self._by_key: dict[str, LiveStation] = {}
+
+        # Earlier keys win, so a station id is never shadowed by another's alias
+        for station in stations:
+            self._add(station.id, station)
+        for station in stations:
+            self._add(station.urn, station)
+        for station in stations:
+            if station.network:
+                self._add(station.network.id, station)
+                self._add(station.network.key, station)
+
+        for network in networks or []:
+            aliases = [network.get("id"), network.get("key"), *_service_ids(network)]
+            station = next(
+                (self._by_key[alias] for alias in aliases if alias in self._by_key),
+                None,
+            )
+            if station is not None:
+                for alias in aliases:
+                    self._add(alias, station)
+
+    def _add(self, key: Any, station: LiveStation) -> None:
+        if isinstance(key, str) and key:
+            self._by_key.setdefault(key, station)
+
+    def get(self, key: str) -> LiveStation | None:
+        """Gets a station by its id, URN, network id, network key or service id."""
+        return self._by_key.get(key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._by_key
+
+    def programme_start(self, key: str) -> float | None:
+        """The UNIX timestamp the station's current programme started at, if known."""
+        station = self.get(key)
+        progress = station.progress if station else None
+        if not progress or not isinstance(progress.get("value"), int):
+            return None
+        return self.fetched_at - progress["value"]
+
+    def __len__(self) -> int:
+        return len(self.stations)
+
+
+def _service_ids(network: dict) -> list[str]:
+    services = network.get("services") or []
+    if isinstance(services, dict):
+        services = list(services.values())
+    return [
+        service.get("id") if isinstance(service, dict) else service
+        for service in services
+    ]
+
+
+class StationCatalogue(Base):
+    """Owns the station list, refreshing it when a current programme ends."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._index: RefreshingValue[StationIndex] = RefreshingValue(
+            loader=self._fetch,
+            expires_at=self._expiry,
+            logger=self.logger,
+        )
+        # Network aliases rarely change, so they're only fetched once
+        self._networks: list[dict] | None = None
+
+    @property
+    def stations(self) -> list[LiveStation]:
+        """The cached national and local stations, without fetching them."""
+        index = self._index.peek()
+        return index.stations if index else []
+
+    @property
+    def cached_index(self) -> StationIndex | None:
+        """The cached station index, without fetching it."""
+        return self._index.peek()
+
+    @property
+    def expires_at(self) -> float:
+        """The UNIX timestamp at which the station list is next refreshed."""
+        return self._index.expires_at
+
+    async def get_index(self, refresh: bool = False) -> StationIndex:
+        """Gets the station index, fetching the station list if needed.
+
+        :param refresh: Wait for a fresh station list rather than using the cached one
+        """
+        return await self._index.get(refresh=refresh)
+
+    async def national_stations(self) -> list[LiveStation]:
+        index = await self.get_index()
+        return [station for station in index.stations if not station.local]
+
+    async def local_stations(self) -> list[LiveStation]:
+        index = await self.get_index()
+        return [station for station in index.stations if station.local]
+
+    async def current_programme(self, station_id: str) -> LiveStation | None:
+        """Gets a station, including details of the programme currently on air."""
+        index = await self.get_index()
+        return index.get(station_id)
+
+    async def current_programmes(
+        self, station_ids: Iterable[str]
+    ) -> dict[str, LiveStation | None]:
+        """Gets the current programme of each station, from one station list.
+
+        :return: Each station id mapped to its station, or None if it isn't found
+        """
+        index = await self.get_index()
+        return {station_id: index.get(station_id) for station_id in station_ids}
+
+    async def _fetch(self) -> StationIndex:
+        json_resp, networks = await asyncio.gather(
+            self._get_json(url_template=URLs.STATIONS), self._get_networks()
+        )
+        self.logger.log(constants.VERBOSE_LOG_LEVEL, "Getting station list...")
+        self.logger.log(constants.VERBOSE_LOG_LEVEL, json_resp)
+
+        # Append a key to assign if they are local stations or not
+        for station in json_resp["data"][0]["data"]:
+            station["local"] = False
+
+        for station in json_resp["data"][1]["data"]:
+            station["local"] = True
+
+        # Flatten the national and local stations sublists
+        stations = list(
+            itertools.chain(json_resp["data"][0]["data"], json_resp["data"][1]["data"])
+        )
+        stations_list = parse_node(stations, identity_map=self.identity_map)
+        if not isinstance(stations_list, list):
+            return StationIndex([], networks)
+        if self.changes is not None:
+            stations_list = self.changes.update("stations", stations_list)
+        return StationIndex(
+            [station for station in stations_list if isinstance(station, LiveStation)],
+            networks,
+        )
+
+    async def _get_networks(self) -> list[dict]:
+        """Gets the network nodes used for station aliases, or none if unavailable."""
+        if self._networks is None:
+            try:
+                json_resp = await self._get_json(url_template=URLs.NETWORKS_LIST)
+            except SoundsException as e:
+                # Stations can still be found by id, so don't fail the station list
+                self.logger.warning(f"Failed to get network aliases: {e}")
+                return []
+            nodes = json_resp.get("data") or json_resp.get("results") or []
+            self._networks = [node for node in nodes if isinstance(node, dict)]
+        return self._networks
+
+    def _expiry(self, index: StationIndex) -> float:
+        """Stations embed their current programme, so expire when the first one ends."""
+        now = index.fetched_at
+        remaining = [
+            station.duration["value"] - station.progress["value"]
+            for station in index.stations
+            if station.duration
+            and station.progress
+            and isinstance(station.duration.get("value"), int)
+            and isinstance(station.progress.get("value"), int)
+        ]
+        ttl = min(remaining, default=constants.STATIONS_MAX_TTL)
+        return now + min(
+            max(ttl, constants.STATIONS_MIN_TTL), constants.STATIONS_MAX_TTL
+        )
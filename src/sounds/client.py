@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import os
 from datetime import tzinfo
@@ -8,19 +9,30 @@ import pytz
 from colorlog import ColoredFormatter
 
 from sounds import constants
+from sounds.artwork import SpotifyArtwork
 from sounds.auth import AuthService
+from sounds.catalogue import StationCatalogue
+from sounds.diff import ChangeFeed
 from sounds.exceptions import InvalidArgumentsError
+from sounds.identity import IdentityMap
 from sounds.models import Menu, MenuItem, Segment, Station, Stream
+from sounds.now_playing import NowPlayingPoller
 from sounds.personal import MenuRecommendationOptions, PersonalService
+from sounds.play_reporter import PlayStatusReporter
+from sounds.programmes import ProgrammeScheduler
+from sounds.relay import HLSRelay
 from sounds.requests import RequestManager
 from sounds.schedule import ScheduleService
 from sounds.session import Session
 from sounds.stations import StationService
+from sounds.stream_pool import LiveStreamPool
 from sounds.streaming import StreamingService
 from sounds.user import UserService
 from sounds.utils import _get_data_dir
 
 COOKIE_FILE = Path(_get_data_dir(), "sounds_jar")
+ARTWORK_CACHE_FILE = Path(_get_data_dir(), "spotify_artwork.json")
+PLAY_QUEUE_FILE = Path(_get_data_dir(), "play_queue.json")
 
 
 class SoundsClient:
@@ -32,10 +44,13 @@ class SoundsClient:
         password: str | None = None,
         session: aiohttp.ClientSession | None = None,
         cookie_file: str | Path = COOKIE_FILE,
+        artwork_cache_file: str | Path | None = ARTWORK_CACHE_FILE,
+        play_queue_file: str | Path | None = PLAY_QUEUE_FILE,
         timezone: tzinfo | None = None,
         logger: logging.Logger | None = None,
         log_level: int | None = None,
         mock_session: bool = False,
+        max_concurrent_requests: int = constants.MAX_CONCURRENT_REQUESTS,
         **kwargs,
     ) -> None:
         if logger:
@@ -75,18 +90,34 @@ class SoundsClient:
             self.managing_session = False
         self.state.load()
 
+        # Shared by all services so each episode, show or station is parsed into one object
+        self.identity_map = IdentityMap()
+        # Subscribe to this to be told what changed when menus, stations or schedules are refetched
+        self.changes = ChangeFeed(logger=self.logger)
+        self.limiter = asyncio.Semaphore(max_concurrent_requests)
+
         service_kwargs = {
             "session": self._session,
             "timeout": self.timeout,
             "logger": self.logger,
             "mock_session": self.mock_session,
+            "identity_map": self.identity_map,
+            "changes": self.changes,
+            "limiter": self.limiter,
             **kwargs,
         }
 
         self.auth = AuthService(
             state=self.state, on_login_success=self.save_cookies, **service_kwargs
         )
-        self.schedules = ScheduleService(state=self.state, **service_kwargs)
+        # The station list, shared so it is only fetched once per programme change
+        self.catalogue = StationCatalogue(**service_kwargs)
+        self.schedules = ScheduleService(
+            catalogue=self.catalogue,
+            timezone=self.timezone,
+            state=self.state,
+            **service_kwargs,
+        )
         self.user = UserService(
             state=self.state,
             login_details_provided=(
@@ -102,7 +133,10 @@ class SoundsClient:
             username=self.username,
             password=self.password,
         )
+        # Spotify artwork for segments, saved to artwork_cache_file on close()
+        self.artwork = SpotifyArtwork(cache_file=artwork_cache_file, **service_kwargs)
         self.streaming = StreamingService(
+            artwork=self.artwork,
             auth=self.auth,
             requests=self.requests,
             schedules=self.schedules,
@@ -112,8 +146,27 @@ class SoundsClient:
         self.stations = StationService(
             streaming=self.streaming,
             schedules=self.schedules,
+            catalogue=self.catalogue,
             **service_kwargs,
         )
+        # Call start() or use as an async context manager, then track() stations
+        self.now_playing = NowPlayingPoller(
+            schedules=self.schedules, logger=self.logger
+        )
+        # Call watch() for stations, then iterate events() for programme changes
+        self.programmes = ProgrammeScheduler(
+            schedules=self.schedules, changes=self.changes, logger=self.logger
+        )
+        # report() play statuses, sent in batches once start()ed
+        self.play_reporter = PlayStatusReporter(
+            streaming=self.streaming, logger=self.logger, queue_file=play_queue_file
+        )
+        # Optional: start() it and play add_stream(url) to prefetch segments locally
+        self.relay = HLSRelay(
+            throughput=self.streaming.hls.throughput, **service_kwargs
+        )
+        # add() favourite stations and start() to keep their streams ready to play
+        self.stream_pool = LiveStreamPool(streaming=self.streaming, logger=self.logger)
         self.personal = PersonalService(
             auth=self.auth, requests=self.requests, **service_kwargs
         )
@@ -205,11 +258,16 @@ class SoundsClient:
         schedule = await self.stations.get_station_schedule_menu()
         if await self.user.is_uk_listener() and self.username and self.password:
             # UK listener, logged in, get menu from Sounds API
-            menu = await self.personal.get_uk_menu(recommendations=recommendations)
-            menu.sub_items.pop(0)
-            menu.sub_items.insert(0, listen_live)
-            menu.sub_items.insert(1, schedule)
-            menu.sub_items.insert(len(menu.sub_items), explore_all)
+            uk_menu = await self.personal.get_uk_menu(recommendations=recommendations)
+            # Build a new menu, the UK menu is kept up to date by the change feed
+            menu = Menu(
+                sub_items=[
+                    listen_live,
+                    schedule,
+                    *list(uk_menu.sub_items or [])[1:],
+                    explore_all,
+                ]
+            )
         elif await self.user.is_uk_listener():
             # UK listener, not logged in, construct UK menu
             menu = Menu(sub_items=[listen_live, schedule, explore_all])
@@ -229,6 +287,12 @@ class SoundsClient:
         self.logger.debug("Logged out.")
 
     async def close(self):
+        await self.now_playing.stop()
+        await self.programmes.close()
+        await self.stream_pool.stop()
+        await self.play_reporter.stop()
+        await self.relay.stop()
+        self.artwork.save()
         if self._session and self.managing_session:
             await self._session.close()
 
@@ -238,5 +302,6 @@ class SoundsClient:
     async def __aexit__(self, *args):
         if self.managing_session:
             self.logger.debug("Closed session")
-            await self.close()
+        # Also stops any background polling and timers
+        await self.close()
         self.state.save()
@@ -6,6 +6,66 @@ from typing import Final
 COOKIE_ID = "ckns_id"
 VERBOSE_LOG_LEVEL: Final[int] = 5
 FIXTURES_FOLDER = Path("tests", "json")
+# How long, in seconds, an already parsed item can be reused instead of refetched
+IDENTITY_MAP_MAX_AGE: Final[int] = 60
+# The most HTTP requests a client will have in flight at once
+MAX_CONCURRENT_REQUESTS: Final[int] = 10
+# Bounds, in seconds, on how long the station list is cached for
+STATIONS_MIN_TTL: Final[int] = 30
+STATIONS_MAX_TTL: Final[int] = 3600
+# How often, in seconds, now playing is polled and how many stations at once
+NOW_PLAYING_MIN_INTERVAL: Final[int] = 15
+NOW_PLAYING_MAX_INTERVAL: Final[int] = 120
+NOW_PLAYING_GRACE: Final[int] = 5
+NOW_PLAYING_MAX_CONCURRENT: Final[int] = 4
+# Seconds to wait before loading a schedule again for programme events when it
+# failed to load or had nothing left to air
+PROGRAMME_RELOAD_RETRY: Final[int] = 300
+# How many refreshed trees the change feed remembers to diff against
+CHANGE_FEED_MAX_TREES: Final[int] = 64
+# The longest, in seconds, a station's or episode's resolved stream is cached
+# for, and how long before its token or URLs expire it is resolved again
+LIVE_STREAM_MAX_TTL: Final[int] = 3600
+LIVE_STREAM_EXPIRY_MARGIN: Final[int] = 30
+# How long, in seconds, before a kept warm stream expires that it's renewed, and
+# the fraction of its lifetime renewals are randomly brought forward by
+STREAM_POOL_RENEW_MARGIN: Final[int] = 120
+STREAM_POOL_JITTER: Final[float] = 0.1
+# Days of schedule history available, and how many days are fetched at once
+SCHEDULE_HISTORY_DAYS: Final[int] = 30
+SCHEDULE_RANGE_MAX_CONCURRENT: Final[int] = 5
+# How many stations' schedules are fetched at once for a programme guide
+EPG_MAX_CONCURRENT_STATIONS: Final[int] = 4
+# Items asked for per page of a paged endpoint (the API's maximum), and how
+# many pages are fetched ahead while they're iterated over
+PAGE_SIZE: Final[int] = 100
+PAGE_PREFETCH: Final[int] = 2
+# How many Spotify artwork lookups run at once, and how long to wait before
+# looking up a track without artwork again
+SPOTIFY_ARTWORK_MAX_CONCURRENT: Final[int] = 8
+SPOTIFY_ARTWORK_MISS_TTL: Final[int] = 24 * 60 * 60
+# Seconds between sending queued play statuses
+PLAY_REPORT_INTERVAL: Final[int] = 30
+# Longest to keep an HLS playlist whose URL doesn't say when it expires
+HLS_PLAYLIST_MAX_TTL: Final[int] = 60 * 60
+# Longest to keep a DASH manifest whose URL doesn't say when it expires, unless
+# it's live and due an update sooner
+DASH_MANIFEST_MAX_TTL: Final[int] = 60 * 60
+# How many connections' playlists are fetched at once to measure their latency
+HLS_MAX_CONCURRENT_PROBES: Final[int] = 4
+# How much each new measurement moves the throughput and latency averages
+HLS_THROUGHPUT_WEIGHT: Final[float] = 0.3
+# The fraction of measured throughput a variant's bitrate may use
+HLS_THROUGHPUT_SAFETY: Final[float] = 0.8
+# The local stream relay's address, how many segments it fetches ahead of the
+# player and how many it keeps in memory
+RELAY_HOST: Final[str] = "127.0.0.1"
+RELAY_PREFETCH_SEGMENTS: Final[int] = 3
+RELAY_BUFFER_SEGMENTS: Final[int] = 16
+# The most segments kept for listeners in fan-out mode, however far behind
+RELAY_SHARED_BUFFER_SEGMENTS: Final[int] = 32
+# Seconds a relayed stream is kept after the player last asked for any of it
+RELAY_STREAM_IDLE_TIMEOUT: Final[float] = 300
 
 
 class Fixtures(Enum):
@@ -76,7 +136,9 @@ class URLs(Enum):
 
     # Episodes, programmes, series etc.
     PLAYABLE_ITEMS_CONTAINER = "https://rms.api.bbc.co.uk/v2/programmes/playable?container={pid}&sort=sequential"
+    PLAYABLE_ITEMS_CONTAINER_FULL = "https://rms.api.bbc.co.uk/v2/programmes/playable?container={pid}&sort=sequential&offset={offset}&limit={limit}"
     CATEGORY_LATEST = "https://rms.api.bbc.co.uk/v2/programmes/playable?category={category}&sort=-release_date&experience=domestic"
+    CATEGORY_LATEST_FULL = "https://rms.api.bbc.co.uk/v2/programmes/playable?category={category}&sort=-release_date&experience=domestic&offset={offset}&limit={limit}"
     CATEGORY_POPULAR = "https://rms.api.bbc.co.uk/v2/programmes/playable?category={category}&sort=popular&experience=domestic"
     BROADCAST = "https://rms.api.bbc.co.uk/v2/broadcasts/{pid}"
     PID = "https://rms.api.bbc.co.uk/v2/programmes/{pid}"
@@ -86,6 +148,10 @@ class URLs(Enum):
     COLLECTIONS_FULL = "https://rms.api.bbc.co.uk/v2/collections/{pid}/members/container?experience=domestic&offset={offset}&limit={limit}"
     COLLECTIONS = "https://rms.api.bbc.co.uk/v2/collections/{pid}/members/container?experience=domestic"
     CURATIONS = "https://rms.api.bbc.co.uk/v2/curations/{pid}/members/playable?experience=domestic"
+    CURATIONS_FULL = "https://rms.api.bbc.co.uk/v2/curations/{pid}/members/playable?experience=domestic&offset={offset}&limit={limit}"
+
+    # Artwork
+    SPOTIFY_OEMBED = "https://open.spotify.com/oembed?url={url}"
 
     # Menu, search, etc.
     EXPERIENCE_MENU = "https://rms.api.bbc.co.uk/v2/my/experience/inline/listen"
@@ -0,0 +1,373 @@
+"""DASH manifests, and picking a representation to play.
+
+A DASH manifest (MPD) lists representations of a stream at different
+bitrates, each with a segment template from which any segment's URL can be
+worked out. That lets a player fetch segments ahead without fetching the
+manifest again, so manifests are cached: on-demand ones until their URL
+expires and live ones for as long as their `minimumUpdatePeriod` allows.
+"""
+
+import math
+import re
+import time
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from datetime import UTC
+from datetime import datetime as dt
+from urllib.parse import urljoin
+
+from sounds import constants
+from sounds.base import Base
+from sounds.exceptions import InvalidFormatError, SoundsException
+from sounds.hls import ThroughputEstimator
+from sounds.utils import url_expiry
+
+# An ISO 8601 duration, as used for MPD times, e.g. PT3.84S or P1DT2H
+_DURATION = re.compile(
+    r"P(?:(?P<days>\d+(?:\.\d+)?)D)?"
+    r"(?:T(?:(?P<hours>\d+(?:\.\d+)?)H)?"
+    r"(?:(?P<minutes>\d+(?:\.\d+)?)M)?"
+    r"(?:(?P<seconds>\d+(?:\.\d+)?)S)?)?$"
+)
+# Identifiers in a segment template, with an optional printf width, e.g. $Number%06d$
+_TEMPLATE_IDENTIFIER = re.compile(
+    r"\$(RepresentationID|Number|Bandwidth|Time)(?:%0(\d+)d)?\$|\$\$"
+)
+
+
+@dataclass(frozen=True)
+class DASHSegmentTemplate:
+    """How a representation's segment URLs are made."""
+
+    media: str
+    initialization: str | None = None
+    # Units per second of `duration`
+    timescale: int = 1
+    # Length of each segment in `timescale` units
+    duration: int | None = None
+    start_number: int = 1
+
+    @property
+    def segment_duration(self) -> float | None:
+        """Seconds per segment, if the segments are all the same length."""
+        return self.duration / self.timescale if self.duration else None
+
+
+@dataclass(frozen=True)
+class DASHRepresentation:
+    """A version of the stream at one bitrate."""
+
+    id: str
+    # Peak bits per second
+    bandwidth: int
+    # What relative segment URLs are resolved against
+    base_url: str
+    codecs: tuple[str, ...] = ()
+    mime_type: str | None = None
+    template: DASHSegmentTemplate | None = None
+
+    @property
+    def initialization_url(self) -> str | None:
+        if self.template is None or self.template.initialization is None:
+            return None
+        return urljoin(self.base_url, self._fill(self.template.initialization))
+
+    def segment_url(self, number: int) -> str:
+        """
+        The URL of a segment by its number
+
+        :raises InvalidFormatError: If the representation has no segment template
+        """
+        if self.template is None:
+            raise InvalidFormatError(
+                f"Representation {self.id} has no segment template"
+            )
+        time_ = None
+        if self.template.duration:
+            time_ = (number - self.template.start_number) * self.template.duration
+        return urljoin(self.base_url, self._fill(self.template.media, number, time_))
+
+    def _fill(
+        self, template: str, number: int | None = None, time_: int | None = None
+    ) -> str:
+        values = {
+            "RepresentationID": self.id,
+            "Number": number,
+            "Bandwidth": self.bandwidth,
+            "Time": time_,
+        }
+
+        def replace(match: re.Match) -> str:
+            if match.group(0) == "$$":
+                return "$"
+            value = values[match.group(1)]
+            if value is None:
+                return match.group(0)
+            if match.group(2) and not isinstance(value, str):
+                return f"{value:0{match.group(2)}d}"
+            return str(value)
+
+        return _TEMPLATE_IDENTIFIER.sub(replace, template)
+
+
+@dataclass
+class DASHManifest:
+    """An MPD's representations and timing."""
+
+    url: str
+    representations: list[DASHRepresentation] = field(default_factory=list)
+    # A live manifest is dynamic and may change while playing
+    is_live: bool = False
+    # Seconds the manifest can be used for before fetching it again, if it changes
+    minimum_update_period: float | None = None
+    # UNIX timestamp the first segment of a live stream became available
+    availability_start_time: float | None = None
+    # Seconds from the availability start to the period start
+    period_start: float = 0.0
+    # Seconds, for on-demand streams
+    duration: float | None = None
+
+    def live_segment_number(
+        self, representation: DASHRepresentation, now: float | None = None
+    ) -> int | None:
+        """
+        The number of the newest segment a live stream has made available
+
+        :param now: UNIX timestamp, defaults to the current time
+        :return: None unless the manifest is live with fixed length segments
+        """
+        template = representation.template
+        if (
+            not self.is_live
+            or self.availability_start_time is None
+            or template is None
+            or not template.segment_duration
+        ):
+            return None
+        elapsed = (
+            (now if now is not None else time.time())
+            - self.availability_start_time
+            - self.period_start
+        )
+        # The newest segment is the last one to have finished
+        return template.start_number + max(
+            math.floor(elapsed / template.segment_duration) - 1, 0
+        )
+
+
+@dataclass
+class DASHSelection:
+    """The connection and representation picked to play."""
+
+    connection: dict
+    manifest: DASHManifest
+    representation: DASHRepresentation | None
+
+
+def parse_duration(duration: str) -> float:
+    """
+    Reads an ISO 8601 duration in seconds
+
+    :raises InvalidFormatError: If it isn't a duration
+    """
+    match = _DURATION.match(duration.strip())
+    if match is None:
+        raise InvalidFormatError(f"Invalid duration {duration}")
+    parts = {key: float(value) for key, value in match.groupdict(default="0").items()}
+    return (
+        parts["days"] * 86400
+        + parts["hours"] * 3600
+        + parts["minutes"] * 60
+        + parts["seconds"]
+    )
+
+
+def _local_name(element: ET.Element) -> str:
+    return element.tag.rpartition("}")[2]
+
+
+def _children(element: ET.Element, name: str) -> list[ET.Element]:
+    return [child for child in element if _local_name(child) == name]
+
+
+def _base_url(element: ET.Element, parent_url: str) -> str:
+    base_urls = _children(element, "BaseURL")
+    if base_urls and base_urls[0].text:
+        return urljoin(parent_url, base_urls[0].text.strip())
+    return parent_url
+
+
+def _template_attributes(element: ET.Element, inherited: dict) -> dict:
+    """A level's segment template attributes, over those of the levels above."""
+    templates = _children(element, "SegmentTemplate")
+    return {**inherited, **templates[0].attrib} if templates else inherited
+
+
+def _parse_template(attributes: dict) -> DASHSegmentTemplate | None:
+    if "media" not in attributes:
+        return None
+    duration = attributes.get("duration")
+    return DASHSegmentTemplate(
+        media=attributes["media"],
+        initialization=attributes.get("initialization"),
+        timescale=int(attributes.get("timescale", 1)),
+        duration=int(duration) if duration else None,
+        start_number=int(attributes.get("startNumber", 1)),
+    )
+
+
+def _codecs(codecs: str | None) -> tuple[str, ...]:
+    return tuple(codec.strip() for codec in (codecs or "").split(",") if codec.strip())
+
+
+def parse_mpd(text: str, url: str) -> DASHManifest:
+    """
+    Parses the representations of an MPD's first period
+
+    :param url: Where the manifest came from, to resolve relative URLs against
+    :raises InvalidFormatError: If it isn't a valid MPD
+    """
+    try:
+        root = ET.fromstring(text)
+        if _local_name(root) != "MPD":
+            raise InvalidFormatError(f"Not an MPD: {_local_name(root)}")
+        manifest = DASHManifest(url=url, is_live=root.get("type") == "dynamic")
+        if update_period := root.get("minimumUpdatePeriod"):
+            manifest.minimum_update_period = parse_duration(update_period)
+        if availability_start := root.get("availabilityStartTime"):
+            started = dt.fromisoformat(availability_start)
+            # MPD times without an offset are UTC, not local time
+            if started.tzinfo is None:
+                started = started.replace(tzinfo=UTC)
+            manifest.availability_start_time = started.timestamp()
+        if duration := root.get("mediaPresentationDuration"):
+            manifest.duration = parse_duration(duration)
+
+        periods = _children(root, "Period")
+        if not periods:
+            return manifest
+        period = periods[0]
+        if start := period.get("start"):
+            manifest.period_start = parse_duration(start)
+        period_url = _base_url(period, _base_url(root, url))
+        period_template = _template_attributes(period, {})
+
+        for adaptation_set in _children(period, "AdaptationSet"):
+            set_url = _base_url(adaptation_set, period_url)
+            set_template = _template_attributes(adaptation_set, period_template)
+            for representation in _children(adaptation_set, "Representation"):
+                manifest.representations.append(
+                    DASHRepresentation(
+                        id=representation.get("id", ""),
+                        bandwidth=int(representation.get("bandwidth", 0)),
+                        base_url=_base_url(representation, set_url),
+                        codecs=_codecs(
+                            representation.get("codecs", adaptation_set.get("codecs"))
+                        ),
+                        mime_type=representation.get(
+                            "mimeType", adaptation_set.get("mimeType")
+                        ),
+                        template=_parse_template(
+                            _template_attributes(representation, set_template)
+                        ),
+                    )
+                )
+    except (ET.ParseError, ValueError) as e:
+        raise InvalidFormatError(f"Invalid MPD {url}: {e}")
+    return manifest
+
+
+def select_representation(
+    representations: list[DASHRepresentation], max_bitrate: float | None = None
+) -> DASHRepresentation | None:
+    """
+    Picks the highest bandwidth representation within a budget
+
+    :param max_bitrate: Bits per second, None for the highest bandwidth
+    :return: The best representation that fits, else the lowest bandwidth one
+    """
+    if not representations:
+        return None
+    ordered = sorted(
+        representations, key=lambda representation: representation.bandwidth
+    )
+    if max_bitrate is None:
+        return ordered[-1]
+    fitting = [
+        representation
+        for representation in ordered
+        if representation.bandwidth <= max_bitrate
+    ]
+    return fitting[-1] if fitting else ordered[0]
+
+
+class DASHService(Base):
+    """Fetches DASH manifests and picks what to play from a mediaset's connections."""
+
+    def __init__(self, *args, throughput: ThroughputEstimator | None = None, **kwargs):
+        """
+        :param throughput: Measured segment downloads, e.g. shared with `HLSService`
+        """
+        super().__init__(*args, **kwargs)
+        self.throughput = (
+            throughput if throughput is not None else ThroughputEstimator()
+        )
+        # Manifests by URL, until they may have changed or their URL's token expires
+        self._manifests: dict[str, tuple[DASHManifest, float]] = {}
+
+    async def get_manifest(self, url: str, refresh: bool = False) -> DASHManifest:
+        """
+        Gets a manifest, cached until it's due an update or its URL expires
+
+        :param refresh: Fetch it again rather than using the cached one
+        """
+        now = time.time()
+        cached = self._manifests.get(url)
+        if cached and not refresh and now < cached[1]:
+            return cached[0]
+
+        manifest = parse_mpd(await self._get_html(url=url), url)
+
+        for expired in [
+            key for key, (_, until) in self._manifests.items() if until <= now
+        ]:
+            del self._manifests[expired]
+        expiries = [url_expiry(url) or now + constants.DASH_MANIFEST_MAX_TTL]
+        if manifest.is_live and manifest.minimum_update_period is not None:
+            expiries.append(now + manifest.minimum_update_period)
+        self._manifests[url] = (manifest, min(expiries))
+        return manifest
+
+    async def select(
+        self, connections: list[dict], target_bitrate: float | None = None
+    ) -> DASHSelection | None:
+        """
+        Picks a connection and representation to play from a mediaset's connections
+
+        Connections are tried in the mediaset's order until one's manifest loads.
+
+        :param target_bitrate: Bits per second, defaults to a safe fraction of
+            the measured throughput, or the highest bandwidth if nothing's been measured
+        """
+        dash_connections = [
+            connection
+            for connection in connections
+            if connection.get("transferFormat") == "dash" and connection.get("href")
+        ]
+        if target_bitrate is None and self.throughput.bitrate is not None:
+            target_bitrate = self.throughput.bitrate * constants.HLS_THROUGHPUT_SAFETY
+
+        for connection in dash_connections:
+            try:
+                manifest = await self.get_manifest(connection["href"])
+            except (SoundsException, TimeoutError) as e:
+                self.logger.warning(f"Skipping stream {connection['href']}: {e!r}")
+                continue
+            return DASHSelection(
+                connection=connection,
+                manifest=manifest,
+                representation=select_representation(
+                    manifest.representations, target_bitrate
+                ),
+            )
+        return None
@@ -0,0 +1,143 @@
+"""Decoders generated from the API schema documentation in `sounds_types`.
+
+Each model gets a specialised function, compiled once, that builds the model
+straight from a response node instead of filtering every key against the
+dataclass fields. Validating decoders also check the values against the
+property types documented in the schema.
+"""
+
+import keyword
+from dataclasses import MISSING, fields, is_dataclass
+from functools import cache
+from typing import Any, Callable
+
+from sounds import models
+from sounds.exceptions import InvalidFormatError
+from sounds.sounds_types import sounds_types
+
+type Decoder = Callable[[dict], Any]
+
+# Which documented schema describes each model's source node. Subclasses inherit
+# the schema of their closest listed parent, None means the node isn't documented.
+MODEL_SCHEMAS: dict[type, str | None] = {
+    models.DisplayItem: "DisplayItem",
+    models.PlayableItem: "PlayableItem",
+    models.PromoItem: "SingleItemPromo",
+    models.Network: "PlayableItemNetwork",
+    # These come from broadcast and segment nodes, which aren't in the schema
+    models.ScheduleItem: None,
+    models.Segment: None,
+}
+
+_JSON_TYPES: dict[str, tuple[type, ...]] = {
+    "string": (str,),
+    "integer": (int,),
+    "number": (int, float),
+    "boolean": (bool,),
+    "array": (list,),
+    "object": (dict,),
+}
+
+
+def schema_for(model: type) -> dict | None:
+    """Finds the documented schema for a model, if there is one."""
+    for klass in model.__mro__:
+        if klass in MODEL_SCHEMAS:
+            name = MODEL_SCHEMAS[klass]
+            return sounds_types[name] if name else None
+    return None
+
+
+def _property_types(prop: dict) -> tuple[type, ...] | None:
+    """Python types a schema property may hold, or None if it can't be checked."""
+    if "$ref" in prop:
+        name = prop["$ref"].rsplit("/", 1)[-1]
+        if name == "NullValue":
+            return (type(None),)
+        target = sounds_types.get(name)
+        return _property_types(target) if target else None
+    if "oneOf" in prop:
+        types: tuple[type, ...] = ()
+        for option in prop["oneOf"]:
+            option_types = _property_types(option)
+            if option_types is None:
+                return None
+            types += option_types
+        return types
+    return _JSON_TYPES.get(prop.get("type", ""))
+
+
+def decoder_source(model: type, validate: bool = False) -> tuple[str, dict]:
+    """Generates the source of a decoder for `model`.
+
+    :return: The source code and the namespace it must be executed in
+    :raises TypeError: If `model` isn't a dataclass, or has a name that can't be
+        put in source code
+    """
+    if not is_dataclass(model):
+        raise TypeError(f"{model} is not a dataclass")
+    # Names are written into the source, so only plain identifiers are allowed
+    for identifier in [model.__name__, *(field.name for field in fields(model))]:
+        if not identifier.isidentifier() or keyword.iskeyword(identifier):
+            raise TypeError(f"{identifier!r} in {model} is not an identifier")
+
+    name = model.__name__
+    schema = schema_for(model) or {}
+    properties = schema.get("properties", {})
+    namespace: dict[str, Any] = {
+        "cls": model,
+        "InvalidFormatError": InvalidFormatError,
+    }
+    lines = [f"def decode_{name}(obj):"]
+    arguments = []
+
+    for field in fields(model):
+        key = field.name
+        if validate and key in properties:
+            types = _property_types(properties[key])
+            if types:
+                namespace[f"_t_{key}"] = types
+                expected = "|".join(t.__name__ for t in types)
+                lines += [
+                    f"    v = obj.get({key!r})",
+                    f"    if v is not None and not isinstance(v, _t_{key}):",
+                    "        raise InvalidFormatError(",
+                    f"            f'{name}.{key}: expected {expected}, got {{type(v).__name__}}'",
+                    "        )",
+                ]
+
+        if field.default is not MISSING:
+            namespace[f"_d_{key}"] = field.default
+            arguments.append(f"{key}=obj.get({key!r}, _d_{key})")
+        elif field.default_factory is not MISSING:
+            namespace[f"_f_{key}"] = field.default_factory
+            arguments.append(f"{key}=obj[{key!r}] if {key!r} in obj else _f_{key}()")
+        else:
+            arguments.append(f"{key}=obj[{key!r}]")
+
+    lines += [
+        "    try:",
+        f"        return cls({', '.join(arguments)})",
+        "    except KeyError as e:",
+        f"        raise InvalidFormatError(f'{name} is missing required field {{e}}')",
+    ]
+    return "\n".join(lines), namespace
+
+
+@cache
+def get_decoder(model: type, validate: bool = False) -> Decoder:
+    """Gets the compiled decoder for a model, generating it on first use.
+
+    :param model: The dataclass to decode into
+    :param validate: Check values against the types documented in the schema
+    :raises TypeError: If `model` isn't a dataclass
+    """
+    source, namespace = decoder_source(model, validate=validate)
+    # The source only contains the checked names of a model's own fields
+    exec(source, namespace)  # noqa: S102
+    return namespace[f"decode_{model.__name__}"]
+
+
+def decode(model: type, node: dict, validate: bool = False) -> Any:
+    """Builds a `model` from a response node."""
+    return get_decoder(model, validate)(node)
@@ -0,0 +1,312 @@
+"""Incremental diffing of refreshed model trees.
+
+When a menu, station list or schedule is fetched again, `ChangeFeed.update`
+compares it with the previous tree by URN/ID (broadcast ID for schedule slots), updates the previous models in
+place and tells subscribers what was added, removed, moved or changed.
+"""
+
+import asyncio
+import inspect
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field, fields, is_dataclass
+from typing import Any, Callable, Literal
+
+from sounds import constants
+from sounds.constants import ItemType
+
+type ChangeKind = Literal["added", "removed", "moved", "changed"]
+
+# Values the client sets on models itself, which refreshed payloads never include
+LOCAL_FIELDS = frozenset({"sub_items", "stream", "schedule"})
+# Schedule slots carry their episode's URN, which repeats share
+_BROADCAST_TYPES = frozenset(
+    {ItemType.BROADCAST_SUMMARY.value, ItemType.BROADCAST.value}
+)
+
+
+@dataclass(kw_only=True)
+class Change:
+    """A single change to an item in a tree."""
+
+    kind: ChangeKind
+    # Keys of the item's ancestors, from the top of the tree
+    path: tuple[str, ...]
+    key: str
+    item: Any = None
+    # Position in the parent's sub-items, for added and moved items
+    index: int | None = None
+    # Field name to (old value, new value), for changed items
+    fields: dict[str, tuple[Any, Any]] = field(default_factory=dict)
+
+
+@dataclass
+class ChangeSet:
+    """All the changes found when a tree was refreshed."""
+
+    name: str
+    changes: list[Change] = field(default_factory=list)
+
+    def of_kind(self, kind: ChangeKind) -> list[Change]:
+        return [change for change in self.changes if change.kind == kind]
+
+    @property
+    def added(self) -> list[Change]:
+        return self.of_kind("added")
+
+    @property
+    def removed(self) -> list[Change]:
+        return self.of_kind("removed")
+
+    @property
+    def moved(self) -> list[Change]:
+        return self.of_kind("moved")
+
+    @property
+    def changed(self) -> list[Change]:
+        return self.of_kind("changed")
+
+    def __bool__(self) -> bool:
+        return bool(self.changes)
+
+    def __len__(self) -> int:
+        return len(self.changes)
+
+
+@dataclass
+class _Node:
+    """What a model looked like when its tree was last diffed."""
+
+    obj: Any
+    values: dict[str, Any]
+    children: dict[str, _Node] | None
+
+
+def item_key(item: Any, position: int) -> str:
+    """The key an item is matched by between refreshes."""
+    if getattr(item, "type", None) in _BROADCAST_TYPES and getattr(item, "id", None):
+        return item.id
+    return getattr(item, "urn", None) or getattr(item, "id", None) or f"#{position}"
+
+
+def _child_keys(children: list) -> list[str]:
+    """Keys for a list of items, numbering any repeats of a key so none collide."""
+    keys = []
+    seen: dict[str, int] = {}
+    for position, child in enumerate(children):
+        key = item_key(child, position)
+        seen[key] = seen.get(key, 0) + 1
+        keys.append(key if seen[key] == 1 else f"{key}#{seen[key]}")
+    return keys
+
+
+def _field_values(obj: Any) -> dict[str, Any]:
+    if not is_dataclass(obj):
+        return {}
+    return {
+        f.name: getattr(obj, f.name) for f in fields(obj) if f.name not in LOCAL_FIELDS
+    }
+
+
+def _children(obj: Any) -> list | None:
+    if isinstance(obj, list):
+        return obj
+    sub_items = getattr(obj, "sub_items", None)
+    return sub_items if isinstance(sub_items, list) else None
+
+
+def _snapshot(obj: Any) -> _Node:
+    children = _children(obj)
+    return _Node(
+        obj=obj,
+        values=_field_values(obj),
+        children=None
+        if children is None
+        else {
+            key: _snapshot(child) for key, child in zip(_child_keys(children), children)
+        },
+    )
+
+
+def _diff_node(
+    previous: _Node, new: Any, path: tuple[str, ...], key: str, changes: list
+) -> _Node:
+    """Diffs `new` against `previous`, returning the node for the merged model."""
+    obj = previous.obj
+    values = _field_values(new)
+    changed_fields = {
+        name: (previous.values.get(name), value)
+        for name, value in values.items()
+        if previous.values.get(name) != value
+    }
+    if obj is not new:
+        for name in changed_fields:
+            setattr(obj, name, values[name])
+    if changed_fields:
+        changes.append(
+            Change(kind="changed", path=path, key=key, item=obj, fields=changed_fields)
+        )
+
+    new_children = _children(new)
+    if new_children is None:
+        return _Node(obj=obj, values=values, children=previous.children)
+
+    child_path = path + (key,) if key else path
+    previous_children = previous.children or {}
+    new_keys = _child_keys(new_children)
+    new_types = {k: type(child) for k, child in zip(new_keys, new_children)}
+    # Items kept from the previous tree, in their previous order, to spot moves
+    kept = [
+        k for k, node in previous_children.items() if new_types.get(k) is type(node.obj)
+    ]
+    previous_rank = {k: rank for rank, k in enumerate(kept)}
+
+    merged: list = []
+    children: dict[str, _Node] = {}
+    rank = 0
+    for position, (child_key, child) in enumerate(zip(new_keys, new_children)):
+        previous_child = previous_children.get(child_key)
+        if previous_child is not None and type(previous_child.obj) is type(child):
+            node = _diff_node(previous_child, child, child_path, child_key, changes)
+            if previous_rank[child_key] != rank:
+                changes.append(
+                    Change(
+                        kind="moved",
+                        path=child_path,
+                        key=child_key,
+                        item=node.obj,
+                        index=position,
+                    )
+                )
+            rank += 1
+        else:
+            if previous_child is not None:
+                # Same key but a different kind of item, treat as a replacement
+                changes.append(
+                    Change(
+                        kind="removed",
+                        path=child_path,
+                        key=child_key,
+                        item=previous_child.obj,
+                    )
+                )
+            node = _snapshot(child)
+            changes.append(
+                Change(
+                    kind="added",
+                    path=child_path,
+                    key=child_key,
+                    item=child,
+                    index=position,
+                )
+            )
+        children[child_key] = node
+        merged.append(node.obj)
+
+    for child_key, previous_child in previous_children.items():
+        if child_key not in children:
+            changes.append(
+                Change(
+                    kind="removed",
+                    path=child_path,
+                    key=child_key,
+                    item=previous_child.obj,
+                )
+            )
+
+    # Keep the previous list object so anything holding it sees the update
+    current = _children(obj)
+    if current is not None:
+        current[:] = merged
+    else:
+        obj.sub_items = merged
+    return _Node(obj=obj, values=values, children=children)
+
+
+class ChangeFeed:
+    """Tracks refreshed trees by name and notifies subscribers of changes.
+
+    Trees are only tracked while there is at least one subscriber, and only the
+    most recently updated `max_trees` of them, so a tree updated after being
+    evicted is reported afresh.
+    """
+
+    def __init__(
+        self,
+        logger: logging.Logger | None = None,
+        max_trees: int = constants.CHANGE_FEED_MAX_TREES,
+    ) -> None:
+        self.logger = logger or logging.getLogger(__name__)
+        self.max_trees = max_trees
+        self._trees: OrderedDict[str, _Node] = OrderedDict()
+        self._subscribers: list[Callable[[ChangeSet], Any]] = []
+        self._tasks: set[asyncio.Task] = set()
+
+    def subscribe(self, callback: Callable[[ChangeSet], Any]) -> Callable[[], None]:
+        """Calls `callback` with each non-empty `ChangeSet`.
+
+        The callback may be a coroutine function, in which case it is run as a task.
+
+        :return: A function which unsubscribes the callback
+        """
+        self._subscribers.append(callback)
+
+        def unsubscribe() -> None:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+            if not self._subscribers:
+                self._trees.clear()
+
+        return unsubscribe
+
+    def update[T](self, name: str, tree: T) -> T:
+        """Merges a freshly parsed tree into the previous one with the same name.
+
+        :param name: Identifies the tree, e.g. "stations"
+        :param tree: The newly parsed model, or list of models
+        :return: The tree to use from now on, the previous one updated in place
+            where there was one
+        """
+        if not self._subscribers or tree is None:
+            return tree
+
+        changes: list[Change] = []
+        previous = self._trees.get(name)
+        if previous is None or type(previous.obj) is not type(tree):
+            node = _snapshot(tree)
+            changes = [
+                Change(kind="added", path=(), key=key, item=child.obj, index=position)
+                for position, (key, child) in enumerate((node.children or {}).items())
+            ]
+        else:
+            node = _diff_node(previous, tree, (), "", changes)
+        self._trees[name] = node
+        self._trees.move_to_end(name)
+        while len(self._trees) > self.max_trees:
+            self._trees.popitem(last=False)
+
+        if changes:
+            self._notify(ChangeSet(name=name, changes=changes))
+        return node.obj
+
+    def forget(self, name: str) -> None:
+        """Stop tracking a tree, so its next update starts afresh."""
+        self._trees.pop(name, None)
+
+    def _notify(self, change_set: ChangeSet) -> None:
+        # A failing subscriber mustn't fail the fetch that found the changes
+        for callback in list(self._subscribers):
+            try:
+                result = callback(change_set)
+            except Exception:
+                self.logger.exception(f"Change subscriber failed on {change_set.name}")
+                continue
+            if inspect.isawaitable(result):
+                task = asyncio.ensure_future(result)
+                self._tasks.add(task)
+                task.add_done_callback(self._task_done)
+
+    def _task_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.logger.error("Change subscriber failed", exc_info=task.exception())
@@ -0,0 +1,185 @@
+"""A compact programme guide grid of stations by time slots.
+
+Programmes are held column-oriented, in flat arrays of start and end times and
+indexes into a shared list of titles, with each station's programmes stored
+contiguously in time order. A stations by slots array gives the programme on
+air at the start of each slot, and slices of either can be taken for the part
+of the guide in view without copying.
+"""
+
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from datetime import UTC
+from datetime import datetime as dt
+from typing import Iterable
+
+from sounds.models import Schedule
+
+# Marks a slot with nothing on air
+NO_PROGRAMME = -1
+
+
+@dataclass(frozen=True, slots=True)
+class EPGProgramme:
+    """A programme in the guide."""
+
+    index: int
+    id: str
+    title: str | None
+    start: dt
+    end: dt
+
+
+@dataclass(slots=True)
+class EPG:
+    """Programmes for a set of stations between two times, split into slots."""
+
+    station_ids: list[str]
+    start: dt
+    end: dt
+    slot_seconds: int
+    # Programme columns, each station's programmes together in time order
+    starts: array = field(default_factory=lambda: array("d"))
+    ends: array = field(default_factory=lambda: array("d"))
+    title_indexes: array = field(default_factory=lambda: array("i"))
+    ids: list[str] = field(default_factory=list)
+    titles: list[str | None] = field(default_factory=list)
+    # Station n's programmes are row_offsets[n] up to row_offsets[n + 1]
+    row_offsets: array = field(default_factory=lambda: array("I", [0]))
+    # The programme on air at the start of each slot, one row per station
+    cells: array = field(default_factory=lambda: array("i"))
+
+    @classmethod
+    def build(
+        cls,
+        station_ids: list[str],
+        schedules: Iterable[Schedule | None],
+        start: dt,
+        end: dt,
+        slot_seconds: int = 1800,
+    ) -> "EPG":
+        """
+        Builds a guide from each station's schedule
+
+        :param schedules: The schedule of each station, in the order of `station_ids`
+        :param slot_seconds: The length of each slot
+        """
+        start, end = _aware(start), _aware(end)
+        epg = cls(
+            station_ids=station_ids, start=start, end=end, slot_seconds=slot_seconds
+        )
+        t0, t1 = start.timestamp(), end.timestamp()
+        n_slots = epg.n_slots
+        title_lookup: dict[str | None, int] = {}
+
+        for schedule in schedules:
+            row = array("i", [NO_PROGRAMME]) * n_slots
+            items = sorted(
+                (
+                    item
+                    for item in (schedule.sub_items if schedule else None) or []
+                    if isinstance(item.start, dt) and isinstance(item.end, dt)
+                ),
+                key=lambda item: _aware(item.start),
+            )
+            for item in items:
+                item_start = _aware(item.start).timestamp()
+                item_end = _aware(item.end).timestamp()
+                if item_end <= t0 or item_start >= t1:
+                    continue
+                index = len(epg.ids)
+                # Overlapping schedule items would break the time ordering
+                if epg.ends and index > epg.row_offsets[-1]:
+                    item_start = max(item_start, epg.ends[-1])
+                    if item_start >= item_end:
+                        continue
+                epg.starts.append(item_start)
+                epg.ends.append(item_end)
+                epg.ids.append(item.id)
+                title = (item.titles or {}).get("primary")
+                if title not in title_lookup:
+                    title_lookup[title] = len(epg.titles)
+                    epg.titles.append(title)
+                epg.title_indexes.append(title_lookup[title])
+
+                first = max(math.ceil((item_start - t0) / slot_seconds), 0)
+                last = min(math.ceil((item_end - t0) / slot_seconds), n_slots)
+                for slot in range(first, last):
+                    row[slot] = index
+            epg.row_offsets.append(len(epg.ids))
+            epg.cells.extend(row)
+        return epg
+
+    @property
+    def n_slots(self) -> int:
+        return max(
+            math.ceil((self.end - self.start).total_seconds() / self.slot_seconds), 0
+        )
+
+    def __len__(self) -> int:
+        """The number of programmes."""
+        return len(self.ids)
+
+    def slot_start(self, slot: int) -> dt:
+        return dt.fromtimestamp(
+            self.start.timestamp() + slot * self.slot_seconds, tz=UTC
+        )
+
+    def programme(self, index: int) -> EPGProgramme:
+        return EPGProgramme(
+            index=index,
+            id=self.ids[index],
+            title=self.titles[self.title_indexes[index]],
+            start=dt.fromtimestamp(self.starts[index], tz=UTC),
+            end=dt.fromtimestamp(self.ends[index], tz=UTC),
+        )
+
+    def row(self, station: int | str) -> int:
+        """The row of a station, given its row or id."""
+        return station if isinstance(station, int) else self.station_ids.index(station)
+
+    def cell(self, station: int | str, slot: int) -> int:
+        """The programme on air at the start of a slot, or `NO_PROGRAMME`."""
+        return self.cells[self.row(station) * self.n_slots + slot]
+
+    def cell_rows(self, stations: slice, slots: slice) -> list[memoryview]:
+        """Views of the cells in view, one per station, without copying them."""
+        n_slots = self.n_slots
+        first, last, _ = slots.indices(n_slots)
+        cells = memoryview(self.cells)
+        return [
+            cells[row * n_slots + first : row * n_slots + last]
+            for row in range(*stations.indices(len(self.station_ids)))
+        ]
+
+    def programmes_between(self, station: int | str, start: dt, end: dt) -> range:
+        """The indexes of a station's programmes airing at any time between two times."""
+        row = self.row(station)
+        lo, hi = self.row_offsets[row], self.row_offsets[row + 1]
+        # Within a station programmes don't overlap, so both columns are sorted
+        first = bisect_right(self.ends, _aware(start).timestamp(), lo, hi)
+        last = bisect_left(self.starts, _aware(end).timestamp(), lo, hi)
+        return range(first, max(first, last))
+
+    def slice(
+        self, stations: slice, slots: slice
+    ) -> list[tuple[str, list[EPGProgramme]]]:
+        """The programmes of each station in view, for rendering."""
+        first, last, _ = slots.indices(self.n_slots)
+        window_start, window_end = self.slot_start(first), self.slot_start(last)
+        return [
+            (
+                self.station_ids[row],
+                [
+                    self.programme(index)
+                    for index in self.programmes_between(row, window_start, window_end)
+                ],
+            )
+            for row in range(*stations.indices(len(self.station_ids)))
+        ]
+
+
+def _aware(value: dt) -> dt:
+    return value if value.tzinfo else value.replace(tzinfo=UTC)
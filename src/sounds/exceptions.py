@@ -14,6 +14,10 @@ class APIResponseError(SoundsException):
     pass
 
 
+class ServerError(APIResponseError):
+    """The API failed with a 5xx status, so the request may work if retried"""
+
+
 class InvalidFormatError(SoundsException):
     pass
 
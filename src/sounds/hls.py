@@ -0,0 +1,261 @@
+"""HLS master playlists, and picking a variant and connection to play.
+
+A mediaset offers the same stream from several suppliers, each with a master
+playlist listing variants at different bitrates. Master playlists are fetched
+once and cached, connections are tried fastest first by the time their hosts
+took to answer, and a variant is picked to fit a target bitrate or the
+throughput measured while playing.
+"""
+
+import math
+import re
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urljoin, urlparse
+
+from sounds import constants
+from sounds.base import Base
+from sounds.exceptions import SoundsException
+from sounds.utils import run_concurrently, url_expiry
+
+# KEY=value pairs of an attribute list, where quoted values may contain commas
+_ATTRIBUTE = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+
+
+@dataclass(frozen=True)
+class HLSVariant:
+    """A variant stream listed in a master playlist."""
+
+    uri: str
+    # Peak bits per second
+    bandwidth: int
+    average_bandwidth: int | None = None
+    codecs: tuple[str, ...] = ()
+    audio: str | None = None
+
+
+@dataclass
+class HLSPlaylist:
+    """A master playlist, or a media playlist with no variants."""
+
+    url: str
+    variants: list[HLSVariant] = field(default_factory=list)
+
+    @property
+    def is_master(self) -> bool:
+        return bool(self.variants)
+
+
+@dataclass
+class HLSSelection:
+    """The connection and variant picked to play."""
+
+    connection: dict
+    playlist: HLSPlaylist
+    variant: HLSVariant | None
+
+    @property
+    def url(self) -> str:
+        """The playlist to play, the variant's if there are any."""
+        return self.variant.uri if self.variant else self.playlist.url
+
+
+def parse_attributes(attribute_list: str) -> dict[str, str]:
+    return {key: value.strip('"') for key, value in _ATTRIBUTE.findall(attribute_list)}
+
+
+def parse_playlist(text: str, url: str) -> HLSPlaylist:
+    """
+    Parses a playlist's variants, if it's a master playlist
+
+    :param url: Where the playlist came from, to resolve relative URIs against
+    """
+    playlist = HLSPlaylist(url=url)
+    stream_info: dict[str, str] | None = None
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("#EXT-X-STREAM-INF:"):
+            stream_info = parse_attributes(line.partition(":")[2])
+        elif line and not line.startswith("#") and stream_info is not None:
+            try:
+                bandwidth = int(stream_info.get("BANDWIDTH", 0))
+                average = stream_info.get("AVERAGE-BANDWIDTH")
+                average_bandwidth = int(average) if average else None
+            except ValueError:
+                bandwidth, average_bandwidth = 0, None
+            playlist.variants.append(
+                HLSVariant(
+                    uri=urljoin(url, line),
+                    bandwidth=bandwidth,
+                    average_bandwidth=average_bandwidth,
+                    codecs=tuple(
+                        codec.strip()
+                        for codec in stream_info.get("CODECS", "").split(",")
+                        if codec.strip()
+                    ),
+                    audio=stream_info.get("AUDIO"),
+                )
+            )
+            stream_info = None
+    return playlist
+
+
+def select_variant(
+    variants: list[HLSVariant], max_bitrate: float | None = None
+) -> HLSVariant | None:
+    """
+    Picks the highest bitrate variant within a budget
+
+    :param max_bitrate: Bits per second, None for the highest bitrate
+    :return: The best variant that fits, else the lowest bitrate one
+    """
+    if not variants:
+        return None
+    ordered = sorted(variants, key=lambda variant: variant.bandwidth)
+    if max_bitrate is None:
+        return ordered[-1]
+    fitting = [variant for variant in ordered if variant.bandwidth <= max_bitrate]
+    return fitting[-1] if fitting else ordered[0]
+
+
+class ThroughputEstimator:
+    """A moving average of the throughput measured downloading segments."""
+
+    def __init__(self, weight: float = constants.HLS_THROUGHPUT_WEIGHT) -> None:
+        """
+        :param weight: How much each new sample counts, from 0 to 1
+        """
+        self.weight = weight
+        self._bitrate: float | None = None
+
+    @property
+    def bitrate(self) -> float | None:
+        """Bits per second, or None until something has been measured."""
+        return self._bitrate
+
+    def add_sample(self, n_bytes: int, seconds: float) -> None:
+        if seconds <= 0 or n_bytes <= 0:
+            return
+        sample = n_bytes * 8 / seconds
+        if self._bitrate is None:
+            self._bitrate = sample
+        else:
+            self._bitrate += self.weight * (sample - self._bitrate)
+
+
+def _host(url: str) -> str:
+    return urlparse(url).netloc
+
+
+class HLSService(Base):
+    """Fetches HLS playlists and picks what to play from a mediaset's connections."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Fed by whatever downloads segments, to pick variants that keep up
+        self.throughput = ThroughputEstimator()
+        # Playlists by URL, until their URL's token expires
+        self._playlists: dict[str, tuple[HLSPlaylist, float]] = {}
+        # Moving average of seconds each host took to answer
+        self._latencies: dict[str, float] = {}
+
+    def latency(self, url: str) -> float | None:
+        """The measured latency of a URL's host, if it's been measured."""
+        return self._latencies.get(_host(url))
+
+    async def get_playlist(self, url: str, refresh: bool = False) -> HLSPlaylist:
+        """
+        Gets a master playlist, cached until its URL expires
+
+        :param refresh: Fetch it again rather than using the cached one
+        """
+        now = time.time()
+        cached = self._playlists.get(url)
+        if cached and not refresh and now < cached[1]:
+            return cached[0]
+
+        started = time.monotonic()
+        try:
+            text = await self._get_html(url=url)
+        except SoundsException, TimeoutError:
+            # Counts as slow as a timeout, so failing hosts drop down the ranking
+            self._record_latency(url, self._timeout.total or 10.0)
+            raise
+        self._record_latency(url, time.monotonic() - started)
+        playlist = parse_playlist(text, url)
+
+        for expired in [
+            key for key, (_, until) in self._playlists.items() if until <= now
+        ]:
+            del self._playlists[expired]
+        self._playlists[url] = (
+            playlist,
+            url_expiry(url) or now + constants.HLS_PLAYLIST_MAX_TTL,
+        )
+        return playlist
+
+    async def rank_connections(self, connections: list[dict]) -> list[dict]:
+        """
+        Orders connections by their hosts' latency, fastest first
+
+        Hosts not yet measured are measured by fetching their playlists at once.
+        Any that fail go last.
+        """
+        unmeasured = [
+            connection
+            for connection in connections
+            if connection.get("href") and self.latency(connection["href"]) is None
+        ]
+        await run_concurrently(
+            lambda connection: self.get_playlist(connection["href"]),
+            unmeasured,
+            limit=constants.HLS_MAX_CONCURRENT_PROBES,
+        )
+
+        def latency(connection: dict) -> float:
+            measured = self.latency(connection.get("href", ""))
+            return math.inf if measured is None else measured
+
+        # Sorting is stable, so equally fast connections keep the mediaset's order
+        return sorted(connections, key=latency)
+
+    async def select(
+        self, connections: list[dict], target_bitrate: float | None = None
+    ) -> HLSSelection | None:
+        """
+        Picks a connection and variant to play from a mediaset's connections
+
+        Connections are tried fastest first until one's playlist loads.
+
+        :param target_bitrate: Bits per second, defaults to a safe fraction of
+            the measured throughput, or the highest bitrate if nothing's been measured
+        """
+        hls_connections = [
+            connection
+            for connection in connections
+            if connection.get("transferFormat") == "hls" and connection.get("href")
+        ]
+        if target_bitrate is None and self.throughput.bitrate is not None:
+            target_bitrate = self.throughput.bitrate * constants.HLS_THROUGHPUT_SAFETY
+
+        for connection in await self.rank_connections(hls_connections):
+            try:
+                playlist = await self.get_playlist(connection["href"])
+            except (SoundsException, TimeoutError) as e:
+                self.logger.warning(f"Skipping stream {connection['href']}: {e!r}")
+                continue
+            return HLSSelection(
+                connection=connection,
+                playlist=playlist,
+                variant=select_variant(playlist.variants, target_bitrate),
+            )
+        return None
+
+    def _record_latency(self, url: str, seconds: float) -> None:
+        host = _host(url)
+        previous = self._latencies.get(host)
+        self._latencies[host] = (
+            seconds
+            if previous is None
+            else previous + constants.HLS_THROUGHPUT_WEIGHT * (seconds - previous)
+        )
@@ -0,0 +1,113 @@
+import time
+import weakref
+from dataclasses import MISSING, Field, fields
+from typing import Any
+
+
+class IdentityMap:
+    """A weak-value map of parsed objects keyed by their URN and PID.
+
+    When the same episode, show or station is parsed again the existing instance
+    is updated and reused, so every part of the client shares one copy of it.
+    Objects are forgotten once nothing else references them.
+    """
+
+    def __init__(self) -> None:
+        self._items: weakref.WeakValueDictionary[str, Any] = (
+            weakref.WeakValueDictionary()
+        )
+        self._updated_at: dict[str, float] = {}
+
+    @staticmethod
+    def keys_for(obj: Any) -> list[str]:
+        """The keys an object can be found by."""
+        keys = []
+        for attr in ("urn", "pid"):
+            value = getattr(obj, attr, None)
+            if isinstance(value, str) and value:
+                keys.append(value)
+        return keys
+
+    def get(self, key: str, max_age: float | None = None) -> Any:
+        """Get an object by its URN or PID.
+
+        :param key: The URN or PID
+        :param max_age: Only return the object if it was parsed within this many seconds
+        :return: The object, or None if unknown or too old
+        """
+        obj = self._items.get(key)
+        if obj is None:
+            return None
+        if max_age is not None:
+            updated_at = self._updated_at.get(key, 0.0)
+            if time.monotonic() - updated_at > max_age:
+                return None
+        return obj
+
+    def merge(self, obj: Any) -> Any:
+        """Adds a newly parsed object, returning the instance to use in its place.
+
+        If an object of the same type is already known, it is updated with any
+        values set on `obj` and returned instead. Values left at their defaults
+        aren't copied, as a partial payload leaves them out rather than clearing them.
+        """
+        keys = self.keys_for(obj)
+        if not keys:
+            return obj
+
+        existing = None
+        for key in keys:
+            candidate = self._items.get(key)
+            if candidate is not None and type(candidate) is type(obj):
+                existing = candidate
+                break
+
+        if existing is not None and existing is not obj:
+            for field in fields(obj):
+                value = getattr(obj, field.name)
+                if value is not None and not _is_default(field, value):
+                    setattr(existing, field.name, value)
+            obj = existing
+
+        now = time.monotonic()
+        for key in keys:
+            self._items[key] = obj
+            self._updated_at[key] = now
+        self._prune()
+        return obj
+
+    def discard(self, key: str) -> None:
+        """Forget an object, e.g. because it is known to be stale."""
+        obj = self._items.pop(key, None)
+        self._updated_at.pop(key, None)
+        if obj is not None:
+            for other in self.keys_for(obj):
+                self._items.pop(other, None)
+                self._updated_at.pop(other, None)
+
+    def clear(self) -> None:
+        self._items.clear()
+        self._updated_at.clear()
+
+    def _prune(self) -> None:
+        # Timestamps outlive the weakly held objects, so drop them now and then
+        if len(self._updated_at) > 2 * len(self._items) + 64:
+            self._updated_at = {
+                key: value
+                for key, value in self._updated_at.items()
+                if key in self._items
+            }
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._items
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+def _is_default(field: Field, value: Any) -> bool:
+    if field.default is not MISSING:
+        return value == field.default
+    if field.default_factory is not MISSING:
+        return value == field.default_factory()
+    return False
@@ -1,7 +1,7 @@
-from dataclasses import asdict, dataclass, field, fields
+from dataclasses import asdict, dataclass, field
 from datetime import datetime as dt
 from pprint import pformat
-from typing import Any, List, Optional, Sequence
+from typing import Any, Callable, Iterable, List, Optional, Sequence
 from warnings import deprecated
 from zoneinfo import ZoneInfo
 
@@ -77,6 +77,187 @@ class ImageMixin:
             )
 
 
+class ItemList(list):
+    """A list of sub-items which keeps an index of its items by ID.
+
+    The index is built on the first lookup and dropped whenever the list changes.
+    """
+
+    _index: dict[str, Any] | None = None
+
+    def lookup(self, key: str) -> Any:
+        """Get an item by ID."""
+        if self._index is None:
+            index: dict[str, Any] = {}
+            for item in self:
+                item_id = getattr(item, "id", None)
+                if item_id is not None:
+                    # Keep the first match, as a linear scan would
+                    index.setdefault(item_id, item)
+            self._index = index
+        return self._index.get(key)
+
+    def __getstate__(self):
+        # The index is cheap to rebuild, so don't serialise it
+        return None
+
+
+def _invalidates_index(name: str):
+    method = getattr(list, name)
+
+    def wrapper(self, *args, **kwargs):
+        self._index = None
+        return method(self, *args, **kwargs)
+
+    wrapper.__name__ = name
+    return wrapper
+
+
+for _method in (
+    "__setitem__",
+    "__delitem__",
+    "__iadd__",
+    "__imul__",
+    "append",
+    "extend",
+    "insert",
+    "pop",
+    "remove",
+    "clear",
+    "sort",
+    "reverse",
+):
+    setattr(ItemList, _method, _invalidates_index(_method))
+
+
+class LazyItemList(ItemList):
+    """An `ItemList` whose items are only built when it's first used.
+
+    Menus with many rarely opened branches can defer building them this way.
+    """
+
+    _factory: Callable[[], Iterable[Any]] | None = None
+
+    def __init__(
+        self,
+        items: Iterable[Any] = (),
+        factory: Callable[[], Iterable[Any]] | None = None,
+    ) -> None:
+        """
+        :param items: Items to start with, as for a list
+        :param factory: Builds the items on first use
+        """
+        super().__init__(items)
+        self._factory = factory
+
+    @property
+    def loaded(self) -> bool:
+        return self._factory is None
+
+    def load(self) -> None:
+        """Builds the items now, if they haven't been already."""
+        factory = self._factory
+        if factory is not None:
+            self._factory = None
+            list.extend(self, factory())
+
+
+def _loads_items(name: str):
+    method = getattr(ItemList, name)
+
+    def wrapper(self, *args, **kwargs):
+        self.load()
+        return method(self, *args, **kwargs)
+
+    wrapper.__name__ = name
+    return wrapper
+
+
+# Everything that reads or changes the items builds them first
+for _method in (
+    "__len__",
+    "__iter__",
+    "__reversed__",
+    "__getitem__",
+    "__contains__",
+    "__eq__",
+    "__ne__",
+    "__lt__",
+    "__le__",
+    "__gt__",
+    "__ge__",
+    "__add__",
+    "__mul__",
+    "__rmul__",
+    "__repr__",
+    "__reduce_ex__",
+    "copy",
+    "count",
+    "index",
+    "lookup",
+    "__setitem__",
+    "__delitem__",
+    "__iadd__",
+    "__imul__",
+    "append",
+    "extend",
+    "insert",
+    "pop",
+    "remove",
+    "clear",
+    "sort",
+    "reverse",
+):
+    setattr(LazyItemList, _method, _loads_items(_method))
+
+
+class IndexedMixin:
+    """Mixin for menus whose sub-items can be looked up by ID and path."""
+
+    sub_items: Any
+
+    def __setattr__(self, name, value):
+        if (
+            name == "sub_items"
+            and value is not None
+            and not isinstance(value, ItemList)
+        ):
+            value = ItemList(value)
+        super().__setattr__(name, value)
+
+    def _lookup(self, key: str) -> Any:
+        if self.sub_items:
+            return self.sub_items.lookup(key)
+        return None
+
+    def resolve(self, path: str | Sequence[str]) -> Any:
+        """Get a nested item by its path of IDs.
+
+        :param path: IDs separated by slashes, e.g. listen_live/bbc_radio_four, or a
+            sequence of IDs
+        :return: The item at the end of the path, or None if any part isn't found
+        """
+        keys = path.split("/") if isinstance(path, str) else path
+        node: Any = self
+        for key in keys:
+            if not key:
+                continue
+            if isinstance(node, IndexedMixin):
+                node = node._lookup(key)
+            else:
+                node = next(
+                    (
+                        item
+                        for item in getattr(node, "sub_items", None) or []
+                        if getattr(item, "id", None) == key
+                    ),
+                    None,
+                )
+            if node is None:
+                return None
+        return node
+
+
 @dataclass(kw_only=True)
 class BaseObject(SerializableMixin):
     """Base class for all objects with common functionality."""
@@ -427,7 +608,7 @@ class CollectionItemContainer(CategoryItemContainer):
 
 
 @dataclass(kw_only=True)
-class MenuItem(Container):
+class MenuItem(IndexedMixin, Container):
     """Represents a menu item container."""
 
     def get(
@@ -445,11 +626,7 @@ class MenuItem(Container):
         | None
     ):
         """Get a sub-menu item by ID."""
-        if self.sub_items:
-            for item in self.sub_items:
-                if hasattr(item, "id") and item.id == key:
-                    return item
-        return None
+        return self._lookup(key)
 
 
 @dataclass(kw_only=True)
@@ -460,18 +637,14 @@ class RecommendedMenuItem(MenuItem):
 
 
 @dataclass(kw_only=True)
-class Menu(SerializableMixin):
+class Menu(IndexedMixin, SerializableMixin):
     """Represents a menu container with items."""
 
     sub_items: List[MenuItem] | Sequence[MenuItem] | None
 
     def get(self, key: str) -> Optional[MenuItem | RecommendedMenuItem]:
         """Get a menu item by ID."""
-        if self.sub_items:
-            for item in self.sub_items:
-                if hasattr(item, "id") and item.id == key:
-                    return item
-        return None
+        return self._lookup(key)
 
 
 @dataclass(kw_only=True)
@@ -493,6 +666,7 @@ class SearchResults(SerializableMixin):
 
 def model_factory(object):
     from sounds.constants import ContainerType, IDType, ItemType, ItemURN
+    from sounds.decoders import get_decoder
 
     schema_type = None
     new_type = None
@@ -649,10 +823,7 @@ def model_factory(object):
         return None
 
     try:
-        required_fields = {f.name for f in fields(new_type)}
+        decoder = get_decoder(new_type)
     except TypeError:
         return None
-    attrs = {k: v for k, v in object.items() if k in required_fields}
-
-    new_object = new_type(**attrs)
-    return new_object
+    return decoder(object)
@@ -0,0 +1,227 @@
+"""Polls what's playing on many stations at once.
+
+One task polls every tracked station as it falls due, under a shared limit on
+requests in flight. A station is polled again just after its current track is
+expected to end, and less and less often while nothing is playing, e.g. during
+speech. Changes are delivered to each subscriber's async iterator.
+"""
+
+import asyncio
+import contextlib
+import logging
+from dataclasses import dataclass
+from typing import AsyncIterator
+
+from sounds import constants
+from sounds.models import Segment
+from sounds.schedule import ScheduleService
+from sounds.utils import run_concurrently
+
+
+@dataclass
+class NowPlayingUpdate:
+    """A change to what's playing on a station."""
+
+    station_id: str
+    # None when nothing is playing, e.g. during speech
+    segment: Segment | None
+    previous: Segment | None = None
+
+
+@dataclass
+class _StationState:
+    station_id: str
+    segment: Segment | None = None
+    # Event loop times
+    due: float = 0.0
+    expected_end: float | None = None
+    backoff: float = 0.0
+    polled: bool = False
+
+
+def _track_length(segment: Segment) -> int | None:
+    start = segment.offset.get("start")
+    end = segment.offset.get("end")
+    if isinstance(start, int) and isinstance(end, int) and end > start:
+        return end - start
+    return None
+
+
+class NowPlayingPoller:
+    """Tracks the segment playing on a set of stations."""
+
+    def __init__(
+        self,
+        schedules: ScheduleService,
+        logger: logging.Logger | None = None,
+        max_concurrent: int = constants.NOW_PLAYING_MAX_CONCURRENT,
+        min_interval: float = constants.NOW_PLAYING_MIN_INTERVAL,
+        max_interval: float = constants.NOW_PLAYING_MAX_INTERVAL,
+        grace: float = constants.NOW_PLAYING_GRACE,
+    ) -> None:
+        """
+        :param max_concurrent: The most stations to poll at once
+        :param min_interval: Seconds between polls when there's nothing better to go on
+        :param max_interval: The longest to go between polls while nothing is playing
+        :param grace: Seconds after a track is expected to end to poll for the next one
+        """
+        self.schedules = schedules
+        self.logger = logger or logging.getLogger(__name__)
+        self.max_concurrent = max_concurrent
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.grace = grace
+        self._states: dict[str, _StationState] = {}
+        self._queues: set[asyncio.Queue[NowPlayingUpdate | None]] = set()
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def station_ids(self) -> list[str]:
+        return list(self._states)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def current(self, station_id: str) -> Segment | None:
+        """The segment last seen playing on a station."""
+        state = self._states.get(station_id)
+        return state.segment if state else None
+
+    def track(self, *station_ids: str) -> None:
+        """Starts polling stations, straight away."""
+        for station_id in station_ids:
+            if station_id not in self._states:
+                self._states[station_id] = _StationState(
+                    station_id=station_id, backoff=self.min_interval
+                )
+        self._wake.set()
+
+    def untrack(self, *station_ids: str) -> None:
+        for station_id in station_ids:
+            self._states.pop(station_id, None)
+
+    def start(self) -> None:
+        """Starts polling in the background."""
+        if not self.running:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        """Stops polling, ending every subscriber's iterator."""
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        for queue in self._queues:
+            queue.put_nowait(None)
+
+    async def __aenter__(self) -> "NowPlayingPoller":
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    def updates(self) -> AsyncIterator[NowPlayingUpdate]:
+        """Subscribes to changes on the tracked stations.
+
+        Updates are queued from when this is called, and the iterator ends when
+        the poller is stopped.
+        """
+        queue: asyncio.Queue[NowPlayingUpdate | None] = asyncio.Queue()
+        self._queues.add(queue)
+
+        async def iterate() -> AsyncIterator[NowPlayingUpdate]:
+            try:
+                while (update := await queue.get()) is not None:
+                    yield update
+            finally:
+                self._queues.discard(queue)
+
+        return iterate()
+
+    def __aiter__(self) -> AsyncIterator[NowPlayingUpdate]:
+        return self.updates()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            due = [state for state in self._states.values() if state.due <= now]
+            if not due:
+                next_due = min(
+                    (state.due for state in self._states.values()), default=None
+                )
+                self._wake.clear()
+                with contextlib.suppress(TimeoutError):
+                    await asyncio.wait_for(
+                        self._wake.wait(),
+                        None if next_due is None else next_due - now,
+                    )
+                continue
+
+            results = await run_concurrently(
+                self._poll,
+                [state.station_id for state in due],
+                limit=self.max_concurrent,
+            )
+            now = loop.time()
+            for state, result in zip(due, results):
+                if self._states.get(state.station_id) is not state:
+                    # Untracked while it was being polled
+                    continue
+                if isinstance(result, Exception):
+                    self.logger.warning(
+                        f"Failed to get now playing for {state.station_id}: {result}"
+                    )
+                    self._back_off(state, now)
+                    continue
+                self._update(state, result, now)
+
+    async def _poll(self, station_id: str) -> Segment | None:
+        # Polls are timed by the poller, so always skip the cache
+        segments = await self.schedules.recently_played_items(
+            station_id, results=1, refresh=True
+        )
+        if segments and segments[0].offset.get("now_playing"):
+            return segments[0]
+        return None
+
+    def _update(
+        self, state: _StationState, segment: Segment | None, now: float
+    ) -> None:
+        """Records a poll's result and works out when to poll the station next."""
+        previous = state.segment
+        if (segment.id if segment else None) != (previous.id if previous else None):
+            state.segment = segment
+            state.backoff = self.min_interval
+            # Seen within a poll of it starting, so it ends about this long from now.
+            # The track playing when a station is first polled could be anywhere in.
+            length = _track_length(segment) if segment and state.polled else None
+            state.expected_end = now + length if length else None
+            self._publish(
+                NowPlayingUpdate(
+                    station_id=state.station_id, segment=segment, previous=previous
+                )
+            )
+
+        state.polled = True
+
+        if state.expected_end is not None and state.expected_end > now:
+            state.due = state.expected_end + self.grace
+        elif segment is not None:
+            # A track of unknown length, or running over, may end at any moment
+            state.due = now + self.min_interval
+        else:
+            # Probably speech, so poll less and less often until a track starts
+            self._back_off(state, now)
+
+    def _back_off(self, state: _StationState, now: float) -> None:
+        state.due = now + state.backoff
+        state.backoff = min(state.backoff * 2, self.max_interval)
+
+    def _publish(self, update: NowPlayingUpdate) -> None:
+        for queue in self._queues:
+            queue.put_nowait(update)
@@ -0,0 +1,84 @@
+"""Iterates over every item of a paged endpoint.
+
+Paged responses carry `total`, `limit` and `offset` alongside their `data`.
+Once the first page says how many items there are, the next pages are fetched
+concurrently, a few ahead of the caller, and items are yielded in order.
+Breaking out of the iteration cancels the pages still being fetched.
+"""
+
+import asyncio
+import contextlib
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable
+
+from sounds import constants
+
+# Fetches the page at an offset, with up to a limit of items
+type PageFetcher = Callable[[int, int], Awaitable[dict]]
+
+
+def page_info(json_resp: dict) -> tuple[int, int, int] | None:
+    """The total, limit and offset of a paged response, or None if it isn't paged."""
+    try:
+        total, limit, offset = (
+            int(json_resp["total"]),
+            int(json_resp["limit"]),
+            int(json_resp["offset"]),
+        )
+    except KeyError, TypeError, ValueError:
+        return None
+    return total, limit, offset
+
+
+async def paginate[T](
+    fetch_page: PageFetcher,
+    parse_page: Callable[[dict], list[T]],
+    page_size: int = constants.PAGE_SIZE,
+    prefetch: int = constants.PAGE_PREFETCH,
+) -> AsyncIterator[T]:
+    """
+    Yields the items of every page, fetching pages ahead of the caller
+
+    Call `aclose()` on the iterator, or use `contextlib.aclosing`, when breaking
+    out early so pages being fetched are cancelled straight away.
+
+    :param fetch_page: Fetches the page at an offset
+    :param parse_page: Gets the items from a page
+    :param page_size: Items to ask for in each page, the API may return fewer
+    :param prefetch: The most pages to fetch ahead of the caller
+    """
+    first = await fetch_page(0, page_size)
+    step, offsets = page_size, iter(())
+    if (info := page_info(first)) is not None:
+        total, limit, offset = info
+        # The API caps the limit, so step by what it actually returned
+        step = limit or page_size
+        offsets = iter(range(offset + step, total, step))
+    pending: deque[asyncio.Future[dict]] = deque()
+
+    def fill() -> None:
+        while len(pending) < max(prefetch, 1):
+            if (next_offset := next(offsets, None)) is None:
+                return
+            pending.append(asyncio.ensure_future(fetch_page(next_offset, step)))
+
+    try:
+        fill()
+        for item in parse_page(first):
+            yield item
+
+        while pending:
+            page = await pending.popleft()
+            fill()
+            items = parse_page(page)
+            if not items:
+                # Fewer items than the total claimed
+                break
+            for item in items:
+                yield item
+    finally:
+        for task in pending:
+            task.cancel()
+        for task in pending:
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await task
@@ -2,6 +2,8 @@ from collections import namedtuple
 from dataclasses import fields
 from typing import List, Sequence, Union
 
+from sounds.constants import ItemType
+from sounds.identity import IdentityMap
 from sounds.models import (
     CategoryItemContainer,
     Container,
@@ -25,9 +27,13 @@ from sounds.utils import network_logo
 ParseResult = Union[SoundsTypes, Sequence["ParseResult"], None]
 
 
-def parse_node(node) -> SoundsTypes | List[SoundsTypes] | None:
+def parse_node(
+    node, identity_map: IdentityMap | None = None
+) -> SoundsTypes | List[SoundsTypes] | None:
     """
     Recursively parses a node. A node with a 'data' key is a container; otherwise, it's a playable item.
+
+    If an `identity_map` is given, objects already in it are updated and reused.
     """
 
     NestedObject = namedtuple("NestedObject", ["source_key", "replacement_model"])
@@ -46,7 +52,7 @@ def parse_node(node) -> SoundsTypes | List[SoundsTypes] | None:
         results = []
         for item in node:
             if item is not None:
-                parsed = parse_node(item)
+                parsed = parse_node(item, identity_map)
                 if isinstance(parsed, list):
                     results.extend(parsed)
                 elif parsed is not None:
@@ -59,10 +65,12 @@ def parse_node(node) -> SoundsTypes | List[SoundsTypes] | None:
             return None
 
         if isinstance(container, (Container, CategoryItemContainer, Menu)):
-            sub_items = parse_node(node["data"])
+            sub_items = parse_node(node["data"], identity_map)
             if isinstance(sub_items, list):
                 container.sub_items = sub_items
 
+        if identity_map is not None:
+            container = identity_map.merge(container)
         return container
 
     else:
@@ -92,16 +100,26 @@ def parse_node(node) -> SoundsTypes | List[SoundsTypes] | None:
                 playable_item.network.logo_url = network_logo(
                     playable_item.network.logo_url
                 )
+        # A broadcast's URN and PID are its episode's, so repeats of an episode
+        # would be merged into one slot, with the times of whichever came last
+        is_broadcast = node.get("type") in (
+            ItemType.BROADCAST_SUMMARY.value,
+            ItemType.BROADCAST.value,
+        )
+        if identity_map is not None and playable_item is not None and not is_broadcast:
+            playable_item = identity_map.merge(playable_item)
         return playable_item
 
 
-def parse_menu(json_data) -> Menu:
+def parse_menu(json_data, identity_map: IdentityMap | None = None) -> Menu:
     menu = Menu(sub_items=[])
 
     if "data" not in json_data:
         return menu
 
-    nodes = (parse_node(item) for item in json_data["data"] if item is not None)
+    nodes = (
+        parse_node(item, identity_map) for item in json_data["data"] if item is not None
+    )
     menu_items = [node for node in nodes if isinstance(node, MenuItem)]
 
     # Promote any menu item to a "recommended" variant if its first child is a recommendation
@@ -122,13 +140,14 @@ def _promote_if_recommended(menu_item: MenuItem) -> MenuItem:
     return menu_item
 
 
-def parse_schedule(json_data):
-    schedule = parse_node(json_data["data"][0])
+def parse_schedule(json_data, identity_map: IdentityMap | None = None):
+    schedule = parse_node(json_data["data"][0], identity_map)
     return schedule
 
 
 def parse_container(
     json_data,
+    identity_map: IdentityMap | None = None,
 ) -> SoundsTypes | List[SoundsTypes] | None:
     if not json_data:
         return None
@@ -140,23 +159,23 @@ def parse_container(
         ):
             item = json_data["data"][0]["data"]
             item["data"] = json_data["data"][1]["data"]
-            container = parse_node(item)
+            container = parse_node(item, identity_map)
         else:
-            container = parse_node(json_data["data"])
+            container = parse_node(json_data["data"], identity_map)
     elif "results" in json_data:
-        container = parse_node(json_data["results"])
+        container = parse_node(json_data["results"], identity_map)
     else:
         container = None
     return container
 
 
-def parse_search(json_data) -> SearchResults:
+def parse_search(json_data, identity_map: IdentityMap | None = None) -> SearchResults:
     stations: List[LiveStation | StationSearchResult] = []
     shows: List[Podcast | RadioShow] = []
     episodes: List[PodcastEpisode | RadioShow | RadioClip] = []
     for results_set in json_data["data"]:
         if results_set["id"] == "live_search":
-            station_results = parse_container(results_set)
+            station_results = parse_container(results_set, identity_map)
             if isinstance(station_results, list):
                 stations = [
                     station
@@ -167,7 +186,7 @@ def parse_search(json_data) -> SearchResults:
             else:
                 stations = []
         elif results_set["id"] == "container_search":
-            show_results = parse_container(results_set)
+            show_results = parse_container(results_set, identity_map)
             if isinstance(show_results, list):
                 shows = [
                     show
@@ -175,7 +194,7 @@ def parse_search(json_data) -> SearchResults:
                     if isinstance(show, (Podcast, RadioShow))
                 ]
         elif results_set["id"] == "playable_search":
-            episode_results = parse_container(results_set)
+            episode_results = parse_container(results_set, identity_map)
             if isinstance(episode_results, list):
                 episodes = [
                     episode
@@ -40,7 +40,7 @@ class PersonalService(Base):
             return await self._get_json(url_template=URLs.EXPERIENCE_MENU)
 
         json_resp = await self.requests.run(call)
-        menu = parse_menu(json_resp)
+        menu = parse_menu(json_resp, identity_map=self.identity_map)
         if not isinstance(menu, Menu) or not menu or len(menu.sub_items) == 0:
             raise APIResponseError("Menu not converted correctly")
         if recommendations == MenuRecommendationOptions.EXCLUDE:
@@ -56,6 +56,8 @@ class PersonalService(Base):
         else:
             filtered_menu = list(menu.sub_items)
         menu.sub_items = filtered_menu
+        if self.changes is not None:
+            menu = self.changes.update(f"menu:{recommendations.value}", menu)
         return menu
 
     async def get_podcasts_menu_item(self) -> MenuItem:
@@ -63,21 +65,25 @@ class PersonalService(Base):
         return MenuItem(
             id="podcasts",
             title="Podcasts",
-            sub_items=parse_menu(json).sub_items,
+            sub_items=parse_menu(json, identity_map=self.identity_map).sub_items,
         )
 
     async def get_music_menu_item(self) -> MenuItem:
         return MenuItem(
             id="music",
             title="Music",
-            sub_items=parse_menu(await self._get_json(URLs.MUSIC)).sub_items,
+            sub_items=parse_menu(
+                await self._get_json(URLs.MUSIC), identity_map=self.identity_map
+            ).sub_items,
         )
 
     async def get_news_menu_item(self) -> MenuItem:
         return MenuItem(
             id="news",
             title="News",
-            sub_items=parse_menu(await self._get_json(URLs.NEWS)).sub_items,
+            sub_items=parse_menu(
+                await self._get_json(URLs.NEWS), identity_map=self.identity_map
+            ).sub_items,
         )
 
     async def get_explore_all(self):
@@ -95,22 +101,30 @@ class PersonalService(Base):
         async def call():
             return await self._get_json(url_template=SignedInURLs.LATEST)
 
-        return parse_container(await self.requests.run(call))
+        return parse_container(
+            await self.requests.run(call), identity_map=self.identity_map
+        )
 
     async def get_subscriptions(self):
         async def call():
             return await self._get_json(url_template=SignedInURLs.SUBSCRIBED)
 
-        return parse_container(await self.requests.run(call))
+        return parse_container(
+            await self.requests.run(call), identity_map=self.identity_map
+        )
 
     async def get_bookmarks(self):
         async def call():
             return await self._get_json(url_template=SignedInURLs.BOOKMARKS)
 
-        return parse_container(await self.requests.run(call))
+        return parse_container(
+            await self.requests.run(call), identity_map=self.identity_map
+        )
 
     async def continue_listening(self):
         async def call():
             return await self._get_json(url_template=SignedInURLs.CONTINUE)
 
-        return parse_container(await self.requests.run(call))
+        return parse_container(
+            await self.requests.run(call), identity_map=self.identity_map
+        )
@@ -0,0 +1,173 @@
+"""Reports play progress in batches rather than on every heartbeat.
+
+Plays are queued and sent on a fixed cadence. A heartbeat is dropped once a
+later report for the same PID is queued, since only the latest elapsed time
+matters, but starts, pauses and ends are all kept in order. While offline the
+queue is kept, and saved to a file so it outlasts the session.
+"""
+
+import asyncio
+import contextlib
+import json
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+
+from sounds import constants
+from sounds.constants import PlayStatus
+from sounds.exceptions import (
+    APIResponseError,
+    NotFoundError,
+    ServerError,
+    SoundsException,
+    UnauthorisedError,
+)
+from sounds.streaming import StreamingService
+
+
+@dataclass
+class PlayReport:
+    """A play status waiting to be sent."""
+
+    pid: str
+    elapsed_time: int
+    action: PlayStatus
+
+    def to_dict(self) -> dict:
+        return {
+            "pid": self.pid,
+            "elapsed_time": self.elapsed_time,
+            "action": self.action.value,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "PlayReport":
+        return cls(
+            pid=data["pid"],
+            elapsed_time=int(data["elapsed_time"]),
+            action=PlayStatus(data["action"]),
+        )
+
+
+class PlayStatusReporter:
+    """Queues play statuses and sends them in the background."""
+
+    def __init__(
+        self,
+        streaming: StreamingService,
+        logger: logging.Logger | None = None,
+        interval: float = constants.PLAY_REPORT_INTERVAL,
+        queue_file: str | Path | None = None,
+    ) -> None:
+        """
+        :param interval: Seconds between sending queued reports
+        :param queue_file: Where unsent reports are kept while offline, if anywhere
+        """
+        self.streaming = streaming
+        self.logger = logger or logging.getLogger(__name__)
+        self.interval = interval
+        self.queue_file = Path(queue_file) if queue_file else None
+        self._queue: list[PlayReport] = []
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self.load()
+
+    @property
+    def pending(self) -> list[PlayReport]:
+        return list(self._queue)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def report(self, pid: str, elapsed_time: int, action: PlayStatus) -> None:
+        """Queues a play status, replacing any heartbeat of the same PID still queued."""
+        self._queue = [
+            queued
+            for queued in self._queue
+            if not (queued.pid == pid and queued.action is PlayStatus.HEARTBEAT)
+        ]
+        self._queue.append(
+            PlayReport(pid=pid, elapsed_time=elapsed_time, action=action)
+        )
+
+    async def flush(self) -> bool:
+        """
+        Sends the queued reports in order
+
+        Reports the API refuses are dropped. On a network error, timeout or server
+        error the rest stay queued to be sent next time.
+
+        :return: Whether the queue was emptied
+        """
+        async with self._lock:
+            for report in list(self._queue):
+                try:
+                    await self.streaming.update_play_status(
+                        pid=report.pid,
+                        elapsed_time=report.elapsed_time,
+                        action=report.action,
+                    )
+                except (ServerError, TimeoutError) as e:
+                    self.logger.info(f"Keeping play reports queued to retry: {e!r}")
+                    break
+                except (APIResponseError, NotFoundError, UnauthorisedError) as e:
+                    self.logger.warning(f"Dropping play report {report}: {e}")
+                except SoundsException as e:
+                    self.logger.info(f"Keeping play reports queued while offline: {e}")
+                    break
+                # Reports may have been queued or superseded while sending
+                self._queue = [queued for queued in self._queue if queued is not report]
+            self.save()
+            return not self._queue
+
+    def start(self) -> None:
+        """Starts sending queued reports every `interval` seconds."""
+        if not self.running:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        """Stops sending in the background, sending anything still queued."""
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        if self._queue:
+            await self.flush()
+
+    async def __aenter__(self) -> "PlayStatusReporter":
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    def load(self) -> None:
+        if not self.queue_file or not self.queue_file.exists():
+            return
+        try:
+            saved = json.loads(self.queue_file.read_text())
+            self._queue = [PlayReport.from_dict(report) for report in saved]
+        except OSError, ValueError, KeyError, TypeError:
+            self.logger.warning(f"Ignoring unreadable play queue {self.queue_file}")
+
+    def save(self) -> None:
+        """Saves unsent reports to `queue_file`, removing it once they're all sent."""
+        if not self.queue_file:
+            return
+        try:
+            if self._queue:
+                self.queue_file.write_text(
+                    json.dumps([report.to_dict() for report in self._queue])
+                )
+            else:
+                self.queue_file.unlink(missing_ok=True)
+        except OSError as e:
+            self.logger.warning(f"Failed to save play queue: {e}")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            if self._queue:
+                await self.flush()
@@ -0,0 +1,254 @@
+"""Events at the exact times programmes start and end.
+
+Rather than polling for the current programme, `ProgrammeScheduler` loads the
+schedule of each watched station and keeps one heap of their start and end
+times, with a single `loop.call_at` timer armed for the earliest. Schedules
+refetched through the change feed are re-synced. Boundaries which passed while a
+schedule was being reloaded are emitted late rather than skipped.
+"""
+
+import asyncio
+import contextlib
+import heapq
+import itertools
+import logging
+from dataclasses import dataclass
+from datetime import UTC
+from datetime import datetime as dt
+from typing import AsyncIterator, Literal
+
+from sounds import constants
+from sounds.diff import ChangeFeed, ChangeSet
+from sounds.models import Schedule, ScheduleItem
+from sounds.schedule import ScheduleService
+
+type ProgrammeEventKind = Literal["started", "ended"]
+
+
+@dataclass
+class ProgrammeEvent:
+    """A programme starting or ending on a station."""
+
+    kind: ProgrammeEventKind
+    station_id: str
+    item: ScheduleItem
+    at: dt
+
+
+@dataclass(order=True)
+class _Timer:
+    # Event loop time, then the order timers were added in, so an ending
+    # programme comes before the next one starting at the same moment
+    when: float
+    sequence: int
+    station_id: str = ""
+    generation: int = 0
+    # None to load the station's schedule again
+    event: ProgrammeEvent | None = None
+
+
+class ProgrammeScheduler:
+    """Emits programme started and ended events for a set of stations."""
+
+    def __init__(
+        self,
+        schedules: ScheduleService,
+        changes: ChangeFeed | None = None,
+        logger: logging.Logger | None = None,
+        retry_after: float = constants.PROGRAMME_RELOAD_RETRY,
+    ) -> None:
+        """
+        :param changes: Re-sync stations when their schedules are refetched
+        :param retry_after: Seconds to wait before loading a schedule again when
+            it failed to load or had nothing left to air
+        """
+        self.schedules = schedules
+        self.changes = changes
+        self.logger = logger or logging.getLogger(__name__)
+        self.retry_after = retry_after
+        self._timers: list[_Timer] = []
+        self._sequence = itertools.count()
+        # Bumped whenever a station is re-synced, leaving its old timers stale
+        self._generations: dict[str, int] = {}
+        self._watched: dict[str, Schedule | None] = {}
+        # The time of each station's latest emitted event, and the events emitted
+        # at that time, so re-syncing neither repeats nor skips any
+        self._emitted: dict[str, tuple[dt, set[tuple[str, str]]]] = {}
+        self._handle: asyncio.TimerHandle | None = None
+        self._armed_for: _Timer | None = None
+        self._queues: set[asyncio.Queue[ProgrammeEvent | None]] = set()
+        self._tasks: set[asyncio.Task] = set()
+        self._unsubscribe = None
+
+    @property
+    def station_ids(self) -> list[str]:
+        return list(self._watched)
+
+    async def watch(self, station_id: str, refresh: bool = False) -> None:
+        """
+        Loads a station's schedule and starts emitting its programme events
+
+        :param refresh: Fetch the schedule even if a cached one is still current
+        """
+        if self.changes is not None and self._unsubscribe is None:
+            self._unsubscribe = self.changes.subscribe(self._on_changes)
+        try:
+            schedule = await self.schedules.get_schedule(station_id, refresh=refresh)
+        except Exception as e:
+            self.logger.warning(f"Failed to get schedule for {station_id}: {e}")
+            schedule = None
+        self.sync(station_id, schedule)
+
+    def unwatch(self, station_id: str) -> None:
+        self._watched.pop(station_id, None)
+        self._emitted.pop(station_id, None)
+        self._generations[station_id] = self._generations.get(station_id, 0) + 1
+        self._arm()
+
+    def sync(self, station_id: str, schedule: Schedule | None) -> None:
+        """Replaces a station's timers with those from its schedule."""
+        generation = self._generations.get(station_id, 0) + 1
+        self._generations[station_id] = generation
+        self._watched[station_id] = schedule
+
+        loop = asyncio.get_running_loop()
+        loop_now = loop.time()
+        now = dt.now(UTC)
+        # Past events are only emitted if they came after the last one emitted,
+        # e.g. a programme that started while its schedule was reloading
+        emitted_at, emitted = self._emitted.get(station_id, (now, set()))
+        last = 0.0
+        for item in (schedule.sub_items if schedule else None) or []:
+            for kind, at in (("started", item.start), ("ended", item.end)):
+                if not isinstance(at, dt):
+                    continue
+                if at.tzinfo is None:
+                    at = at.replace(tzinfo=UTC)
+                if at < emitted_at or (
+                    at == emitted_at
+                    and ((kind, item.id) in emitted or station_id not in self._emitted)
+                ):
+                    continue
+                delay = max((at - now).total_seconds(), 0.0)
+                last = max(last, delay)
+                self._push(
+                    loop_now + delay,
+                    station_id,
+                    generation,
+                    ProgrammeEvent(kind=kind, station_id=station_id, item=item, at=at),
+                )
+
+        # Load the next schedule once this one has run out
+        self._push(loop_now + (last or self.retry_after), station_id, generation)
+        self._arm()
+
+    def events(self) -> AsyncIterator[ProgrammeEvent]:
+        """Subscribes to programme events on the watched stations.
+
+        Events are queued from when this is called, and the iterator ends when
+        the scheduler is closed.
+        """
+        queue: asyncio.Queue[ProgrammeEvent | None] = asyncio.Queue()
+        self._queues.add(queue)
+
+        async def iterate() -> AsyncIterator[ProgrammeEvent]:
+            try:
+                while (event := await queue.get()) is not None:
+                    yield event
+            finally:
+                self._queues.discard(queue)
+
+        return iterate()
+
+    def __aiter__(self) -> AsyncIterator[ProgrammeEvent]:
+        return self.events()
+
+    async def close(self) -> None:
+        """Stops all timers, ending every subscriber's iterator."""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        self._armed_for = None
+        self._timers.clear()
+        self._watched.clear()
+        if self._unsubscribe is not None:
+            self._unsubscribe()
+            self._unsubscribe = None
+        for task in list(self._tasks):
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        for queue in self._queues:
+            queue.put_nowait(None)
+
+    def _push(
+        self,
+        when: float,
+        station_id: str,
+        generation: int,
+        event: ProgrammeEvent | None = None,
+    ) -> None:
+        heapq.heappush(
+            self._timers,
+            _Timer(when, next(self._sequence), station_id, generation, event),
+        )
+
+    def _is_stale(self, timer: _Timer) -> bool:
+        return (
+            timer.station_id not in self._watched
+            or self._generations.get(timer.station_id) != timer.generation
+        )
+
+    def _arm(self) -> None:
+        """Sets the timer for the earliest live entry in the heap."""
+        while self._timers and self._is_stale(self._timers[0]):
+            heapq.heappop(self._timers)
+        earliest = self._timers[0] if self._timers else None
+        if earliest is self._armed_for:
+            return
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        self._armed_for = earliest
+        if earliest is not None:
+            loop = asyncio.get_running_loop()
+            self._handle = loop.call_at(earliest.when, self._fire)
+
+    def _fire(self) -> None:
+        self._handle = None
+        self._armed_for = None
+        now = asyncio.get_running_loop().time()
+        while self._timers and self._timers[0].when <= now:
+            timer = heapq.heappop(self._timers)
+            if self._is_stale(timer):
+                continue
+            if timer.event is None:
+                self._reload(timer.station_id)
+            else:
+                self._record_emitted(timer.event)
+                for queue in self._queues:
+                    queue.put_nowait(timer.event)
+        self._arm()
+
+    def _record_emitted(self, event: ProgrammeEvent) -> None:
+        key = (event.kind, event.item.id)
+        emitted_at, emitted = self._emitted.get(event.station_id, (event.at, set()))
+        if event.at > emitted_at:
+            self._emitted[event.station_id] = (event.at, {key})
+        elif event.at == emitted_at:
+            emitted.add(key)
+            self._emitted[event.station_id] = (emitted_at, emitted)
+
+    def _reload(self, station_id: str) -> None:
+        # Refreshed, as the cached schedule may be kept until a midnight which
+        # isn't the schedule's
+        task = asyncio.ensure_future(self.watch(station_id, refresh=True))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _on_changes(self, change_set: ChangeSet) -> None:
+        # Refetched schedules are updated in place, so re-read the one we hold
+        kind, _, rest = change_set.name.partition(":")
+        station_id, _, date = rest.rpartition(":")
+        if kind == "schedule" and date == "today" and station_id in self._watched:
+            self.sync(station_id, self._watched[station_id])
@@ -0,0 +1,428 @@
+"""A local HTTP relay which prefetches HLS segments ahead of the player.
+
+The player is given a local playlist URL instead of the CDN's. Playlists are
+fetched upstream and rewritten so every variant, init section and segment is
+requested from the relay. Once the player asks for a segment, the next few
+are fetched in the background into a bounded in-memory buffer, so a slow
+upstream response is usually already hidden by the time they're wanted.
+
+Streams the player hasn't asked for in a while are forgotten, with the
+playlists and hosts relayed for them.
+
+In fan-out mode, several players listen to the same stream through one relay.
+Each segment is fetched upstream once and every listener is served the same
+bytes, which are dropped once all the listeners have read them.
+"""
+
+import asyncio
+import base64
+import binascii
+import itertools
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from urllib.parse import quote, urljoin, urlparse
+
+from aiohttp import web
+
+from sounds import constants
+from sounds.base import Base
+from sounds.exceptions import SoundsException
+from sounds.hls import ThroughputEstimator
+
+# URI="..." attributes, e.g. of EXT-X-MAP or EXT-X-MEDIA tags
+_URI_ATTRIBUTE = re.compile(r'URI="([^"]*)"')
+
+_CONTENT_TYPES = {
+    ".aac": "audio/aac",
+    ".ts": "video/mp2t",
+    ".m4s": "audio/mp4",
+    ".mp4": "audio/mp4",
+    ".m4a": "audio/mp4",
+}
+
+
+@dataclass
+class _RelayedStream:
+    # Only these hosts are fetched from for the stream's segments
+    hosts: set[str] = field(default_factory=set)
+    # Monotonic time the player last asked for any of the stream
+    last_used: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class _RelayedPlaylist:
+    id: str
+    url: str
+    # The stream added with `add_stream` the playlist belongs to
+    stream: _RelayedStream
+    # Upstream segment URLs in the latest copy of the playlist, in order
+    segments: list[str] = field(default_factory=list)
+    # The segment the player asked for last
+    position: str | None = None
+
+
+class SegmentBuffer:
+    """The most recently fetched segments, evicting the least recently used."""
+
+    def __init__(self, max_segments: int = constants.RELAY_BUFFER_SEGMENTS) -> None:
+        self.max_segments = max_segments
+        self._segments: OrderedDict[str, bytes] = OrderedDict()
+
+    def get(self, url: str) -> bytes | None:
+        data = self._segments.get(url)
+        if data is not None:
+            self._segments.move_to_end(url)
+        return data
+
+    def put(self, url: str, data: bytes) -> None:
+        self._segments[url] = data
+        self._segments.move_to_end(url)
+        while len(self._segments) > self.max_segments:
+            self._segments.popitem(last=False)
+
+    def release(self, url: str, listener: str | None) -> None:
+        """Notes a listener has read a segment, which this buffer doesn't track."""
+
+    def __contains__(self, url: str) -> bool:
+        return url in self._segments
+
+    def __len__(self) -> int:
+        return len(self._segments)
+
+
+@dataclass
+class _SharedSegment:
+    data: memoryview
+    # Listeners which haven't read the segment yet
+    unread: set[str]
+
+
+class SharedSegmentBuffer(SegmentBuffer):
+    """
+    Segments shared by several listeners without copying them
+
+    Each segment is kept until every listener present when it arrived has read
+    it, or until it's the oldest of more than `max_segments`, e.g. because a
+    listener stopped reading.
+    """
+
+    def __init__(
+        self, max_segments: int = constants.RELAY_SHARED_BUFFER_SEGMENTS
+    ) -> None:
+        self.max_segments = max_segments
+        self._shared: OrderedDict[str, _SharedSegment] = OrderedDict()
+        self._listeners: set[str] = set()
+
+    @property
+    def listeners(self) -> set[str]:
+        return set(self._listeners)
+
+    def add_listener(self, listener: str) -> None:
+        self._listeners.add(listener)
+
+    def remove_listener(self, listener: str) -> None:
+        """Stops tracking a listener, freeing segments only it had left to read."""
+        self._listeners.discard(listener)
+        for url in list(self._shared):
+            self.release(url, listener)
+
+    def get(self, url: str) -> memoryview | None:
+        segment = self._shared.get(url)
+        return segment.data if segment else None
+
+    def put(self, url: str, data: bytes) -> None:
+        self._shared[url] = _SharedSegment(
+            data=memoryview(data), unread=set(self._listeners)
+        )
+        self._shared.move_to_end(url)
+        while len(self._shared) > self.max_segments:
+            self._shared.popitem(last=False)
+
+    def release(self, url: str, listener: str | None) -> None:
+        segment = self._shared.get(url)
+        if segment is None or listener is None:
+            return
+        segment.unread.discard(listener)
+        if not segment.unread:
+            del self._shared[url]
+
+    def __contains__(self, url: str) -> bool:
+        return url in self._shared
+
+    def __len__(self) -> int:
+        return len(self._shared)
+
+
+def _listener_query(listener: str) -> str:
+    return f"?listener={quote(listener, safe='')}"
+
+
+def _encode_url(url: str) -> str:
+    return base64.urlsafe_b64encode(url.encode()).decode().rstrip("=")
+
+
+def _decode_url(encoded: str) -> str:
+    return base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)).decode()
+
+
+class HLSRelay(Base):
+    """Serves HLS streams to a local player, prefetching segments ahead of it."""
+
+    def __init__(
+        self,
+        *args,
+        host: str = constants.RELAY_HOST,
+        port: int = 0,
+        prefetch: int = constants.RELAY_PREFETCH_SEGMENTS,
+        buffer: SegmentBuffer | None = None,
+        throughput: ThroughputEstimator | None = None,
+        fan_out: bool = False,
+        idle_timeout: float = constants.RELAY_STREAM_IDLE_TIMEOUT,
+        **kwargs,
+    ):
+        """
+        :param port: The port to listen on, 0 for any free one
+        :param prefetch: How many segments to fetch ahead of the player
+        :param buffer: Where segments are kept, a bounded in-memory buffer by default
+        :param throughput: Measures segment downloads, e.g. for picking HLS variants
+        :param fan_out: Share segments between listeners, see `add_stream`
+        :param idle_timeout: Seconds a stream is kept after it was last played
+        """
+        super().__init__(*args, **kwargs)
+        self.host = host
+        self.port = port
+        self.prefetch = prefetch
+        if buffer is None:
+            buffer = SharedSegmentBuffer() if fan_out else SegmentBuffer()
+        self.buffer = buffer
+        self.throughput = throughput
+        self.idle_timeout = idle_timeout
+        self._ids = itertools.count()
+        self._playlists: dict[str, _RelayedPlaylist] = {}
+        self._playlist_ids: dict[str, str] = {}
+        self._fetches: dict[str, asyncio.Future[bytes]] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._runner: web.AppRunner | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._runner is not None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self) -> None:
+        """Starts listening, on a free port unless one was given."""
+        if self._runner is not None:
+            return
+        app = web.Application()
+        app.add_routes(
+            [
+                web.get("/playlists/{playlist_id}.m3u8", self._serve_playlist),
+                web.get("/segments/{playlist_id}/{encoded_url}", self._serve_segment),
+            ]
+        )
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, self.host, self.port)
+        await site.start()
+        self._runner = runner
+        # Find the port picked when asked for any free one
+        self.port = runner.addresses[0][1]
+
+    async def stop(self) -> None:
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "HLSRelay":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    def add_stream(self, url: str, listener: str | None = None) -> str:
+        """
+        Relays a stream, e.g. from `get_live_stream` or `get_episode_stream`
+
+        :param listener: Names the player in fan-out mode, so segments are kept
+            until it and every other listener have read them
+        :return: The local playlist URL to give the player
+        """
+        self._prune()
+        playlist_id = self._register(url)
+        self._playlists[playlist_id].stream.last_used = time.monotonic()
+        local_url = f"{self.base_url}/playlists/{playlist_id}.m3u8"
+        if listener is None:
+            return local_url
+        if isinstance(self.buffer, SharedSegmentBuffer):
+            self.buffer.add_listener(listener)
+        return local_url + _listener_query(listener)
+
+    def remove_listener(self, listener: str) -> None:
+        """Stops keeping segments for a listener which has stopped playing."""
+        if isinstance(self.buffer, SharedSegmentBuffer):
+            self.buffer.remove_listener(listener)
+
+    def _register(self, url: str, stream: _RelayedStream | None = None) -> str:
+        """Relays a playlist, as a new stream unless it's one of `stream`'s."""
+        if url not in self._playlist_ids:
+            if stream is None:
+                stream = _RelayedStream()
+            playlist_id = str(next(self._ids))
+            self._playlist_ids[url] = playlist_id
+            self._playlists[playlist_id] = _RelayedPlaylist(
+                id=playlist_id, url=url, stream=stream
+            )
+            stream.hosts.add(urlparse(url).netloc)
+        return self._playlist_ids[url]
+
+    def _prune(self) -> None:
+        """Forgets the playlists of streams which haven't been played in a while."""
+        idle_since = time.monotonic() - self.idle_timeout
+        for playlist_id, playlist in list(self._playlists.items()):
+            if playlist.stream.last_used < idle_since:
+                del self._playlists[playlist_id]
+                del self._playlist_ids[playlist.url]
+
+    async def _serve_playlist(self, request: web.Request) -> web.Response:
+        playlist = self._playlists.get(request.match_info["playlist_id"])
+        if playlist is None:
+            raise web.HTTPNotFound()
+        playlist.stream.last_used = time.monotonic()
+        self._prune()
+        try:
+            text = await self._get_html(url=playlist.url)
+        except (SoundsException, TimeoutError) as e:
+            self.logger.warning(f"Failed to relay playlist {playlist.url}: {e}")
+            raise web.HTTPBadGateway()
+        body = self._rewrite(playlist, text, request.query.get("listener"))
+        # A live playlist lists new segments, so carry on from where the player is
+        if playlist.position is not None:
+            self._prefetch_after(playlist, playlist.position)
+        return web.Response(text=body, content_type="application/vnd.apple.mpegurl")
+
+    async def _serve_segment(self, request: web.Request) -> web.Response:
+        playlist = self._playlists.get(request.match_info["playlist_id"])
+        try:
+            url = _decode_url(request.match_info["encoded_url"])
+        except binascii.Error, UnicodeDecodeError:
+            raise web.HTTPNotFound()
+        if playlist is None or urlparse(url).netloc not in playlist.stream.hosts:
+            raise web.HTTPNotFound()
+        playlist.stream.last_used = time.monotonic()
+
+        data = self.buffer.get(url)
+        # Start on the segment asked for before any after it
+        fetch = (
+            None
+            if data is not None
+            else self._fetches.get(url) or self._start_fetch(url)
+        )
+        if url in playlist.segments:
+            playlist.position = url
+            self._prefetch_after(playlist, url)
+        try:
+            if fetch is not None:
+                # Shielded, so a player hanging up doesn't cancel it for the buffer
+                data = await asyncio.shield(fetch)
+        except (SoundsException, TimeoutError) as e:
+            self.logger.warning(f"Failed to relay segment {url}: {e}")
+            raise web.HTTPBadGateway()
+        # The response holds its own reference, so the buffer can let it go
+        self.buffer.release(url, request.query.get("listener"))
+        suffix = urlparse(url).path.rpartition(".")[2]
+        return web.Response(
+            body=data,
+            content_type=_CONTENT_TYPES.get(f".{suffix}", "application/octet-stream"),
+        )
+
+    def _rewrite(
+        self, playlist: _RelayedPlaylist, text: str, listener: str | None = None
+    ) -> str:
+        """Points a playlist's URIs at the relay, noting its segments in order."""
+        query = _listener_query(listener) if listener else ""
+        lines = []
+        segments = []
+        is_variant = False
+        for line in text.splitlines():
+            stripped = line.strip()
+            if stripped.startswith("#EXT-X-STREAM-INF"):
+                is_variant = True
+            elif stripped.startswith(("#EXT-X-MEDIA:", "#EXT-X-I-FRAME-STREAM-INF")):
+                line = _URI_ATTRIBUTE.sub(
+                    lambda match: (
+                        f'URI="{self._playlist_path(playlist, match.group(1))}{query}"'
+                    ),
+                    line,
+                )
+            elif stripped.startswith("#EXT-X-MAP"):
+                line = _URI_ATTRIBUTE.sub(
+                    lambda match: (
+                        f'URI="{self._segment_path(playlist, urljoin(playlist.url, match.group(1)))}{query}"'
+                    ),
+                    line,
+                )
+            elif stripped.startswith("#EXT-X-KEY"):
+                # Keys are fetched by the player, so just make them absolute
+                line = _URI_ATTRIBUTE.sub(
+                    lambda match: f'URI="{urljoin(playlist.url, match.group(1))}"', line
+                )
+            elif stripped and not stripped.startswith("#"):
+                if is_variant:
+                    line = self._playlist_path(playlist, stripped) + query
+                    is_variant = False
+                else:
+                    url = urljoin(playlist.url, stripped)
+                    segments.append(url)
+                    line = self._segment_path(playlist, url) + query
+            lines.append(line)
+        playlist.segments = segments
+        return "\n".join(lines) + "\n"
+
+    def _playlist_path(self, playlist: _RelayedPlaylist, uri: str) -> str:
+        playlist_id = self._register(urljoin(playlist.url, uri), playlist.stream)
+        return f"/playlists/{playlist_id}.m3u8"
+
+    def _segment_path(self, playlist: _RelayedPlaylist, url: str) -> str:
+        playlist.stream.hosts.add(urlparse(url).netloc)
+        return f"/segments/{playlist.id}/{_encode_url(url)}"
+
+    def _prefetch_after(self, playlist: _RelayedPlaylist, url: str) -> None:
+        try:
+            index = playlist.segments.index(url)
+        except ValueError:
+            return
+        for next_url in playlist.segments[index + 1 : index + 1 + self.prefetch]:
+            if next_url not in self.buffer and next_url not in self._fetches:
+                self._start_fetch(next_url)
+
+    def _start_fetch(self, url: str) -> asyncio.Future[bytes]:
+        fetch = asyncio.ensure_future(self._fetch_segment(url))
+        self._fetches[url] = fetch
+        self._tasks.add(fetch)
+
+        def done(task: asyncio.Task) -> None:
+            self._fetches.pop(url, None)
+            self._tasks.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                self.logger.debug(f"Failed to prefetch {url}: {task.exception()}")
+
+        fetch.add_done_callback(done)
+        return fetch
+
+    async def _fetch_segment(self, url: str) -> bytes:
+        started = time.monotonic()
+        data = await self._get_bytes(url)
+        if self.throughput is not None:
+            self.throughput.add_sample(len(data), time.monotonic() - started)
+        self.buffer.put(url, data)
+        return data
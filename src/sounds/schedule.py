@@ -1,18 +1,57 @@
+import math
+import time
+from datetime import UTC, date, timedelta, tzinfo
 from datetime import datetime as dt
-from typing import Optional, cast
+from functools import partial
+from typing import Iterable, Optional, cast
 
 from sounds import constants
 from sounds.base import Base
+from sounds.catalogue import StationCatalogue
 from sounds.constants import URLs
 from sounds.exceptions import InvalidFormatError
-from sounds.models import LiveProgramme, Schedule, Segment
-from sounds.parser import parse_container, parse_node, parse_schedule
+from sounds.models import LiveProgramme, Schedule, ScheduleItem, Segment
+from sounds.parser import parse_container, parse_schedule
+from sounds.utils import run_concurrently
 
 
 class ScheduleService(Base):
+    def __init__(
+        self,
+        *args,
+        catalogue: StationCatalogue | None = None,
+        timezone: tzinfo | None = None,
+        **kwargs,
+    ):
+        """
+        :param timezone: The timezone schedules change over at midnight in
+        """
+        super().__init__(*args, **kwargs)
+        # Current programmes are answered from the shared station list
+        self.catalogue = catalogue or StationCatalogue(*args, **kwargs)
+        self.timezone = timezone or UTC
+        # Schedules by station and date, with when they can next change
+        self._schedules: dict[tuple[str, str | None], tuple[Schedule, float]] = {}
+        # Recent segments by station and number of results, until the current one ends
+        self._segments: dict[tuple[str, int], tuple[list[Segment], float]] = {}
+
     async def get_schedule(
-        self, station_id: str, date: str | None = None
+        self, station_id: str, date: str | None = None, refresh: bool = False
     ) -> Schedule | None:
+        """
+        Gets a station's schedule for a day
+
+        Schedules are cached until midnight in the client's timezone, and days
+        which have finished airing are kept as they can't change.
+
+        :param date: The day, as YYYY-MM-DD, defaults to today
+        :param refresh: Fetch the schedule even if the cached one is still current
+        """
+        key = (station_id, date)
+        cached = self._schedules.get(key)
+        if cached and not refresh and time.time() < cached[1]:
+            return cached[0]
+
         url_template = URLs.SCHEDULE
         if date:
             url_template = URLs.SCHEDULE_DATE
@@ -25,35 +64,139 @@ class ScheduleService(Base):
         json_resp = await self._get_json(
             url_template=url_template, url_args={"station_id": station_id, "date": date}
         )
-        schedule = parse_schedule(json_resp)
-        return schedule if isinstance(schedule, Schedule) else None
+        schedule = parse_schedule(json_resp, identity_map=self.identity_map)
+        if not isinstance(schedule, Schedule):
+            return None
+        if self.changes is not None:
+            schedule = self.changes.update(
+                f"schedule:{station_id}:{date or 'today'}", schedule
+            )
+        self._prune_schedules()
+        self._schedules[key] = (schedule, self._schedule_expiry(schedule))
+        return schedule
+
+    def _schedule_expiry(self, schedule: Schedule) -> float:
+        """Schedules change over at midnight, unless they've already finished."""
+        if _has_finished(schedule):
+            return math.inf
+        return _next_midnight(self.timezone).timestamp()
+
+    def _prune_schedules(self) -> None:
+        now = time.time()
+        # Nothing older than the schedule history is asked for again
+        oldest = (
+            dt.now(UTC).date() - timedelta(days=constants.SCHEDULE_HISTORY_DAYS)
+        ).isoformat()
+        for key in [
+            key
+            for key, (_, expires_at) in self._schedules.items()
+            if expires_at <= now or (key[1] is not None and key[1] < oldest)
+        ]:
+            del self._schedules[key]
+
+    async def get_schedules(
+        self,
+        station_id: str,
+        start_date: date | str,
+        end_date: date | str | None = None,
+    ) -> Schedule:
+        """
+        Gets a station's schedule over a range of days as one timeline
+
+        Days are fetched concurrently, and cached as by `get_schedule`.
+
+        :param start_date: The first day, as a date or YYYY-MM-DD
+        :param end_date: The last day, inclusive, defaults to `start_date`
+        :return: A schedule of every item over the days, in order of start time,
+            with items spanning midnight only included once
+        """
+        start = _as_date(start_date)
+        end = _as_date(end_date) if end_date else start
+        if end < start:
+            raise InvalidFormatError("end_date must not be before start_date")
+        days = [start + timedelta(days=n) for n in range((end - start).days + 1)]
+
+        results = await run_concurrently(
+            partial(self._get_day, station_id),
+            days,
+            limit=constants.SCHEDULE_RANGE_MAX_CONCURRENT,
+        )
+        items: dict[str, ScheduleItem] = {}
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+            for item in (result.sub_items if result else None) or []:
+                # By broadcast, as repeats of an episode share its URN
+                items.setdefault(item.id, item)
+
+        return Schedule(
+            id=f"{start.isoformat()}/{end.isoformat()}",
+            sub_items=sorted(items.values(), key=_start_time),
+        )
+
+    async def _get_day(self, station_id: str, day: date) -> Schedule | None:
+        return await self.get_schedule(station_id, date=day.isoformat())
 
     async def current_programme(self, station_id: str) -> Optional[LiveProgramme]:
-        json_resp = await self._get_json(url_template=constants.URLs.STATIONS)
-        listing = next(
-            (
-                station
-                for station in json_resp["data"][0]["data"]
-                if station.get("id") == station_id
-            ),
-            None,
+        return cast(
+            Optional[LiveProgramme],
+            await self.catalogue.current_programme(station_id),
+        )
+
+    async def current_programmes(
+        self, station_ids: Iterable[str]
+    ) -> dict[str, Optional[LiveProgramme]]:
+        """Gets the current programme of several stations from one station list."""
+        return cast(
+            dict[str, Optional[LiveProgramme]],
+            await self.catalogue.current_programmes(station_ids),
         )
-        if listing:
-            listing = cast(LiveProgramme, parse_node(listing))
-        return listing
 
     async def recently_played_items(
-        self, station_id: str, image_size=450, results=10
+        self, station_id: str, image_size=450, results=10, refresh: bool = False
     ) -> list[Segment]:
-        """Gets the recent playing items on this station"""
+        """
+        Gets the recent playing items on this station
+
+        Items are cached until the segment playing is expected to end.
+
+        :param refresh: Fetch the items even if the cached ones are still current
+        """
+        key = (station_id, results)
+        cached = self._segments.get(key)
+        if cached and not refresh and time.time() < cached[1]:
+            return list(cached[0])
+
         json_resp = await self._get_json(
             url_template=URLs.NOW_PLAYING,
             url_args={"station_id": station_id, "limit": results},
         )
-        segments = parse_container(json_resp)
-        if isinstance(segments, list):
-            return [segment for segment in segments if isinstance(segment, Segment)]
-        return []
+        segments = parse_container(json_resp, identity_map=self.identity_map)
+        if not isinstance(segments, list):
+            return []
+        segments = [segment for segment in segments if isinstance(segment, Segment)]
+        self._segments[key] = (segments, self._segments_expiry(station_id, segments))
+        return list(segments)
+
+    def _segments_expiry(self, station_id: str, segments: list[Segment]) -> float:
+        """
+        When the playing segment should end, from its offset into the programme
+
+        The programme's start comes from the cached station list. Without it, or
+        with nothing playing, there's no telling when the next segment starts.
+        """
+        now = time.time()
+        fallback = now + constants.NOW_PLAYING_MIN_INTERVAL
+        if not segments or not segments[0].offset.get("now_playing"):
+            return fallback
+        end = segments[0].offset.get("end")
+        index = self.catalogue.cached_index
+        programme_start = index.programme_start(station_id) if index else None
+        if not isinstance(end, int) or programme_start is None:
+            return fallback
+        expires_at = programme_start + end
+        # Running over, so it may end at any moment
+        return expires_at if expires_at > now else fallback
 
     async def currently_playing_song(
         self, station_id, image_size=450
@@ -66,3 +209,42 @@ class ScheduleService(Base):
         except IndexError:
             pass
         return None
+
+
+def _as_date(value: date | str) -> date:
+    if isinstance(value, date):
+        return value
+    try:
+        return dt.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise InvalidFormatError(
+            "Invalid date specified, must be in the format YYYY-MM-DD"
+        )
+
+
+def _aware(value: dt) -> dt:
+    return value if value.tzinfo else value.replace(tzinfo=UTC)
+
+
+def _start_time(item: ScheduleItem) -> dt:
+    return (
+        _aware(item.start) if isinstance(item.start, dt) else dt.min.replace(tzinfo=UTC)
+    )
+
+
+def _next_midnight(timezone: tzinfo) -> dt:
+    tomorrow = dt.now(timezone).date() + timedelta(days=1)
+    midnight = dt(tomorrow.year, tomorrow.month, tomorrow.day)
+    # pytz timezones need localizing to get the right offset
+    if hasattr(timezone, "localize"):
+        return timezone.localize(midnight)
+    return midnight.replace(tzinfo=timezone)
+
+
+def _has_finished(schedule: Schedule) -> bool:
+    """Whether every item in a schedule has finished airing."""
+    now = dt.now(UTC)
+    return bool(schedule.sub_items) and all(
+        isinstance(item.end, dt) and _aware(item.end) <= now
+        for item in schedule.sub_items
+    )
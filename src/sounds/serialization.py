@@ -0,0 +1,122 @@
+"""Compact binary snapshots of parsed model trees.
+
+Snapshots hold already-built models (menus, schedules, station lists, containers)
+so they can be restored without decoding JSON or running them through
+`model_factory` again, e.g. to back a disk cache or to warm-start a worker.
+"""
+
+import io
+import os
+import pickle
+import struct
+import zlib
+from dataclasses import fields, is_dataclass
+from functools import cache
+from pathlib import Path
+from typing import Any
+
+from sounds import models
+from sounds.exceptions import InvalidFormatError
+
+MAGIC = b"SNDS"
+SNAPSHOT_VERSION = 1
+PICKLE_PROTOCOL = 5
+
+# magic, snapshot format version, fingerprint of the model definitions
+_HEADER = struct.Struct(">4sHI")
+
+# Only these globals may be referenced from a snapshot, anything else is refused
+_ALLOWED_GLOBALS = {
+    "builtins": {"list", "dict", "set", "frozenset", "tuple", "bytearray"},
+    "datetime": {"datetime", "date", "time", "timedelta", "timezone"},
+    "zoneinfo": {"ZoneInfo"},
+    "zoneinfo._common": {"ZoneInfo"},
+    "pytz": {"_p", "_UTC", "utc"},
+}
+
+
+@cache
+def _models_fingerprint() -> int:
+    """A checksum of every model's fields, so snapshots from other versions are rejected"""
+    signature = []
+    for name in sorted(vars(models)):
+        obj = getattr(models, name)
+        if (
+            isinstance(obj, type)
+            and is_dataclass(obj)
+            and obj.__module__ == models.__name__
+        ):
+            signature.append(f"{name}:{','.join(f.name for f in fields(obj))}")
+    return zlib.crc32(";".join(signature).encode())
+
+
+class _SnapshotUnpickler(pickle.Unpickler):
+    def find_class(self, module: str, name: str) -> Any:
+        # Pickle resolves dotted names attribute by attribute, which could reach
+        # anything a module imports, e.g. "pytz.os.system" via sounds.models
+        if "." not in name:
+            if name in _ALLOWED_GLOBALS.get(module, ()):
+                return super().find_class(module, name)
+            if module == models.__name__:
+                obj = getattr(models, name, None)
+                # Only the models' own classes, not whatever the module imported
+                if isinstance(obj, type) and obj.__module__ == models.__name__:
+                    return obj
+        raise InvalidFormatError(
+            f"Snapshot references a disallowed type: {module}.{name}"
+        )
+
+
+def dumps(obj: Any) -> bytes:
+    """Serialises a parsed model tree into a snapshot.
+
+    :param obj: A model, or a list/dict of models, e.g. a `Menu` or a list of `LiveStation`
+    :return: The snapshot as bytes
+    :rtype: bytes
+    """
+    header = _HEADER.pack(MAGIC, SNAPSHOT_VERSION, _models_fingerprint())
+    return header + pickle.dumps(obj, protocol=PICKLE_PROTOCOL)
+
+
+def loads(data: bytes) -> Any:
+    """Restores a model tree from a snapshot created by `dumps`.
+
+    :param data: The snapshot bytes
+    :return: The restored model tree
+    :raises InvalidFormatError: If the data isn't a snapshot, or was written by an
+        incompatible version of the models
+    """
+    if len(data) < _HEADER.size:
+        raise InvalidFormatError("Snapshot is truncated")
+    magic, version, fingerprint = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise InvalidFormatError("Not a snapshot")
+    if version != SNAPSHOT_VERSION:
+        raise InvalidFormatError(f"Unsupported snapshot version {version}")
+    if fingerprint != _models_fingerprint():
+        raise InvalidFormatError(
+            "Snapshot was created with different model definitions"
+        )
+
+    payload = memoryview(data)[_HEADER.size :]
+    try:
+        return _SnapshotUnpickler(io.BytesIO(payload)).load()
+    except (pickle.UnpicklingError, EOFError, AttributeError) as e:
+        raise InvalidFormatError(f"Corrupt snapshot: {e}")
+
+
+def dump(obj: Any, path: str | Path) -> None:
+    """Writes a snapshot to `path`, replacing any existing file atomically."""
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    tmp_path.write_bytes(dumps(obj))
+    os.replace(tmp_path, path)
+
+
+def load(path: str | Path) -> Any:
+    """Reads a snapshot written by `dump`.
+
+    :raises FileNotFoundError: If there is no snapshot at `path`
+    :raises InvalidFormatError: If the file isn't a compatible snapshot
+    """
+    return loads(Path(path).read_bytes())
@@ -1,4 +1,4 @@
-"""Not used, just some documentation on the possible types available from the API"""
+"""Documentation on the possible types available from the API, used to generate `sounds.decoders`"""
 
 sounds_types = {
     "DisplayItem": {
@@ -1,16 +1,19 @@
-import itertools
+import asyncio
 from datetime import datetime as dt
 from datetime import timedelta
-from typing import List, Literal, Optional
+from functools import lru_cache, partial
+from typing import Any, Callable, List, Literal, Optional
 
 from sounds import constants
 from sounds.base import Base
+from sounds.catalogue import StationCatalogue, StationIndex
 from sounds.constants import URLs
-from sounds.models import LiveStation, MenuItem, Network
+from sounds.epg import EPG
+from sounds.models import LazyItemList, LiveStation, MenuItem, Network, Schedule
 from sounds.parser import parse_container, parse_node
 from sounds.schedule import ScheduleService
 from sounds.streaming import StreamingService
-from sounds.utils import _date_with_ordinal
+from sounds.utils import _date_with_ordinal, run_concurrently
 
 
 class StationService(Base):
@@ -19,18 +22,30 @@ class StationService(Base):
         streaming: StreamingService,
         schedules: ScheduleService,
         *args,
+        catalogue: StationCatalogue | None = None,
         **kwargs,
     ):
         super().__init__(*args, **kwargs)
         self.streams = streaming
         self.schedules = schedules
 
-        # Simple cache to prevent fetching all stations each time
-        self.stations: list[LiveStation] = []
+        # Shared with the schedule service, so the station list is only fetched once
+        if catalogue is None and isinstance(schedules, ScheduleService):
+            catalogue = schedules.catalogue
+        self.catalogue = catalogue or StationCatalogue(*args, **kwargs)
+
+    @property
+    def stations(self) -> list[LiveStation]:
+        """The cached national and local stations, without fetching them."""
+        return self.catalogue.stations
+
+    async def get_index(self) -> StationIndex:
+        """Gets the station index, fetching the station list if needed."""
+        return await self.catalogue.get_index()
 
     async def get_stations_detailed(self) -> Optional[List[Network]]:
         json_resp = await self._get_json(url_template=URLs.NETWORKS_LIST)
-        stations = parse_container(json_resp)
+        stations = parse_container(json_resp, identity_map=self.identity_map)
         if isinstance(stations, list):
             station_list: List[Network] = [
                 station for station in stations if isinstance(station, Network)
@@ -43,70 +58,77 @@ class StationService(Base):
         include_local: bool = False,
         include_streams: bool = False,
         include_schedules: bool = False,
+        on_progress: Callable[[LiveStation, int, int], Any] | None = None,
     ) -> list[LiveStation]:
         """
         Gets the list of all stations
 
+        The station list is cached and refreshed in the background once a current
+        programme ends. Streams and schedules are fetched concurrently, a station
+        which fails to load them is logged and left without, rather than failing
+        the whole list.
+
+        :param on_progress: Called with (station, completed, total) as each station's
+            stream and schedule are fetched
         :return: A list of Station objects
         :rtype: list[Station]
         """
-        if self.stations:
-            stations_list = self.stations
-        else:
-            json_resp = await self._get_json(url_template=URLs.STATIONS)
-            self.logger.log(constants.VERBOSE_LOG_LEVEL, "Getting station list...")
-            self.logger.log(constants.VERBOSE_LOG_LEVEL, json_resp)
-
-            # Append a key to assign if they are local stations or not
-            for station in json_resp["data"][0]["data"]:
-                station["local"] = False
-
-            for station in json_resp["data"][1]["data"]:
-                station["local"] = True
-
-            if include_local:
-                # Flatten the national and local stations sublists
-                stations = list(
-                    itertools.chain(
-                        json_resp["data"][0]["data"], json_resp["data"][1]["data"]
-                    )
-                )
+        index = await self.get_index()
+        all_stations: List[LiveStation] = [
+            station for station in index.stations if include_local or not station.local
+        ]
 
-            else:
-                # Just get the national data list
-                stations = json_resp["data"][0]["data"]
-            stations_list = parse_node(stations)
-            self.stations = stations_list
-
-        if isinstance(stations_list, list):
-            all_stations: List[LiveStation] = [
-                station for station in stations_list if isinstance(station, LiveStation)
-            ]
+        if include_streams or include_schedules:
+            await self._enrich_stations(
+                all_stations,
+                include_streams=include_streams,
+                include_schedules=include_schedules,
+                on_progress=on_progress,
+            )
+        return all_stations
 
-            if include_streams and isinstance(stations_list, list):
-                for station in all_stations:
-                    if not station.stream:
-                        station.stream = await self.streams.get_live_stream(station.id)
+    async def _enrich_stations(
+        self,
+        stations: List[LiveStation],
+        include_streams: bool,
+        include_schedules: bool,
+        on_progress: Callable[[LiveStation, int, int], Any] | None = None,
+    ) -> None:
+        """
+        Fetches streams and schedules for stations concurrently
 
-            if include_schedules and isinstance(stations_list, list):
-                for station in all_stations:
-                    if not station.schedule:
-                        station.schedule = await self.schedules.get_schedule(station.id)
-            return all_stations
-        return []
+        Both are fetched even if a station already has them, as station instances
+        outlive refreshes; the streaming and schedule services cache them until
+        they expire.
+        """
+
+        async def set_stream(station: LiveStation):
+            station.stream = await self.streams.get_live_stream(station.id)
+
+        async def set_schedule(station: LiveStation):
+            station.schedule = await self.schedules.get_schedule(station.id)
+
+        async def enrich(station: LiveStation):
+            jobs = []
+            if include_streams:
+                jobs.append(set_stream(station))
+            if include_schedules:
+                jobs.append(set_schedule(station))
+            for result in await asyncio.gather(*jobs, return_exceptions=True):
+                if isinstance(result, Exception):
+                    self.logger.warning(
+                        f"Couldn't get stream or schedule for {station.id}: {result}"
+                    )
+
+        def done(station: LiveStation, result, completed: int, total: int):
+            if on_progress:
+                on_progress(station, completed, total)
+
+        # Requests are bounded by the client's shared limiter
+        await run_concurrently(enrich, stations, on_done=done)
 
     async def get_local_stations(self) -> List[LiveStation]:
-        json_resp = await self._get_json(url_template=URLs.STATIONS)
-        self.logger.log(constants.VERBOSE_LOG_LEVEL, "Getting local station list...")
-        self.logger.log(constants.VERBOSE_LOG_LEVEL, json_resp)
-        station_data = json_resp["data"][1]["data"]
-        station_list = [parse_node(s) for s in station_data]
-        local_stations: List[LiveStation] = [
-            station
-            for station in station_list
-            if station is not None and isinstance(station, LiveStation)
-        ]
-        return local_stations
+        return await self.catalogue.local_stations()
 
     async def get_station_schedule(
         self,
@@ -121,13 +143,8 @@ class StationService(Base):
         :return: A Station object
         :rtype: Station
         """
-        stations = await self.get_stations(
-            include_local=True,
-        )
-        station = next(
-            (station for station in stations if station.id == station_id),
-            None,
-        )
+        index = await self.get_index()
+        station = index.get(station_id)
         if not station:
             return None
 
@@ -148,7 +165,7 @@ class StationService(Base):
         """Get a live radio station
 
         Args:
-            station_id (str): ID of the station, e.g. bbc_radio_four
+            station_id (str): ID of the station, e.g. bbc_radio_fourfm, or its URN, network id or network key
             include_stream (bool, optional): Set LiveStation.stream to the stream URL. Defaults to False.
             stream_format (Literal["hls"] | Literal["dash"], optional): Stream format preference. Defaults to "hls".
             include_schedule (bool, optional): Set LiveStation.schedule to the station schedule. Defaults to False.
@@ -157,77 +174,155 @@ class StationService(Base):
         Returns:
             LiveStation | None: A LiveStation object if station_id is found
         """
-        stations = await self.get_stations(include_local=True)
         # station id is almost always the same as pid but not quite, e.g. bbc_radio_fourfm and bbc_radio_four
-        station = next(
-            (s for s in stations if s.id == station_id),
-            None,
-        )
+        index = await self.get_index()
+        station = index.get(station_id)
 
         if station:
             if include_stream:
                 stream = await self.streams.get_live_stream(
-                    station_id=station_id, stream_format=stream_format
+                    station_id=station.id, stream_format=stream_format
                 )
                 if stream:
                     station.stream = stream
 
             if include_schedule:
                 station.schedule = await self.schedules.get_schedule(
-                    station_id=station_id, date=date
+                    station_id=station.id, date=date
                 )
         return station
 
+    async def build_epg(
+        self,
+        station_ids: list[str],
+        start: dt,
+        end: dt,
+        slot_minutes: int = 30,
+    ) -> EPG:
+        """
+        Builds a programme guide grid of stations by time slots
+
+        Each station's schedules are fetched concurrently, a station which fails to
+        load them is logged and left empty rather than failing the whole guide.
+
+        :param station_ids: The stations, in the order of the guide's rows
+        :param start: The start of the guide, UTC if it has no timezone
+        :param end: The end of the guide
+        :param slot_minutes: The length of each slot
+        """
+        index = await self.get_index()
+        station_ids = [
+            station.id if (station := index.get(station_id)) else station_id
+            for station_id in station_ids
+        ]
+
+        async def get_schedules(station_id: str) -> Schedule:
+            return await self.schedules.get_schedules(
+                station_id, start.date(), end.date()
+            )
+
+        results = await run_concurrently(
+            get_schedules, station_ids, limit=constants.EPG_MAX_CONCURRENT_STATIONS
+        )
+        schedules: list[Schedule | None] = []
+        for station_id, result in zip(station_ids, results):
+            if isinstance(result, Exception):
+                self.logger.warning(
+                    f"Failed to get schedules for {station_id}: {result}"
+                )
+                schedules.append(None)
+            else:
+                schedules.append(result)
+
+        return EPG.build(
+            station_ids, schedules, start, end, slot_seconds=slot_minutes * 60
+        )
+
     async def get_broadcast(self, pid: str):
         json_resp = await self._get_json(
             url_template=URLs.BROADCAST, url_args={"pid": pid}
         )
-        broadcast = parse_node(json_resp)
+        broadcast = parse_node(json_resp, identity_map=self.identity_map)
         return broadcast
 
-    async def get_station_schedule_menu(self, inclue_local: bool = False):
+    async def get_station_schedule_menu(
+        self, inclue_local: bool = False, expanded: str | None = None
+    ) -> MenuItem:
+        """
+        Gets a menu of stations, each with the days its schedule is available for
 
-        return MenuItem(
+        The menu is built from the cached station list, and each station's days
+        are only built when its sub-items are first used.
+
+        :param expanded: The id of a station to fetch today's schedule for now
+        """
+        index = await self.get_index()
+        today = dt.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        menu = MenuItem(
             id="stations",
             title="Station & Schedules",
             sub_items=[
-                await self.get_station_menu(station.id)
-                for station in await self.get_stations(include_local=inclue_local)
+                self._station_menu(station, today)
+                for station in index.stations
+                if inclue_local or not station.local
             ],
         )
+        station = index.get(expanded) if expanded else None
+        if station:
+            station_menu = menu.get(station.id)
+            if isinstance(station_menu, MenuItem):
+                await self._prefetch_today(station_menu, station.id)
+        return menu
 
-    async def get_station_menu(self, station_id: str) -> MenuItem:
-        station = await self.get_station(station_id)
-        if station and isinstance(station, LiveStation):
-            schedule = [
-                MenuItem(id=dt.now().strftime("%Y-%m-%d"), title="Today", sub_items=[]),
-                MenuItem(
-                    id=(dt.now() - timedelta(days=1)).strftime("%Y-%m-%d"),
-                    title="Yesterday",
-                    sub_items=[],
-                ),
-            ]
-            # Maximum is 30 days prior
-            for diff in range(28):
-                this_date = dt.now() - timedelta(days=2 + diff)
-                schedule.extend(
-                    [
-                        MenuItem(
-                            id=this_date.strftime("%Y-%m-%d"),
-                            title=_date_with_ordinal(this_date),
-                            sub_items=[],
-                        )
-                    ]
-                )
-            return MenuItem(
-                id=station_id,
-                title=station.network.short_title
-                if station.network
-                else "Unknown Station",
-                image_url=station.network.logo_url if station.network else None,
-                sub_items=schedule,
-            )
-        return None
+    async def get_station_menu(
+        self, station_id: str, prefetch_today: bool = False
+    ) -> MenuItem | None:
+        """
+        Gets a station with the days its schedule is available for
+
+        :param prefetch_today: Fetch today's schedule now, rather than when it's opened
+        """
+        index = await self.get_index()
+        station = index.get(station_id)
+        if not station:
+            return None
+        today = dt.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        station_menu = self._station_menu(station, today)
+        if prefetch_today:
+            await self._prefetch_today(station_menu, station.id)
+        return station_menu
+
+    def _station_menu(self, station: LiveStation, today: dt) -> MenuItem:
         return MenuItem(
-            id=f"station-{station_id}",
+            id=station.id,
+            title=station.network.short_title if station.network else "Unknown Station",
+            image_url=station.network.logo_url if station.network else None,
+            sub_items=LazyItemList(factory=partial(_schedule_day_items, today)),
         )
+
+    async def _prefetch_today(self, station_menu: MenuItem, station_id: str) -> None:
+        """Fills in the Today item of a station menu with today's schedule."""
+        schedule = await self.schedules.get_schedule(station_id)
+        if schedule and station_menu.sub_items:
+            station_menu.sub_items[0].sub_items = schedule.sub_items or []
+
+
+@lru_cache(maxsize=2)
+def _schedule_days(today: dt) -> tuple[tuple[str, str], ...]:
+    """The id and title of each day a schedule is available for, newest first."""
+    days = [
+        (today.strftime("%Y-%m-%d"), "Today"),
+        ((today - timedelta(days=1)).strftime("%Y-%m-%d"), "Yesterday"),
+    ]
+    # Maximum is 30 days prior
+    for diff in range(28):
+        this_date = today - timedelta(days=2 + diff)
+        days.append((this_date.strftime("%Y-%m-%d"), _date_with_ordinal(this_date)))
+    return tuple(days)
+
+
+def _schedule_day_items(today: dt) -> list[MenuItem]:
+    return [
+        MenuItem(id=day_id, title=title, sub_items=[])
+        for day_id, title in _schedule_days(today)
+    ]
@@ -0,0 +1,116 @@
+"""Keeps the live streams of favourite stations resolved ahead of time.
+
+Each station in the pool has its token and stream connections renewed a margin
+before they expire, so playing it never waits on them. Renewals are jittered so
+stations added together don't keep renewing together.
+"""
+
+import asyncio
+import contextlib
+import logging
+import random
+import time
+
+from sounds import constants
+from sounds.streaming import StreamingService
+
+
+class LiveStreamPool:
+    """Renews the cached live streams of a set of stations in the background."""
+
+    def __init__(
+        self,
+        streaming: StreamingService,
+        logger: logging.Logger | None = None,
+        margin: float = constants.STREAM_POOL_RENEW_MARGIN,
+        jitter: float = constants.STREAM_POOL_JITTER,
+        retry_after: float = 30,
+    ) -> None:
+        """
+        :param margin: Seconds before a stream expires to renew it
+        :param jitter: Fraction of the time until renewal to randomly bring it
+            forward by
+        :param retry_after: Seconds to wait before retrying a failed renewal
+        """
+        self.streaming = streaming
+        self.logger = logger or logging.getLogger(__name__)
+        self.margin = margin
+        self.jitter = jitter
+        self.retry_after = retry_after
+        self._station_ids: set[str] = set()
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._running = False
+
+    @property
+    def station_ids(self) -> set[str]:
+        return set(self._station_ids)
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def add(self, *station_ids: str) -> None:
+        """Keeps stations' streams resolved, starting now if the pool is running."""
+        self._station_ids.update(station_ids)
+        if self._running:
+            for station_id in station_ids:
+                self._start(station_id)
+
+    def discard(self, *station_ids: str) -> None:
+        for station_id in station_ids:
+            self._station_ids.discard(station_id)
+            task = self._tasks.pop(station_id, None)
+            if task is not None:
+                task.cancel()
+
+    def start(self) -> None:
+        """Starts renewing streams in the background."""
+        self._running = True
+        for station_id in self._station_ids:
+            self._start(station_id)
+
+    async def stop(self) -> None:
+        self._running = False
+        tasks = list(self._tasks.values())
+        self._tasks.clear()
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+
+    async def __aenter__(self) -> "LiveStreamPool":
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    def _start(self, station_id: str) -> None:
+        task = self._tasks.get(station_id)
+        if task is None or task.done():
+            self._tasks[station_id] = asyncio.ensure_future(self._keep_warm(station_id))
+
+    def renewal_delay(self, expires_at: float) -> float:
+        """Seconds to wait before renewing a stream expiring at `expires_at`."""
+        remaining = expires_at - time.time()
+        # Streams that don't last much longer than the margin are renewed halfway,
+        # and never more than once a second
+        delay = max(remaining - self.margin, remaining / 2, 1.0)
+        return delay * (1 - random.uniform(0, self.jitter))
+
+    async def _keep_warm(self, station_id: str) -> None:
+        while True:
+            try:
+                await self.streaming.get_live_stream(station_id, refresh=True)
+            except Exception as e:
+                self.logger.warning(f"Failed to renew stream for {station_id}: {e}")
+                expires_at = None
+            else:
+                expires_at = self.streaming.live_stream_expires_at(station_id)
+
+            if expires_at is None:
+                delay = self.retry_after * (1 - random.uniform(0, self.jitter))
+            else:
+                delay = self.renewal_delay(expires_at)
+            await asyncio.sleep(delay)
@@ -1,11 +1,34 @@
+import asyncio
+import contextlib
+import time
+import weakref
+from dataclasses import dataclass
+from datetime import datetime as dt
 from functools import partial
-from typing import TYPE_CHECKING, List, Literal, Optional, cast
+from typing import (
+    TYPE_CHECKING,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    List,
+    Literal,
+    Optional,
+    cast,
+)
 
 from sounds import constants
+from sounds.artwork import SpotifyArtwork
 from sounds.auth import AuthService
 from sounds.base import Base
 from sounds.constants import PlayStatus, SignedInURLs, URLs
-from sounds.exceptions import APIResponseError, InvalidFormatError, NotFoundError
+from sounds.dash import DASHSelection, DASHService
+from sounds.exceptions import (
+    APIResponseError,
+    InvalidFormatError,
+    NotFoundError,
+    ServerError,
+)
+from sounds.hls import HLSSelection, HLSService
 from sounds.models import (
     Category,
     Collection,
@@ -23,7 +46,7 @@ from sounds.models import (
 from sounds.parser import parse_container, parse_menu, parse_node, parse_search
 from sounds.requests import RequestManager
 from sounds.user import UserService
-from sounds.utils import image_from_spotify
+from sounds.utils import jwt_expiry, url_expiry
 
 from .schedule import ScheduleService
 
@@ -31,6 +54,15 @@ if TYPE_CHECKING:
     from sounds.models import SoundsTypes
 
 
+@dataclass
+class _Mediaset:
+    """A station's or episode version's resolved stream connections."""
+
+    connections: list[dict]
+    # UNIX timestamp
+    expires_at: float
+
+
 class StreamingService(Base):
     def __init__(
         self,
@@ -39,13 +71,33 @@ class StreamingService(Base):
         user: UserService,
         requests: RequestManager,
         *args,
+        artwork: SpotifyArtwork | None = None,
+        hls: HLSService | None = None,
+        dash: DASHService | None = None,
         **kwargs,
     ):
         super().__init__(*args, **kwargs)
+        # Fills in missing segment images, shared so lookups are cached client-wide
+        self.artwork = artwork or SpotifyArtwork(*args, **kwargs)
+        # Picks HLS connections and variants, remembering playlists and latencies
+        self.hls = hls or HLSService(*args, **kwargs)
+        # Picks DASH representations, sharing the throughput HLS segments measure
+        self.dash = dash or DASHService(*args, throughput=self.hls.throughput, **kwargs)
         self.auth = auth
         self.schedules = schedules
         self.user = user
         self.requests: RequestManager = requests
+        # Resolved stream connections by station or episode version PID, shared by
+        # every format since one mediaset lists them all
+        self._mediasets: dict[str, _Mediaset] = {}
+        self._mediaset_fetches: dict[str, asyncio.Future[_Mediaset]] = {}
+        # Items parsed from their own full playable response, by the PID asked for,
+        # as opposed to partial copies parsed from listings
+        self._playable_items: weakref.WeakValueDictionary[str, PlayableItem] = (
+            weakref.WeakValueDictionary()
+        )
+        # Version PID and resource type by PID, which don't change between heartbeats
+        self._heartbeat_details: dict[str, tuple[str, str]] = {}
 
     async def get_stream_jwt_token(self, station_id):
         """Requests a JWT token for a given station.
@@ -60,7 +112,8 @@ class StreamingService(Base):
 
     async def get_postcasts(self) -> Menu:
         podcasts = parse_menu(
-            await self._get_json(url_template=constants.URLs.PODCASTS)
+            await self._get_json(url_template=constants.URLs.PODCASTS),
+            identity_map=self.identity_map,
         )
         return podcasts
 
@@ -108,8 +161,15 @@ class StreamingService(Base):
         return podcast
 
     async def get_podcast_episodes(
-        self, pid
+        self, pid, all_pages: bool = False
     ) -> Optional[List[PodcastEpisode | RadioShow | RadioClip]]:
+        """Gets the episodes of a podcast or series.
+
+        :param all_pages: Fetch every page of episodes rather than just the first,
+            see `iter_podcast_episodes` to stop early
+        """
+        if all_pages:
+            return [episode async for episode in self.iter_podcast_episodes(pid)]
         podcast_container = await self.get_pid_container(pid)
         if podcast_container and type(podcast_container) is list:
             return [
@@ -119,6 +179,17 @@ class StreamingService(Base):
             ]
         return []
 
+    def iter_podcast_episodes(
+        self, pid, page_size: int = constants.PAGE_SIZE
+    ) -> AsyncIterator[PodcastEpisode | RadioShow | RadioClip]:
+        """Iterates over every episode of a podcast or series, fetching pages ahead."""
+        return self._iter_pages(
+            URLs.PLAYABLE_ITEMS_CONTAINER_FULL,
+            {"pid": pid},
+            page_size,
+            (PodcastEpisode, RadioShow, RadioClip),
+        )
+
     async def get_podcast_episode(self, pid, include_stream=False) -> PodcastEpisode:
         show = await self.get_by_pid(pid=pid, include_stream=include_stream)
         show = cast(PodcastEpisode, show)
@@ -142,8 +213,113 @@ class StreamingService(Base):
         return show
 
     async def get_live_stream(
-        self, station_id: str, stream_format: Literal["hls"] | Literal["dash"] = "hls"
+        self,
+        station_id: str,
+        stream_format: Literal["hls"] | Literal["dash"] = "hls",
+        refresh: bool = False,
     ) -> Optional[str]:
+        """Gets a station's live stream URL.
+
+        The station's connections are cached until its token or stream URLs expire,
+        call `invalidate_stream` if the stream fails to play.
+
+        :param refresh: Resolve the stream again rather than using the cached one
+        """
+        live_stream = await self._get_mediaset(station_id, live=True, refresh=refresh)
+
+        stream = self.get_best_stream(
+            live_stream.connections, prefer_type=stream_format
+        )
+        self.logger.debug(f"Found stream: {stream}")
+        if not stream:
+            return None
+
+        return stream
+
+    async def get_live_hls(
+        self, station_id: str, target_bitrate: float | None = None
+    ) -> HLSSelection | None:
+        """
+        Picks the HLS connection and variant to play a station with
+
+        :param target_bitrate: Bits per second, defaults to what the measured
+            throughput allows
+        """
+        return await self._select_stream(
+            station_id, True, partial(self.hls.select, target_bitrate=target_bitrate)
+        )
+
+    async def get_live_dash(
+        self, station_id: str, target_bitrate: float | None = None
+    ) -> DASHSelection | None:
+        """
+        Picks the DASH connection and representation to play a station with
+
+        :param target_bitrate: Bits per second, defaults to what the measured
+            throughput allows
+        """
+        return await self._select_stream(
+            station_id, True, partial(self.dash.select, target_bitrate=target_bitrate)
+        )
+
+    def live_stream_expires_at(self, station_id: str) -> float | None:
+        """When a station's cached stream needs resolving again, if it's cached."""
+        live_stream = self._mediasets.get(station_id)
+        return live_stream.expires_at if live_stream else None
+
+    def invalidate_stream(self, vpid: str | None = None) -> None:
+        """Forgets a cached stream, e.g. because it failed to play.
+
+        :param vpid: The episode version PID or station, or None for all of them
+        """
+        if vpid is None:
+            self._mediasets.clear()
+        else:
+            self._mediasets.pop(vpid, None)
+
+    def invalidate_live_stream(self, station_id: str | None = None) -> None:
+        """Forgets a station's cached stream, see `invalidate_stream`."""
+        self.invalidate_stream(station_id)
+
+    async def _get_mediaset(
+        self, vpid: str, live: bool, refresh: bool = False
+    ) -> _Mediaset:
+        mediaset = self._mediasets.get(vpid)
+        if refresh or mediaset is None or mediaset.expires_at <= time.time():
+            mediaset = await self._resolve_mediaset(vpid, live)
+        return mediaset
+
+    async def _select_stream[T](
+        self,
+        vpid: str,
+        live: bool,
+        select: Callable[[list[dict]], Awaitable[T | None]],
+    ) -> T | None:
+        """Picks a stream from a cached mediaset, resolving it again if none play."""
+        cached = vpid in self._mediasets
+        mediaset = await self._get_mediaset(vpid, live)
+        selection = await select(mediaset.connections)
+        if selection is None and cached:
+            # Every connection failed, e.g. because their tokens were revoked
+            self.logger.debug(f"No stream for {vpid} played, resolving it again")
+            mediaset = await self._get_mediaset(vpid, live, refresh=True)
+            selection = await select(mediaset.connections)
+        return selection
+
+    async def _resolve_mediaset(self, vpid: str, live: bool) -> _Mediaset:
+        # Share one resolution between everyone asking for the same stream
+        fetch = self._mediaset_fetches.get(vpid)
+        if fetch is None:
+            fetch = asyncio.ensure_future(
+                self._fetch_live_stream(vpid)
+                if live
+                else self._fetch_episode_mediaset(vpid)
+            )
+            self._mediaset_fetches[vpid] = fetch
+            fetch.add_done_callback(lambda _: self._mediaset_fetches.pop(vpid, None))
+        return await asyncio.shield(fetch)
+
+    async def _fetch_live_stream(self, station_id: str) -> _Mediaset:
         jwt_token = await self.get_stream_jwt_token(station_id)
 
         json_resp = await self._get_json(
@@ -151,26 +327,60 @@ class StreamingService(Base):
             url_args={"station_id": station_id, "jwt_auth_token": jwt_token},
             headers={"Bearer": jwt_token},
         )
-        stream = None
         try:
             streams = json_resp["media"][0]["connection"]
             self.logger.debug("Found streams:")
             self.logger.debug(str(streams))
-            stream = self.get_best_stream(streams, prefer_type=stream_format)
-            self.logger.debug(f"Found stream: {stream}")
-        except StopIteration, KeyError:
+        except KeyError, IndexError:
             self.logger.error("No valid stream found")
             self.logger.debug(json_resp)
             raise RuntimeError("No valid stream found")
-        if not stream:
-            return None
 
-        return stream
+        live_stream = _Mediaset(
+            connections=streams,
+            expires_at=self._mediaset_expiry(json_resp, jwt_token),
+        )
+        self._mediasets[station_id] = live_stream
+        return live_stream
+
+    async def _fetch_episode_mediaset(self, episode_id: str) -> _Mediaset:
+        json_resp = await self._get_json(
+            url_template=URLs.EPISODE_MEDIASET, url_args={"episode_id": episode_id}
+        )
+        try:
+            streams = json_resp["media"][0]["connection"]
+        except KeyError, IndexError:
+            raise RuntimeError("No valid stream found")
+        self.logger.debug("Found streams:")
+        self.logger.debug(str(streams))
+
+        mediaset = _Mediaset(
+            connections=streams, expires_at=self._mediaset_expiry(json_resp)
+        )
+        self._mediasets[episode_id] = mediaset
+        return mediaset
+
+    def _mediaset_expiry(self, json_resp: dict, jwt_token: str | None = None) -> float:
+        """The earliest of the token's expiry and the stream URLs' expiries."""
+        expiries = [time.time() + constants.LIVE_STREAM_MAX_TTL]
+        if jwt_token and (token_expiry := jwt_expiry(jwt_token)) is not None:
+            expiries.append(token_expiry)
+        for media in json_resp.get("media", []):
+            if isinstance(media.get("expires"), str):
+                try:
+                    expiries.append(dt.fromisoformat(media["expires"]).timestamp())
+                except ValueError:
+                    pass
+            for connection in media.get("connection", []):
+                if (href_expiry := url_expiry(connection.get("href", ""))) is not None:
+                    expiries.append(href_expiry)
+        # Leave long enough to start playing before anything expires
+        return min(expiries) - constants.LIVE_STREAM_EXPIRY_MARGIN
 
     def get_best_stream(
         self, streams: dict, prefer_type: Literal["hls"] | Literal["dash"] = "hls"
     ) -> Optional[str]:
-        """Looks for the first valid stream with the requested format."""
+        """Looks for the first stream with the requested format and a URL."""
         self.logger.log(constants.VERBOSE_LOG_LEVEL, "Looking for best stream in:")
         self.logger.log(constants.VERBOSE_LOG_LEVEL, streams)
 
@@ -178,7 +388,7 @@ class StreamingService(Base):
             (
                 conn["href"]
                 for conn in streams
-                if conn.get("transferFormat", "") == prefer_type
+                if conn.get("transferFormat", "") == prefer_type and conn.get("href")
             ),
             None,
         )
@@ -187,37 +397,91 @@ class StreamingService(Base):
         self,
         episode_id: str,
         stream_format: Literal["hls"] | Literal["dash"] = "hls",
+        refresh: bool = False,
     ) -> str | None:
         """
         Gets the stream for a specified episode.
 
+        The episode's connections are cached until its stream URLs expire,
+        call `invalidate_stream` if the stream fails to play.
+
         :param episode_id: str
+        :param refresh: Resolve the stream again rather than using the cached one
         :returns: Stream object of stream information
         :rtype: str | None
         """
-        json_resp = await self._get_json(
-            url_template=URLs.EPISODE_MEDIASET, url_args={"episode_id": episode_id}
+        streams = await self._get_episode_connections(episode_id, refresh=refresh)
+        stream = self.get_best_stream(streams, prefer_type=stream_format)
+        self.logger.debug(f"Found stream: {stream}")
+        return stream
+
+    async def get_episode_hls(
+        self, episode_id: str, target_bitrate: float | None = None
+    ) -> HLSSelection | None:
+        """
+        Picks the HLS connection and variant to play an episode with
+
+        :param target_bitrate: Bits per second, defaults to what the measured
+            throughput allows
+        """
+        return await self._select_stream(
+            episode_id, False, partial(self.hls.select, target_bitrate=target_bitrate)
         )
 
-        stream = None
-        try:
-            streams = json_resp["media"][0]["connection"]
-            self.logger.debug("Found streams:")
-            self.logger.debug(str(streams))
-            stream = self.get_best_stream(streams, prefer_type=stream_format)
-            self.logger.debug(f"Found stream: {stream}")
-        except StopIteration, KeyError:
-            raise RuntimeError("No valid stream found")
-        return stream
+    async def get_episode_dash(
+        self, episode_id: str, target_bitrate: float | None = None
+    ) -> DASHSelection | None:
+        """
+        Picks the DASH connection and representation to play an episode with
+
+        :param target_bitrate: Bits per second, defaults to what the measured
+            throughput allows
+        """
+        return await self._select_stream(
+            episode_id, False, partial(self.dash.select, target_bitrate=target_bitrate)
+        )
+
+    async def _get_episode_connections(
+        self, episode_id: str, refresh: bool = False
+    ) -> list[dict]:
+        mediaset = await self._get_mediaset(episode_id, live=False, refresh=refresh)
+        return mediaset.connections
 
     async def get_by_pid(
         self,
         pid,
         include_stream=False,
         stream_format: Literal["hls"] | Literal["dash"] = "hls",
+        max_age: float = constants.IDENTITY_MAP_MAX_AGE,
     ) -> "SoundsTypes":
+        """Gets a playable item by its PID.
+
+        :param max_age: Reuse an item fetched by PID within this many seconds
+            instead of fetching it again, 0 to always fetch
+        """
         self.logger.debug(f"Getting playable item with PID {pid}")
 
+        playable_item = None
+        if self.identity_map is not None and max_age > 0:
+            known_item = self.identity_map.get(pid, max_age=max_age)
+            # Only reuse items from a full response, not e.g. a schedule's slot
+            if (
+                isinstance(known_item, PlayableItem)
+                and self._playable_items.get(pid) is known_item
+            ):
+                self.logger.debug(f"Reusing already parsed item with PID {pid}")
+                playable_item = known_item
+
+        if playable_item is None:
+            playable_item = await self._fetch_by_pid(pid)
+
+        if include_stream:
+            playable_item.stream = await self.get_episode_stream(
+                episode_id=playable_item.id, stream_format=stream_format
+            )
+        return playable_item
+
+    async def _fetch_by_pid(self, pid) -> PlayableItem:
         if await self.user.is_uk_listener() and self.user.login_details_provided:
             json_resp = await self._get_json(
                 url_template=SignedInURLs.PID_PLAYABLE, url_args={"pid": pid}
@@ -231,21 +495,17 @@ class StreamingService(Base):
         if not json_resp or "id" not in json_resp:
             self.logger.debug(json_resp)
             raise APIResponseError(f"Couldn't get playable item with PID {pid}")
-        playable_item = parse_node(json_resp)
+        playable_item = parse_node(json_resp, identity_map=self.identity_map)
         if not isinstance(playable_item, PlayableItem):
             raise APIResponseError(f"Couldn't get playable item with PID {pid}")
-
-        if include_stream:
-            playable_item.stream = await self.get_episode_stream(
-                episode_id=playable_item.id, stream_format=stream_format
-            )
+        self._playable_items[pid] = playable_item
         return playable_item
 
     async def get_pid_container(self, pid) -> List[PlayableItem] | None:
         json_resp = await self._get_json(
             url_template=URLs.PLAYABLE_ITEMS_CONTAINER, url_args={"pid": pid}
         )
-        container = parse_container(json_resp)
+        container = parse_container(json_resp, identity_map=self.identity_map)
         if isinstance(container, list):
             playable_container: List[PlayableItem] = [
                 item for item in container if isinstance(item, PlayableItem)
@@ -253,16 +513,27 @@ class StreamingService(Base):
             return playable_container
         return None
 
+    def iter_pid_container(
+        self, pid, page_size: int = constants.PAGE_SIZE
+    ) -> AsyncIterator[PlayableItem]:
+        """Iterates over every playable item in a container, fetching pages ahead."""
+        return self._iter_pages(
+            URLs.PLAYABLE_ITEMS_CONTAINER_FULL, {"pid": pid}, page_size, PlayableItem
+        )
+
     async def get_container(self, urn) -> list[SoundsTypes] | SoundsTypes | Container:
         json_resp = await self._get_json(
             url_template=URLs.CONTAINER_URL, url_args={"urn": urn}
         )
-        container = parse_container(json_resp)
+        container = parse_container(json_resp, identity_map=self.identity_map)
         if type(container) is list and len(container) == 1:
             container = container[0]
         return container
 
     async def get_heartbeat_details(self, pid):
+        """Gets the version PID and resource type plays of a PID are reported with."""
+        if pid in self._heartbeat_details:
+            return self._heartbeat_details[pid]
         json_resp = await self._get_json(
             url_template=URLs.PLAYLIST, url_args={"pid": pid}
         )
@@ -270,8 +541,9 @@ class StreamingService(Base):
         try:
             vpid = json_resp["defaultAvailableVersion"]["smpConfig"]["items"][0]["vpid"]
             item_type = json_resp["statsObject"]["parentPIDType"]
-        except APIResponseError, KeyError, TypeError:
+        except KeyError, IndexError, TypeError:
             raise APIResponseError(f"Couldn't get heartbeat details for PID {pid}")
+        self._heartbeat_details[pid] = (vpid, item_type)
         return vpid, item_type
 
     async def update_play_status(
@@ -292,6 +564,8 @@ class StreamingService(Base):
         resp = await self._make_request(
             method="POST", url=SignedInURLs.PLAYS.value, json=data
         )
+        if resp.status >= 500:
+            raise ServerError(f"Play status failed: {resp.status}")
         if resp.status != 202:
             raise APIResponseError(resp)
         return True
@@ -300,26 +574,71 @@ class StreamingService(Base):
         json_resp = await self._get_json(
             url_template=URLs.CATEGORY_LATEST, url_args={"category": category}
         )
-        return cast("Category", parse_node(json_resp))
+        return cast("Category", parse_node(json_resp, identity_map=self.identity_map))
+
+    def iter_category(
+        self, category, page_size: int = constants.PAGE_SIZE
+    ) -> AsyncIterator[SoundsTypes]:
+        """Iterates over a category's items, latest first, fetching pages ahead."""
+        return self._iter_pages(
+            URLs.CATEGORY_LATEST_FULL, {"category": category}, page_size
+        )
 
     async def get_collection(self, pid) -> Collection:
         json_resp = await self._get_json(
             url_template=URLs.COLLECTIONS, url_args={"pid": pid}
         )
-        return cast("Collection", parse_node(json_resp))
+        return cast("Collection", parse_node(json_resp, identity_map=self.identity_map))
+
+    def iter_collection(
+        self, pid, page_size: int = constants.PAGE_SIZE
+    ) -> AsyncIterator[SoundsTypes]:
+        """Iterates over a collection's items, fetching pages ahead."""
+        return self._iter_pages(URLs.COLLECTIONS_FULL, {"pid": pid}, page_size)
 
     async def get_playlist_contents(self, pid) -> list[SoundsTypes]:
         """Gets a curation/playlist."""
         json_resp = await self._get_json(
             url_template=URLs.CURATIONS, url_args={"pid": pid}
         )
-        return parse_container(json_resp) if json_resp else []
+        return (
+            parse_container(json_resp, identity_map=self.identity_map)
+            if json_resp
+            else []
+        )
+
+    def iter_playlist_contents(
+        self, pid, page_size: int = constants.PAGE_SIZE
+    ) -> AsyncIterator[SoundsTypes]:
+        """Iterates over a curation/playlist, fetching pages ahead."""
+        return self._iter_pages(URLs.CURATIONS_FULL, {"pid": pid}, page_size)
+
+    async def _iter_pages(
+        self,
+        url_template: URLs,
+        url_args: dict,
+        page_size: int,
+        item_types: type | tuple[type, ...] = object,
+    ) -> AsyncIterator:
+        # Closing this closes the pages too, cancelling any being fetched
+        async with contextlib.aclosing(
+            self._get_pages(url_template, url_args, self._page_items, page_size)
+        ) as items:
+            async for item in items:
+                if isinstance(item, item_types):
+                    yield item
+
+    def _page_items(self, json_resp: dict) -> list[SoundsTypes]:
+        items = parse_container(json_resp, identity_map=self.identity_map)
+        if isinstance(items, list):
+            return items
+        return getattr(items, "sub_items", None) or []
 
     async def search(self, query) -> SearchResults:
         json_resp = await self._get_json(
             url_template=URLs.SEARCH_URL, url_args={"search": query}
         )
-        return parse_search(json_resp)
+        return parse_search(json_resp, identity_map=self.identity_map)
 
     async def get_show_segments(
         self, vpid, fetch_missing_images: bool = False
@@ -327,15 +646,10 @@ class StreamingService(Base):
         json_resp = await self._get_json(
             url_template=URLs.SEGMENTS, url_args={"vpid": vpid}
         )
-        parsed_segments = parse_container(json_resp)
+        parsed_segments = parse_container(json_resp, identity_map=self.identity_map)
         if isinstance(parsed_segments, List):
             segments = [item for item in parsed_segments if isinstance(item, Segment)]
-            for segment in segments:
-                if (
-                    not segment.image_url
-                    and fetch_missing_images
-                    and segment.spotify_url
-                ):
-                    segment.image_url = await image_from_spotify(segment.spotify_url)
+            if fetch_missing_images:
+                await self.artwork.add_images(segments)
             return segments
         return []
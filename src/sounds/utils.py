@@ -1,5 +1,11 @@
+import asyncio
+import base64
+import binascii
+import json
+import re
 from datetime import datetime
 from pathlib import Path
+from typing import Any, Awaitable, Callable, Iterable
 
 from aiohttp import request
 from appdirs import AppDirs
@@ -70,6 +76,71 @@ async def image_from_spotify(url: str) -> str | None:
     return None
 
 
+async def run_concurrently[T, R](
+    func: Callable[[T], Awaitable[R]],
+    items: Iterable[T],
+    limit: int | None = None,
+    on_done: Callable[[T, R | Exception, int, int], Any] | None = None,
+) -> list[R | Exception]:
+    """
+    Runs `func` for each item concurrently, isolating failures
+
+    :param func The coroutine function to call with each item
+    :param items The items to process
+    :param limit The most calls to run at once, unlimited if None
+    :param on_done Called with (item, result or exception, completed, total) as each call finishes
+
+    :return the results in the order of `items`, with exceptions in place of failed calls
+    """
+    items = list(items)
+    semaphore = asyncio.Semaphore(limit) if limit else None
+    completed = 0
+
+    async def run(item: T) -> R | Exception:
+        nonlocal completed
+        try:
+            if semaphore:
+                async with semaphore:
+                    result: R | Exception = await func(item)
+            else:
+                result = await func(item)
+        except Exception as e:
+            result = e
+        completed += 1
+        if on_done:
+            on_done(item, result, completed, len(items))
+        return result
+
+    return await asyncio.gather(*(run(item) for item in items))
+
+
+def jwt_expiry(token: str) -> float | None:
+    """
+    Reads the expiry of a JWT from its exp claim, without verifying it
+
+    :return: The UNIX timestamp the token expires at, or None if it has none
+    """
+    try:
+        payload = token.split(".")[1]
+        claims = json.loads(
+            base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4))
+        )
+    except IndexError, ValueError, binascii.Error:
+        return None
+    exp = claims.get("exp") if isinstance(claims, dict) else None
+    return float(exp) if isinstance(exp, (int, float)) else None
+
+
+# Signed CDN URLs carry their expiry, e.g. ?hdnea=exp=1700000000~acl=/*~hmac=...
+_URL_EXPIRY = re.compile(r"(?:[?&~]|hdnea=)exp=(\d+)")
+
+
+def url_expiry(url: str) -> float | None:
+    """Reads the expiry of a signed URL, if it has one."""
+    match = _URL_EXPIRY.search(url)
+    return float(match.group(1)) if match else None
+
+
 def _get_data_dir() -> Path:
     dir = AppDirs(appname="auntie-sounds", version="1").user_data_dir
     Path(dir).mkdir(parents=True, exist_ok=True)
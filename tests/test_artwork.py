@@ -0,0 +1,106 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+
+from sounds.artwork import SpotifyArtwork, spotify_uri
+from sounds.exceptions import NetworkError, NotFoundError, ServerError
+from sounds.models import Segment
+
+pytestmark = pytest.mark.anyio
+
+
+def make_segment(spotify_id, image_url=None):
+    return Segment(
+        id=spotify_id,
+        segment_type="music",
+        titles={"primary": spotify_id},
+        image_url=image_url,
+        offset={},
+        uris=[
+            {
+                "label": "Spotify",
+                "uri": f"https://open.spotify.com/track/{spotify_id}",
+            }
+        ],
+    )
+
+
+class TestSpotifyArtwork:
+    """Tests for Spotify artwork lookups"""
+
+    def test_spotify_uri(self):
+        """Test links are keyed by their Spotify URI"""
+        assert (
+            spotify_uri("https://open.spotify.com/intl-de/track/abc?si=x")
+            == "spotify:track:abc"
+        )
+        assert spotify_uri("spotify:album:def") == "spotify:album:def"
+
+    async def test_lookups_are_shared_and_cached(self, mock_session, mock_logger):
+        """Test concurrent lookups of a track make one request, then none"""
+        artwork = SpotifyArtwork(session=mock_session, logger=mock_logger)
+
+        async def oembed(url_template, url_args):
+            await asyncio.sleep(0)
+            return {"thumbnail_url": "https://i.scdn.co/image/abc"}
+
+        artwork._get_json = AsyncMock(side_effect=oembed)
+        images = await asyncio.gather(
+            artwork.get_image("https://open.spotify.com/track/abc"),
+            artwork.get_image("https://open.spotify.com/track/abc?si=1"),
+        )
+        assert images == ["https://i.scdn.co/image/abc"] * 2
+        await artwork.get_image("spotify:track:abc")
+        assert artwork._get_json.await_count == 1
+
+    async def test_misses_are_cached(self, mock_session, mock_logger):
+        """Test a track without artwork isn't looked up again"""
+        artwork = SpotifyArtwork(session=mock_session, logger=mock_logger)
+        artwork._get_json = AsyncMock(side_effect=NotFoundError("Not found"))
+        assert await artwork.get_image("spotify:track:none") is None
+        assert await artwork.get_image("spotify:track:none") is None
+        assert artwork._get_json.await_count == 1
+
+    @pytest.mark.parametrize(
+        "error",
+        [NetworkError("Offline"), ServerError("Unavailable"), TimeoutError()],
+    )
+    async def test_failures_are_not_cached(self, mock_session, mock_logger, error):
+        """Test a failed lookup is tried again, as the track may have artwork"""
+        artwork = SpotifyArtwork(session=mock_session, logger=mock_logger)
+        artwork._get_json = AsyncMock(side_effect=error)
+        assert await artwork.get_image("spotify:track:other") is None
+        assert await artwork.get_image("spotify:track:other") is None
+        assert artwork._get_json.await_count == 2
+
+    async def test_add_images(self, mock_session, mock_logger, tmp_path):
+        """Test segments without images are filled in, and the cache saved"""
+        cache_file = tmp_path / "artwork.json"
+        artwork = SpotifyArtwork(
+            session=mock_session, logger=mock_logger, cache_file=cache_file
+        )
+        artwork._get_json = AsyncMock(
+            side_effect=lambda url_template, url_args: {
+                "thumbnail_url": f"https://i.scdn.co/{url_args['url'][-3:]}"
+            }
+        )
+        segments = [
+            make_segment("one"),
+            make_segment("two"),
+            make_segment("has", image_url="https://example.com/has.jpg"),
+        ]
+        await artwork.add_images(segments)
+        assert [segment.image_url for segment in segments] == [
+            "https://i.scdn.co/one",
+            "https://i.scdn.co/two",
+            "https://example.com/has.jpg",
+        ]
+        assert artwork._get_json.await_count == 2
+
+        artwork.save()
+        reloaded = SpotifyArtwork(
+            session=mock_session, logger=mock_logger, cache_file=cache_file
+        )
+        assert len(reloaded) == 2
+        assert await reloaded.get_image("spotify:track:one") == "https://i.scdn.co/one"
@@ -0,0 +1,78 @@
+import asyncio
+import time
+
+import pytest
+
+from sounds.cache import RefreshingValue
+
+pytestmark = pytest.mark.anyio
+
+
+class TestRefreshingValue:
+    """Tests for the background refreshing cache"""
+
+    async def test_loads_once(self):
+        """Test concurrent first reads share a single load"""
+        calls = 0
+
+        async def loader():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0)
+            return calls
+
+        value = RefreshingValue(loader, expires_at=lambda _: time.time() + 60)
+        results = await asyncio.gather(value.get(), value.get(), value.get())
+        assert results == [1, 1, 1]
+        assert await value.get() == 1
+        assert calls == 1
+
+    async def test_stale_value_refreshes_in_background(self):
+        """Test a stale value is returned immediately while it refreshes"""
+        calls = 0
+
+        async def loader():
+            nonlocal calls
+            calls += 1
+            return calls
+
+        value = RefreshingValue(loader, expires_at=lambda _: time.time() + 60)
+        assert await value.get() == 1
+        value.invalidate()
+
+        assert await value.get() == 1
+        await asyncio.sleep(0)
+        assert await value.get() == 2
+        assert not value.is_stale
+
+    async def test_failed_refresh_keeps_value(self):
+        """Test a failed background refresh keeps serving the previous value"""
+        results = [1, RuntimeError("Request failed")]
+
+        async def loader():
+            result = results.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        value = RefreshingValue(
+            loader, expires_at=lambda _: time.time() + 60, retry_after=30
+        )
+        await value.get()
+        value.invalidate()
+        assert await value.get() == 1
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        assert await value.get() == 1
+        assert not value.is_stale
+
+    async def test_first_load_failure_raises(self):
+        """Test readers see the error if there's no value to fall back on"""
+
+        async def loader():
+            raise RuntimeError("Request failed")
+
+        value = RefreshingValue(loader, expires_at=lambda _: time.time() + 60)
+        with pytest.raises(RuntimeError):
+            await value.get()
+        assert not value.loaded
@@ -0,0 +1,123 @@
+from unittest.mock import AsyncMock
+
+import pytest
+
+from sounds.dash import DASHService, parse_duration, parse_mpd
+
+pytestmark = pytest.mark.anyio
+
+LIVE_MPD = """<?xml version="1.0" encoding="UTF-8"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="dynamic"
+    availabilityStartTime="1970-01-01T00:01:00Z" minimumUpdatePeriod="PT1H"
+    maxSegmentDuration="PT7S">
+  <Period id="1" start="PT0S">
+    <AdaptationSet mimeType="audio/mp4" codecs="mp4a.40.5">
+      <SegmentTemplate timescale="48000" duration="307200" startNumber="1"
+          initialization="$RepresentationID$/IS.mp4"
+          media="$RepresentationID$/$Number%06d$.m4s"/>
+      <Representation id="bbc_6music-audio=96000" bandwidth="96000"/>
+      <Representation id="bbc_6music-audio=48000" bandwidth="48000"/>
+      <Representation id="bbc_6music-audio=320000" bandwidth="320000"
+          codecs="mp4a.40.2">
+        <BaseURL>https://other.example.com/hq/</BaseURL>
+      </Representation>
+    </AdaptationSet>
+  </Period>
+</MPD>
+"""
+
+EPISODE_MPD = """<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static"
+    mediaPresentationDuration="PT1H2M3.5S">
+  <Period>
+    <AdaptationSet mimeType="audio/mp4">
+      <Representation id="audio=128000" bandwidth="128000">
+        <SegmentTemplate media="t=$Time$.m4s" timescale="1000" duration="4000"/>
+      </Representation>
+    </AdaptationSet>
+  </Period>
+</MPD>
+"""
+
+
+class TestDASH:
+    """Tests for DASH manifests and representation selection"""
+
+    def test_parse_live_mpd(self):
+        """Test representations inherit templates and resolve their segment URLs"""
+        manifest = parse_mpd(LIVE_MPD, "https://a.example.com/live/bbc_6music.mpd")
+        assert manifest.is_live
+        assert manifest.minimum_update_period == 3600
+        assert [r.bandwidth for r in manifest.representations] == [
+            96000,
+            48000,
+            320000,
+        ]
+        standard, _, high = manifest.representations
+        assert standard.codecs == ("mp4a.40.5",)
+        assert high.codecs == ("mp4a.40.2",)
+        assert standard.template.segment_duration == 6.4
+        assert (
+            standard.initialization_url
+            == "https://a.example.com/live/bbc_6music-audio=96000/IS.mp4"
+        )
+        assert (
+            standard.segment_url(42)
+            == "https://a.example.com/live/bbc_6music-audio=96000/000042.m4s"
+        )
+        assert high.segment_url(1).startswith("https://other.example.com/hq/")
+        # 64 seconds after the stream started, ten segments have finished
+        assert manifest.live_segment_number(standard, now=60 + 64.0) == 10
+
+    def test_naive_availability_start_is_utc(self):
+        """Test an availability start without an offset isn't read as local time"""
+        manifest = parse_mpd(
+            LIVE_MPD.replace("1970-01-01T00:01:00Z", "1970-01-01T00:01:00"),
+            "https://a.example.com/live/bbc_6music.mpd",
+        )
+        assert manifest.availability_start_time == 60
+
+    def test_parse_episode_mpd(self):
+        """Test on-demand manifests have a duration and time based segments"""
+        manifest = parse_mpd(EPISODE_MPD, "https://a.example.com/ep/p1.mpd")
+        assert not manifest.is_live
+        assert manifest.duration == 3723.5
+        representation = manifest.representations[0]
+        assert representation.segment_url(3) == "https://a.example.com/ep/t=8000.m4s"
+        assert manifest.live_segment_number(representation) is None
+        assert parse_duration("P1DT1S") == 86401
+
+    async def test_select_and_refresh(self, mock_session, mock_logger):
+        """Test failing connections are skipped and live manifests refreshed"""
+        service = DASHService(session=mock_session, logger=mock_logger)
+        manifests = {
+            "https://down.example.com/x.mpd": "Service Unavailable",
+            "https://a.example.com/x.mpd": LIVE_MPD,
+        }
+
+        async def get_html(url):
+            if "hung" in url:
+                raise TimeoutError()
+            return manifests[url]
+
+        service._get_html = AsyncMock(side_effect=get_html)
+        connections = [
+            {"transferFormat": "hls", "href": "https://a.example.com/x.m3u8"},
+            {"transferFormat": "dash", "href": "https://hung.example.com/x.mpd"},
+            {"transferFormat": "dash", "href": "https://down.example.com/x.mpd"},
+            {"transferFormat": "dash", "href": "https://a.example.com/x.mpd"},
+        ]
+
+        selection = await service.select(connections, target_bitrate=128_000)
+        assert selection.connection["href"] == "https://a.example.com/x.mpd"
+        assert selection.representation.bandwidth == 96000
+
+        # Cached until the update period passes, using the measured throughput
+        service.throughput.add_sample(500_000, 1.0)
+        selection = await service.select(connections[3:])
+        assert selection.representation.bandwidth == 320000
+        assert service._get_html.await_count == 3
+
+        manifest, _ = service._manifests["https://a.example.com/x.mpd"]
+        service._manifests["https://a.example.com/x.mpd"] = (manifest, 0)
+        await service.get_manifest("https://a.example.com/x.mpd")
+        assert service._get_html.await_count == 4
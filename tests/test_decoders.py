@@ -0,0 +1,68 @@
+from dataclasses import dataclass, fields
+
+import pytest
+
+from sounds.decoders import decode, get_decoder, schema_for
+from sounds.exceptions import InvalidFormatError
+from sounds.models import PlayableItem, RadioShow, ScheduleItem, Segment
+
+
+class TestDecoders:
+    """Tests for the decoders generated from the schema documentation"""
+
+    def test_decode_matches_fields(self, sample_playable_item):
+        """Test a generated decoder picks out the model's fields"""
+        show = decode(RadioShow, sample_playable_item)
+        assert isinstance(show, RadioShow)
+        assert show.id == sample_playable_item["id"]
+        assert show.urn == sample_playable_item["urn"]
+        assert not hasattr(show, "download")
+
+    def test_decode_uses_defaults(self):
+        """Test missing optional keys fall back to the model defaults"""
+        item = decode(PlayableItem, {"id": "m001234"})
+        assert item.titles == {}
+        assert item.network is None
+
+    def test_missing_required_field(self):
+        """Test a node without a required field is rejected"""
+        with pytest.raises(InvalidFormatError):
+            decode(PlayableItem, {"urn": "urn:bbc:radio:episode:m001234"})
+
+    def test_validation_rejects_wrong_types(self):
+        """Test validating decoders check documented property types"""
+        node = {"id": "m001234", "titles": "not an object"}
+        assert decode(PlayableItem, node).titles == "not an object"
+        with pytest.raises(InvalidFormatError):
+            decode(PlayableItem, node, validate=True)
+
+    def test_validation_allows_null(self):
+        """Test null values pass validation"""
+        node = {"id": "m001234", "synopses": None, "container": None}
+        assert decode(PlayableItem, node, validate=True).synopses is None
+
+    def test_schema_lookup(self):
+        """Test models inherit the schema of their closest documented parent"""
+        assert schema_for(RadioShow) is schema_for(PlayableItem)
+        assert schema_for(ScheduleItem) is None
+        assert schema_for(Segment) is None
+
+    def test_decoders_are_cached(self):
+        """Test decoders are only generated once per model"""
+        assert get_decoder(RadioShow) is get_decoder(RadioShow)
+
+    def test_non_dataclass(self):
+        """Test requesting a decoder for something other than a model fails"""
+        with pytest.raises(TypeError):
+            get_decoder(None)
+
+    def test_field_names_must_be_identifiers(self):
+        """Test names that aren't identifiers are never written into a decoder"""
+
+        @dataclass
+        class Node:
+            id: str
+
+        fields(Node)[0].name = "id=__import__('os')"
+        with pytest.raises(TypeError):
+            get_decoder(Node)
@@ -0,0 +1,186 @@
+import copy
+
+import pytest
+
+from sounds.diff import ChangeFeed
+from sounds.identity import IdentityMap
+from sounds.models import LiveStation, Menu, MenuItem
+from sounds.parser import parse_menu, parse_schedule
+
+pytestmark = pytest.mark.anyio
+
+
+def _stations(*ids, title="Show"):
+    return [
+        LiveStation(
+            id=station_id,
+            urn=f"urn:bbc:radio:network:{station_id}",
+            titles={"primary": title},
+        )
+        for station_id in ids
+    ]
+
+
+class TestChangeFeed:
+    """Tests for diffing refreshed trees"""
+
+    def test_untracked_without_subscribers(self):
+        """Test trees aren't tracked if nobody is listening"""
+        feed = ChangeFeed()
+        stations = _stations("radio1")
+        assert feed.update("stations", stations) is stations
+        assert not feed._trees
+
+    def test_first_update_adds_everything(self):
+        """Test the first update reports every item as added"""
+        feed = ChangeFeed()
+        received = []
+        feed.subscribe(received.append)
+        feed.update("stations", _stations("radio1", "radio2"))
+        assert [change.key for change in received[0].added] == [
+            "urn:bbc:radio:network:radio1",
+            "urn:bbc:radio:network:radio2",
+        ]
+
+    def test_refresh_updates_in_place(self):
+        """Test a refresh reports changes and keeps the previous models"""
+        feed = ChangeFeed()
+        received = []
+        feed.subscribe(received.append)
+        previous = feed.update("stations", _stations("radio1", "radio2", "radio3"))
+        radio1 = previous[0]
+
+        refreshed = feed.update(
+            "stations", _stations("radio2", "radio1", "radio4", title="Next Show")
+        )
+        changes = received[-1]
+
+        assert refreshed is previous
+        assert refreshed[1] is radio1
+        assert radio1.titles == {"primary": "Next Show"}
+        assert {c.key for c in changes.changed} == {
+            "urn:bbc:radio:network:radio1",
+            "urn:bbc:radio:network:radio2",
+        }
+        assert changes.changed[0].fields["titles"] == (
+            {"primary": "Show"},
+            {"primary": "Next Show"},
+        )
+        assert [c.key for c in changes.added] == ["urn:bbc:radio:network:radio4"]
+        assert [c.key for c in changes.removed] == ["urn:bbc:radio:network:radio3"]
+        assert len(changes.moved) == 2
+
+    def test_unchanged_refresh_is_silent(self, sample_menu_data):
+        """Test refreshing identical data notifies nobody"""
+        feed = ChangeFeed()
+        received = []
+        feed.subscribe(received.append)
+        menu = feed.update("menu", parse_menu(sample_menu_data))
+        assert feed.update("menu", parse_menu(sample_menu_data)) is menu
+        assert len(received) == 1
+
+    def test_nested_changes_have_paths(self):
+        """Test changes deep in a menu record where they happened"""
+        feed = ChangeFeed()
+        received = []
+        feed.subscribe(received.append)
+        feed.update("menu", Menu(sub_items=[MenuItem(id="listen_live", sub_items=[])]))
+        menu = feed.update(
+            "menu",
+            Menu(sub_items=[MenuItem(id="listen_live", sub_items=_stations("radio1"))]),
+        )
+        added = received[-1].added
+        assert added[0].path == ("listen_live",)
+        assert menu.get("listen_live").get("radio1") is added[0].item
+
+    def test_works_with_identity_map(self):
+        """Test changes are found when the parser reuses the same instances"""
+        identity_map = IdentityMap()
+        feed = ChangeFeed()
+        received = []
+        feed.subscribe(received.append)
+        stations = [identity_map.merge(s) for s in _stations("radio1")]
+        feed.update("stations", stations)
+        refreshed = [identity_map.merge(s) for s in _stations("radio1", title="New")]
+        assert refreshed[0] is stations[0]
+        feed.update("stations", refreshed)
+        assert received[-1].changed[0].fields["titles"][1] == {"primary": "New"}
+
+    def test_repeat_broadcasts(self, sample_network_data):
+        """Test repeats of an episode in a schedule are tracked as separate slots"""
+        data = copy.deepcopy(sample_network_data)
+        slots = data["data"][0]["data"]
+        repeat = copy.deepcopy(slots[0])
+        repeat.update(
+            id="p0repeat", start="2025-08-04T20:00:00Z", end="2025-08-04T23:00:00Z"
+        )
+        slots.append(repeat)
+        feed = ChangeFeed()
+        received = []
+        feed.subscribe(received.append)
+
+        schedule = feed.update("schedule", parse_schedule(data))
+        assert len(received[0].added) == len(slots)
+        assert received[0].added[-1].key == "p0repeat"
+        first, last = schedule.sub_items[0], schedule.sub_items[-1]
+
+        assert feed.update("schedule", parse_schedule(data)) is schedule
+        assert len(received) == 1
+        assert schedule.sub_items[0] is first
+        assert schedule.sub_items[-1] is last
+        assert first is not last
+
+    def test_duplicate_keys(self):
+        """Test items sharing a key are all tracked"""
+        feed = ChangeFeed()
+        received = []
+        feed.subscribe(received.append)
+        stations = feed.update("stations", _stations("radio1", "radio2", "radio1"))
+        assert [change.key for change in received[0].added] == [
+            "urn:bbc:radio:network:radio1",
+            "urn:bbc:radio:network:radio2",
+            "urn:bbc:radio:network:radio1#2",
+        ]
+        feed.update("stations", _stations("radio1", "radio2", "radio1"))
+        assert len(received) == 1
+        assert len(stations) == 3
+
+    def test_trees_are_bounded(self):
+        """Test only the most recently updated trees are kept"""
+        feed = ChangeFeed(max_trees=2)
+        feed.subscribe(lambda change_set: None)
+        for name in ("a", "b", "a", "c"):
+            feed.update(name, _stations("radio1"))
+        assert list(feed._trees) == ["a", "c"]
+
+    def test_failing_subscriber(self, mock_logger):
+        """Test a subscriber raising doesn't fail the update or other subscribers"""
+        feed = ChangeFeed(logger=mock_logger)
+        received = []
+
+        def fail(change_set):
+            raise ValueError("Broken subscriber")
+
+        feed.subscribe(fail)
+        feed.subscribe(received.append)
+        stations = _stations("radio1")
+        assert feed.update("stations", stations) is stations
+        assert len(received) == 1
+        mock_logger.exception.assert_called_once()
+
+    async def test_async_subscriber(self):
+        """Test coroutine subscribers are run as tasks"""
+        feed = ChangeFeed()
+        received = []
+
+        async def subscriber(change_set):
+            received.append(change_set)
+
+        unsubscribe = feed.subscribe(subscriber)
+        feed.update("stations", _stations("radio1"))
+        await next(iter(feed._tasks))
+        assert len(received) == 1
+
+        unsubscribe()
+        feed.update("stations", _stations("radio2"))
+        assert not feed._tasks
@@ -0,0 +1,78 @@
+from datetime import UTC, timedelta
+from datetime import datetime as dt
+
+from sounds.epg import EPG, NO_PROGRAMME
+from sounds.models import Schedule, ScheduleItem
+
+START = dt(2026, 10, 19, 6, 0, tzinfo=UTC)
+
+
+def make_schedule(*programmes):
+    """A schedule from (id, minutes after 06:00, length in minutes) tuples"""
+    return Schedule(
+        id="schedule_items",
+        sub_items=[
+            ScheduleItem(
+                id=pid,
+                titles={"primary": pid.title()},
+                start=START + timedelta(minutes=offset),
+                end=START + timedelta(minutes=offset + length),
+            )
+            for pid, offset, length in programmes
+        ],
+    )
+
+
+class TestEPG:
+    """Tests for the programme guide grid"""
+
+    def make_epg(self):
+        return EPG.build(
+            ["bbc_radio_one", "bbc_radio_four", "bbc_6music"],
+            [
+                make_schedule(("breakfast", -60, 180), ("mid", 120, 180)),
+                make_schedule(("today", 0, 180), ("news", 180, 15), ("pm", 195, 60)),
+                None,
+            ],
+            START,
+            START + timedelta(hours=4),
+            slot_seconds=3600,
+        )
+
+    def test_build_cells(self):
+        """Test each slot points at the programme on air when it starts"""
+        epg = self.make_epg()
+        assert epg.n_slots == 4
+        assert len(epg) == 5
+        assert [
+            epg.programme(epg.cell("bbc_radio_one", slot)).id for slot in range(4)
+        ] == [
+            "breakfast",
+            "breakfast",
+            "mid",
+            "mid",
+        ]
+        assert epg.programme(epg.cell(1, 2)).id == "today"
+        assert epg.programme(epg.cell(1, 3)).id == "news"
+        assert epg.cell("bbc_6music", 0) == NO_PROGRAMME
+
+    def test_columns(self):
+        """Test programmes are stored column-oriented with shared titles"""
+        epg = self.make_epg()
+        assert epg.ids == ["breakfast", "mid", "today", "news", "pm"]
+        assert list(epg.row_offsets) == [0, 2, 5, 5]
+        assert epg.titles[epg.title_indexes[3]] == "News"
+        assert epg.programme(0).start == START - timedelta(hours=1)
+
+    def test_slices(self):
+        """Test the part of the guide in view can be taken for rendering"""
+        epg = self.make_epg()
+        rows = epg.slice(slice(1, 3), slice(3, 4))
+        assert [
+            (station, [p.id for p in programmes]) for station, programmes in rows
+        ] == [
+            ("bbc_radio_four", ["news", "pm"]),
+            ("bbc_6music", []),
+        ]
+        cells = epg.cell_rows(slice(0, 2), slice(2, 4))
+        assert [list(row) for row in cells] == [[1, 1], [2, 3]]
@@ -0,0 +1,121 @@
+from unittest.mock import AsyncMock
+
+import pytest
+
+from sounds.exceptions import APIResponseError
+from sounds.hls import (
+    HLSService,
+    HLSVariant,
+    ThroughputEstimator,
+    parse_playlist,
+    select_variant,
+)
+
+pytestmark = pytest.mark.anyio
+
+MASTER_PLAYLIST = """#EXTM3U
+#EXT-X-VERSION:3
+#EXT-X-STREAM-INF:PROGRAM-ID=1,BANDWIDTH=101760,CODECS="mp4a.40.5"
+bbc_6music-audio=96000.m3u8
+#EXT-X-STREAM-INF:PROGRAM-ID=1,BANDWIDTH=52000,AVERAGE-BANDWIDTH=50000,CODECS="mp4a.40.5"
+bbc_6music-audio=48000.m3u8
+#EXT-X-STREAM-INF:PROGRAM-ID=1,BANDWIDTH=341000,CODECS="mp4a.40.2,avc1.4d401e"
+https://other.example.com/bbc_6music-audio=320000.m3u8
+"""
+
+
+class TestHLS:
+    """Tests for HLS playlists and variant selection"""
+
+    def test_parse_master_playlist(self):
+        """Test variants are read with their bandwidth and codecs"""
+        playlist = parse_playlist(
+            MASTER_PLAYLIST, "https://a.example.com/live/bbc_6music.m3u8?s=1"
+        )
+        assert playlist.is_master
+        assert [variant.bandwidth for variant in playlist.variants] == [
+            101760,
+            52000,
+            341000,
+        ]
+        assert (
+            playlist.variants[0].uri
+            == "https://a.example.com/live/bbc_6music-audio=96000.m3u8"
+        )
+        assert playlist.variants[1].average_bandwidth == 50000
+        assert playlist.variants[2].codecs == ("mp4a.40.2", "avc1.4d401e")
+        assert not parse_playlist("#EXTM3U\n#EXTINF:6.4,\nseg1.ts\n", "x").is_master
+
+    def test_select_variant(self):
+        """Test the highest bitrate within the budget is picked"""
+        variants = [HLSVariant(uri=str(rate), bandwidth=rate) for rate in (96, 48, 320)]
+        assert select_variant(variants).bandwidth == 320
+        assert select_variant(variants, 100).bandwidth == 96
+        assert select_variant(variants, 10).bandwidth == 48
+        assert select_variant([], 100) is None
+
+    def test_throughput_estimate(self):
+        """Test throughput is averaged over samples"""
+        estimator = ThroughputEstimator(weight=0.5)
+        assert estimator.bitrate is None
+        estimator.add_sample(100_000, 1.0)
+        estimator.add_sample(200_000, 1.0)
+        assert estimator.bitrate == 1_200_000
+
+    async def test_select_fastest_connection(self, mock_session, mock_logger):
+        """Test connections are tried fastest first, skipping any that fail"""
+        service = HLSService(session=mock_session, logger=mock_logger)
+        service._latencies = {
+            "slow.example.com": 0.5,
+            "fast.example.com": 0.05,
+            "down.example.com": 0.01,
+        }
+
+        async def get_html(url):
+            if "down" in url:
+                raise APIResponseError("Request failed: 503")
+            return MASTER_PLAYLIST
+
+        service._get_html = AsyncMock(side_effect=get_html)
+        connections = [
+            {"transferFormat": "dash", "href": "https://fast.example.com/x.mpd"},
+            {"transferFormat": "hls", "href": "https://slow.example.com/x.m3u8"},
+            {"transferFormat": "hls", "href": "https://fast.example.com/x.m3u8"},
+            {"transferFormat": "hls", "href": "https://down.example.com/x.m3u8"},
+        ]
+
+        selection = await service.select(connections, target_bitrate=128_000)
+        assert selection.connection["href"] == "https://fast.example.com/x.m3u8"
+        assert selection.variant.bandwidth == 101760
+        assert selection.url == "https://fast.example.com/bbc_6music-audio=96000.m3u8"
+
+        # The failing host is now ranked last, the playlist is cached, and the
+        # measured throughput is used by default
+        service.throughput.add_sample(500_000, 1.0)
+        selection = await service.select(connections)
+        assert selection.connection["href"] == "https://fast.example.com/x.m3u8"
+        assert selection.variant.bandwidth == 341000
+        assert service._get_html.await_count == 2
+        assert service.latency("https://down.example.com/") > 0.5
+
+    async def test_hung_host_is_skipped(self, mock_session, mock_logger):
+        """Test a host that times out is ranked last and the next one is tried"""
+        service = HLSService(session=mock_session, logger=mock_logger)
+
+        async def get_html(url):
+            if "hung" in url:
+                raise TimeoutError()
+            return MASTER_PLAYLIST
+
+        service._get_html = AsyncMock(side_effect=get_html)
+        connections = [
+            {"transferFormat": "hls", "href": "https://hung.example.com/x.m3u8"},
+            {"transferFormat": "hls", "href": "https://fast.example.com/x.m3u8"},
+        ]
+        service._latencies = {"hung.example.com": 0.01}
+
+        selection = await service.select(connections)
+        assert selection.connection["href"] == "https://fast.example.com/x.m3u8"
+        assert service.latency("https://hung.example.com/") > service.latency(
+            "https://fast.example.com/"
+        )
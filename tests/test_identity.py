@@ -0,0 +1,113 @@
+import copy
+import gc
+
+from sounds.identity import IdentityMap
+from sounds.models import LiveStation, PodcastEpisode, RadioShow
+from sounds.parser import parse_node, parse_schedule
+
+
+class TestIdentityMap:
+    """Tests for the identity map of parsed objects"""
+
+    def test_merge_reuses_instance(self):
+        """Test parsing the same item twice returns the first instance, updated"""
+        identity_map = IdentityMap()
+        first = identity_map.merge(
+            RadioShow(id="m001234", urn="urn:bbc:radio:episode:m001234")
+        )
+        second = identity_map.merge(
+            RadioShow(
+                id="m001234",
+                urn="urn:bbc:radio:episode:m001234",
+                image_url="https://example.com/image.jpg",
+            )
+        )
+        assert second is first
+        assert first.image_url == "https://example.com/image.jpg"
+
+    def test_merge_keeps_existing_values(self):
+        """Test values missing from the new copy don't erase existing ones"""
+        identity_map = IdentityMap()
+        show = identity_map.merge(
+            RadioShow(id="m001234", urn="urn:bbc:radio:episode:m001234")
+        )
+        show.stream = "https://example.com/stream.m3u8"
+        identity_map.merge(RadioShow(id="m001234", urn="urn:bbc:radio:episode:m001234"))
+        assert show.stream == "https://example.com/stream.m3u8"
+
+    def test_merge_skips_defaults(self):
+        """Test a partial copy's default values don't overwrite real ones"""
+        identity_map = IdentityMap()
+        station = identity_map.merge(
+            LiveStation(
+                id="bbc_radio_york",
+                urn="urn:bbc:radio:network:bbc_radio_york",
+                local=True,
+                titles={"primary": "BBC Radio York"},
+            )
+        )
+        identity_map.merge(
+            LiveStation(id="bbc_radio_york", urn="urn:bbc:radio:network:bbc_radio_york")
+        )
+        assert station.local
+        assert station.titles == {"primary": "BBC Radio York"}
+
+    def test_lookup_by_urn_and_pid(self):
+        """Test objects can be found by either key"""
+        identity_map = IdentityMap()
+        show = identity_map.merge(
+            RadioShow(id="m001234", urn="urn:bbc:radio:episode:m001234")
+        )
+        assert identity_map.get("urn:bbc:radio:episode:m001234") is show
+        assert identity_map.get("m001234") is show
+        assert identity_map.get("m001234", max_age=60) is show
+        assert identity_map.get("m001234", max_age=-1) is None
+
+    def test_objects_are_weakly_held(self):
+        """Test the map doesn't keep objects alive"""
+        identity_map = IdentityMap()
+        identity_map.merge(RadioShow(id="m001234", urn="urn:bbc:radio:episode:m001234"))
+        gc.collect()
+        assert identity_map.get("m001234") is None
+        assert len(identity_map) == 0
+
+    def test_different_types_are_replaced(self):
+        """Test an object of another type replaces the existing one"""
+        identity_map = IdentityMap()
+        show = identity_map.merge(
+            RadioShow(id="m001234", urn="urn:bbc:radio:episode:m001234")
+        )
+        episode = identity_map.merge(
+            PodcastEpisode(id="m001234", urn="urn:bbc:radio:episode:m001234")
+        )
+        assert episode is not show
+        assert identity_map.get("m001234") is episode
+
+    def test_parse_node_shares_instances(self, sample_podcast_episode_data):
+        """Test parsing with an identity map returns shared instances"""
+        identity_map = IdentityMap()
+        first = parse_node(sample_podcast_episode_data, identity_map)
+        second = parse_node(sample_podcast_episode_data, identity_map)
+        assert first is second
+        assert identity_map.get(first.urn) is first
+
+    def test_repeat_broadcasts_stay_separate(self, sample_network_data):
+        """Test repeat broadcasts of an episode aren't merged into one slot"""
+        identity_map = IdentityMap()
+        first_day = parse_schedule(sample_network_data, identity_map)
+        first_start = first_day.sub_items[0].start
+
+        data = copy.deepcopy(sample_network_data)
+        slots = data["data"][0]["data"]
+        repeat = copy.deepcopy(slots[0])
+        repeat.update(
+            id="p0repeat", start="2025-08-04T20:00:00Z", end="2025-08-04T23:00:00Z"
+        )
+        slots.append(repeat)
+        schedule = parse_schedule(data, identity_map)
+
+        assert schedule.sub_items[0] is not schedule.sub_items[-1]
+        assert schedule.sub_items[0].id == slots[0]["id"]
+        assert schedule.sub_items[-1].id == "p0repeat"
+        assert schedule.sub_items[0].start != schedule.sub_items[-1].start
+        assert first_day.sub_items[0].start == first_start
@@ -4,7 +4,15 @@ import pytest
 import pytz
 from pytest import MarkDecorator
 
-from sounds.models import Container, Menu, MenuItem, PlayableItem, ScheduleItem
+from sounds import serialization
+from sounds.models import (
+    Container,
+    LazyItemList,
+    Menu,
+    MenuItem,
+    PlayableItem,
+    ScheduleItem,
+)
 
 pytestmark: MarkDecorator = pytest.mark.anyio
 
@@ -75,3 +83,70 @@ class TestModels:
         menu = Menu(sub_items=[MenuItem(id="item1", title="Item 1")])
         result = menu.get("nonexistent")
         assert result is None
+
+    def test_menu_get_after_sub_items_change(self):
+        """Test Menu.get() sees items added after the first lookup"""
+        menu = Menu(sub_items=[MenuItem(id="item1", title="Item 1")])
+        assert menu.get("item2") is None
+
+        item2 = MenuItem(id="item2", title="Item 2")
+        menu.sub_items.insert(0, item2)
+        assert menu.get("item2") is item2
+
+        menu.sub_items.pop(0)
+        assert menu.get("item2") is None
+
+        menu.sub_items = [item2]
+        assert menu.get("item2") is item2
+        assert menu.get("item1") is None
+
+    def test_menu_get_duplicate_ids(self):
+        """Test Menu.get() returns the first item when IDs are repeated"""
+        first = MenuItem(id="item", title="First")
+        menu = Menu(sub_items=[first, MenuItem(id="item", title="Second")])
+        assert menu.get("item") is first
+
+    def test_menu_resolve_path(self):
+        """Test Menu.resolve() walks nested menu items"""
+        date = MenuItem(id="2026-10-17", title="Today")
+        station = MenuItem(id="bbc_radio_four", sub_items=[date])
+        menu = Menu(sub_items=[MenuItem(id="stations", sub_items=[station])])
+
+        assert menu.resolve("stations/bbc_radio_four/2026-10-17") is date
+        assert menu.resolve(["stations", "bbc_radio_four"]) is station
+        assert menu.resolve("stations/bbc_radio_four/") is station
+        assert menu.resolve("stations/missing/2026-10-17") is None
+        assert station.resolve("2026-10-17") is date
+
+    def test_menu_resolve_through_containers(self):
+        """Test Menu.resolve() also walks containers which aren't menu items"""
+        episode = PlayableItem(id="m001234")
+        podcast = Container(id="p002vsmz", sub_items=[episode])
+        menu = Menu(sub_items=[MenuItem(id="podcasts", sub_items=[podcast])])
+        assert menu.resolve("podcasts/p002vsmz/m001234") is episode
+
+    def test_lazy_sub_items_built_on_first_use(self):
+        """Test lazy sub-items are only built once, when first read"""
+        calls = []
+
+        def build():
+            calls.append(1)
+            return [MenuItem(id="2026-10-17", title="Today")]
+
+        station = MenuItem(id="bbc_radio_four", sub_items=LazyItemList(factory=build))
+        menu = Menu(sub_items=[station])
+        assert isinstance(station.sub_items, LazyItemList)
+        assert calls == []
+
+        assert menu.resolve("bbc_radio_four/2026-10-17").title == "Today"
+        assert len(station.sub_items) == 1
+        assert calls == [1]
+
+    def test_lazy_sub_items_serialise(self):
+        """Test lazy sub-items are built when a menu is converted or saved"""
+        item = MenuItem(
+            id="station",
+            sub_items=LazyItemList(factory=lambda: [MenuItem(id="today")]),
+        )
+        assert item.to_dict()["sub_items"][0]["id"] == "today"
+        assert serialization.loads(serialization.dumps(item)) == item
@@ -0,0 +1,86 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+
+from sounds.models import Segment
+from sounds.now_playing import NowPlayingPoller, _StationState
+
+pytestmark = pytest.mark.anyio
+
+
+def make_segment(segment_id, start=0, end=240, now_playing=True):
+    return Segment(
+        id=segment_id,
+        segment_type="music",
+        titles={"primary": segment_id},
+        image_url=None,
+        offset={"start": start, "end": end, "now_playing": now_playing},
+        uris=[],
+    )
+
+
+class TestNowPlayingPoller:
+    """Tests for the multiplexed now playing poller"""
+
+    def test_polls_after_expected_track_end(self):
+        """Test a new track is polled for just after the current one should end"""
+        poller = NowPlayingPoller(schedules=AsyncMock(), min_interval=15, grace=5)
+        state = _StationState(station_id="bbc_6music", backoff=15)
+
+        # Could be anywhere into the first track seen, so keep checking
+        poller._update(state, make_segment("first"), now=100)
+        assert state.due == 115
+
+        poller._update(state, make_segment("second", start=300, end=540), now=115)
+        assert state.due == 115 + 240 + 5
+
+        # Running over, so it may end at any moment
+        poller._update(state, make_segment("second", start=300, end=540), now=360)
+        assert state.due == 375
+
+    def test_backs_off_during_speech(self):
+        """Test polling slows down while nothing is playing"""
+        poller = NowPlayingPoller(
+            schedules=AsyncMock(), min_interval=15, max_interval=60
+        )
+        state = _StationState(station_id="bbc_radio_four", backoff=15)
+
+        delays = []
+        for now in (0, 100, 200, 300):
+            poller._update(state, None, now=now)
+            delays.append(state.due - now)
+        assert delays == [15, 30, 60, 60]
+
+        poller._update(state, make_segment("track"), now=400)
+        poller._update(state, None, now=410)
+        assert state.due == 425
+
+    async def test_updates_subscribers(self):
+        """Test changes on several stations reach subscribers"""
+        playing = {
+            "bbc_radio_one": [make_segment("one")],
+            "bbc_6music": [make_segment("six", now_playing=False)],
+        }
+        schedules = AsyncMock()
+        schedules.recently_played_items = AsyncMock(
+            side_effect=lambda station_id, **kwargs: playing[station_id]
+        )
+        poller = NowPlayingPoller(schedules=schedules, min_interval=0.01)
+        updates = poller.updates()
+        poller.track("bbc_radio_one", "bbc_6music")
+
+        async with poller:
+            update = await asyncio.wait_for(anext(updates), 1)
+            assert update.station_id == "bbc_radio_one"
+            assert update.segment.id == "one"
+
+            playing["bbc_radio_one"] = [make_segment("two")]
+            update = await asyncio.wait_for(anext(updates), 1)
+            assert update.segment.id == "two"
+            assert update.previous.id == "one"
+            assert poller.current("bbc_radio_one").id == "two"
+            assert poller.current("bbc_6music") is None
+
+        # Stopping the poller ends the subscription
+        assert [update async for update in updates] == []
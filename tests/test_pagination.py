@@ -0,0 +1,81 @@
+import asyncio
+import contextlib
+from unittest.mock import AsyncMock
+
+import pytest
+
+from sounds.pagination import page_info, paginate
+
+pytestmark = pytest.mark.anyio
+
+
+def make_pages(total, limit):
+    """A paged endpoint of numbered items, which caps the limit asked for"""
+    requested = []
+
+    async def fetch_page(offset, page_limit):
+        requested.append(offset)
+        await asyncio.sleep(0)
+        page_limit = min(page_limit, limit)
+        return {
+            "total": total,
+            "limit": page_limit,
+            "offset": offset,
+            "data": list(range(offset, min(offset + page_limit, total))),
+        }
+
+    return fetch_page, requested
+
+
+class TestPagination:
+    """Tests for iterating over paged endpoints"""
+
+    def test_page_info(self):
+        """Test the paging details are read from a response"""
+        assert page_info({"total": 250, "limit": 100, "offset": 0}) == (250, 100, 0)
+        assert page_info({"data": []}) is None
+
+    async def test_yields_every_page_in_order(self):
+        """Test items from every page are yielded in order, stepping by the capped limit"""
+        fetch_page, requested = make_pages(total=250, limit=30)
+        items = [
+            item async for item in paginate(fetch_page, lambda page: page["data"], 100)
+        ]
+        assert items == list(range(250))
+        assert sorted(requested) == list(range(0, 250, 30))
+
+    async def test_unpaged_response(self):
+        """Test a response without paging details is treated as the only page"""
+        fetch_page = AsyncMock(return_value={"data": [1, 2]})
+        items = [item async for item in paginate(fetch_page, lambda page: page["data"])]
+        assert items == [1, 2]
+        assert fetch_page.await_count == 1
+
+    async def test_stops_fetching_when_closed(self):
+        """Test breaking out early cancels pages fetched ahead and fetches no more"""
+        fetch_page, requested = make_pages(total=1000, limit=10)
+        async with contextlib.aclosing(
+            paginate(fetch_page, lambda page: page["data"], 10, prefetch=2)
+        ) as items:
+            async for item in items:
+                if item == 15:
+                    break
+        await asyncio.sleep(0)
+        assert requested == [0, 10, 20]
+
+    async def test_stops_at_empty_page(self):
+        """Test iteration ends if pages run out before the total"""
+        pages = {
+            0: {"total": 30, "limit": 10, "offset": 0, "data": [0, 1]},
+            10: {"total": 30, "limit": 10, "offset": 10, "data": []},
+            20: {"total": 30, "limit": 10, "offset": 20, "data": [20]},
+        }
+        items = [
+            item
+            async for item in paginate(
+                lambda offset, limit: asyncio.sleep(0, pages[offset]),
+                lambda page: page["data"],
+                10,
+            )
+        ]
+        assert items == [0, 1]
@@ -0,0 +1,106 @@
+import asyncio
+from unittest.mock import AsyncMock, Mock
+
+import aiohttp
+import pytest
+
+from sounds.constants import PlayStatus
+from sounds.exceptions import APIResponseError, NetworkError, ServerError
+from sounds.play_reporter import PlayStatusReporter
+
+pytestmark = pytest.mark.anyio
+
+
+def sent(streaming):
+    return [
+        (call.kwargs["action"], call.kwargs["elapsed_time"])
+        for call in streaming.update_play_status.await_args_list
+    ]
+
+
+class TestPlayStatusReporter:
+    """Tests for batched play status reports"""
+
+    async def test_heartbeats_are_coalesced(self):
+        """Test only the latest heartbeat of a PID is sent, keeping other statuses"""
+        streaming = AsyncMock()
+        reporter = PlayStatusReporter(streaming=streaming)
+        reporter.report("p1", 0, PlayStatus.STARTED)
+        for elapsed in (30, 60, 90):
+            reporter.report("p1", elapsed, PlayStatus.HEARTBEAT)
+        reporter.report("p2", 10, PlayStatus.HEARTBEAT)
+        reporter.report("p1", 95, PlayStatus.PAUSED)
+
+        assert await reporter.flush()
+        assert sent(streaming) == [
+            (PlayStatus.STARTED, 0),
+            (PlayStatus.HEARTBEAT, 10),
+            (PlayStatus.PAUSED, 95),
+        ]
+        assert reporter.pending == []
+
+    async def test_queued_while_offline(self, tmp_path):
+        """Test reports are kept and saved while offline, and refused ones dropped"""
+        queue_file = tmp_path / "plays.json"
+        streaming = AsyncMock()
+        streaming.update_play_status.side_effect = NetworkError("Offline")
+        reporter = PlayStatusReporter(streaming=streaming, queue_file=queue_file)
+        reporter.report("p1", 0, PlayStatus.STARTED)
+        reporter.report("p1", 30, PlayStatus.HEARTBEAT)
+
+        assert not await reporter.flush()
+        assert len(reporter.pending) == 2
+        assert queue_file.exists()
+
+        # A new session picks up where the last left off
+        streaming = AsyncMock()
+        streaming.update_play_status.side_effect = [
+            APIResponseError("Refused"),
+            True,
+        ]
+        reporter = PlayStatusReporter(streaming=streaming, queue_file=queue_file)
+        assert [report.action for report in reporter.pending] == [
+            PlayStatus.STARTED,
+            PlayStatus.HEARTBEAT,
+        ]
+        await reporter.stop()
+        assert streaming.update_play_status.await_count == 2
+        assert reporter.pending == []
+        assert not queue_file.exists()
+
+    async def test_timeouts_and_server_errors_are_retried(self):
+        """Test reports stay queued through timeouts and 5xx responses"""
+        streaming = AsyncMock()
+        streaming.update_play_status.side_effect = TimeoutError()
+        reporter = PlayStatusReporter(streaming=streaming, interval=0)
+        reporter.report("p1", 0, PlayStatus.STARTED)
+
+        async with reporter:
+            await asyncio.sleep(0.01)
+            assert reporter.running
+            assert len(reporter.pending) == 1
+
+            streaming.update_play_status.side_effect = ServerError("Bad gateway")
+            assert not await reporter.flush()
+            assert len(reporter.pending) == 1
+
+            streaming.update_play_status.side_effect = None
+            assert await reporter.flush()
+        assert reporter.pending == []
+
+    async def test_server_error_looking_up_heartbeat(
+        self, mock_session, mock_streaming_service
+    ):
+        """Test a 5xx error page while looking up a PID's version is retried"""
+        response = AsyncMock()
+        response.json.side_effect = aiohttp.ContentTypeError(
+            Mock(), (), status=503, message="Attempt to decode JSON"
+        )
+        mock_session.request = AsyncMock(return_value=response)
+        reporter = PlayStatusReporter(streaming=mock_streaming_service)
+        reporter.report("p1", 0, PlayStatus.STARTED)
+
+        with pytest.raises(ServerError):
+            await mock_streaming_service.get_heartbeat_details("p1")
+        assert not await reporter.flush()
+        assert len(reporter.pending) == 1
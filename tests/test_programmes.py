@@ -0,0 +1,102 @@
+import asyncio
+from datetime import UTC, timedelta
+from datetime import datetime as dt
+from unittest.mock import AsyncMock
+
+import pytest
+
+from sounds.diff import ChangeSet
+from sounds.models import Schedule, ScheduleItem
+from sounds.programmes import ProgrammeScheduler
+
+pytestmark = pytest.mark.anyio
+
+
+def make_schedule(*offsets):
+    """A schedule of back to back items at the given offsets in seconds from now"""
+    now = dt.now(UTC)
+    return Schedule(
+        id="today",
+        sub_items=[
+            ScheduleItem(
+                id=f"p{index}",
+                start=now + timedelta(seconds=start),
+                end=now + timedelta(seconds=end),
+            )
+            for index, (start, end) in enumerate(zip(offsets, offsets[1:]))
+        ],
+    )
+
+
+class TestProgrammeScheduler:
+    """Tests for programme boundary events"""
+
+    async def test_emits_events_at_boundaries(self):
+        """Test started and ended events arrive in order at the scheduled times"""
+        schedules = AsyncMock()
+        schedules.get_schedule = AsyncMock(
+            return_value=make_schedule(-60, 0.05, 0.1, 3600)
+        )
+        scheduler = ProgrammeScheduler(schedules=schedules)
+        events = scheduler.events()
+        await scheduler.watch("bbc_radio_four")
+
+        received = [await asyncio.wait_for(anext(events), 1) for _ in range(4)]
+        assert [(event.kind, event.item.id) for event in received] == [
+            ("ended", "p0"),
+            ("started", "p1"),
+            ("ended", "p1"),
+            ("started", "p2"),
+        ]
+        await scheduler.close()
+
+    async def test_reload_emits_started_programme(self):
+        """Test the programme starting as the schedule reloads isn't skipped"""
+        schedule = make_schedule(-60, 0.05)
+        boundary = schedule.sub_items[0].end
+        next_schedule = Schedule(
+            id="today",
+            sub_items=[
+                ScheduleItem(id="n0", start=boundary, end=boundary + timedelta(hours=1))
+            ],
+        )
+        schedules = AsyncMock()
+        schedules.get_schedule = AsyncMock(side_effect=[schedule, next_schedule])
+        scheduler = ProgrammeScheduler(schedules=schedules)
+        events = scheduler.events()
+        await scheduler.watch("bbc_radio_four")
+
+        received = [await asyncio.wait_for(anext(events), 1) for _ in range(2)]
+        assert [(event.kind, event.item.id) for event in received] == [
+            ("ended", "p0"),
+            ("started", "n0"),
+        ]
+        # The cached schedule is the one that's just finished
+        schedules.get_schedule.assert_awaited_with("bbc_radio_four", refresh=True)
+
+        # Re-syncing doesn't emit it again
+        scheduler.sync("bbc_radio_four", next_schedule)
+        with pytest.raises(TimeoutError):
+            await asyncio.wait_for(anext(events), 0.1)
+        await scheduler.close()
+
+    async def test_resyncs_refetched_schedule(self):
+        """Test timers follow a schedule updated by the change feed"""
+        schedule = make_schedule(-60, 3600)
+        schedules = AsyncMock()
+        schedules.get_schedule = AsyncMock(return_value=schedule)
+        scheduler = ProgrammeScheduler(schedules=schedules)
+        events = scheduler.events()
+        await scheduler.watch("bbc_radio_four")
+
+        # The programme is cut short, and the refetched schedule merged in place
+        schedule.sub_items[0].end = dt.now(UTC) + timedelta(seconds=0.05)
+        scheduler._on_changes(ChangeSet(name="schedule:bbc_radio_four:today"))
+
+        event = await asyncio.wait_for(anext(events), 1)
+        assert (event.kind, event.item.id) == ("ended", "p0")
+
+        scheduler.unwatch("bbc_radio_four")
+        assert scheduler._handle is None
+        await scheduler.close()
+        assert [event async for event in events] == []
@@ -0,0 +1,200 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import aiohttp
+import pytest
+
+from sounds.exceptions import NetworkError
+from sounds.hls import ThroughputEstimator
+from sounds.relay import HLSRelay, SegmentBuffer, SharedSegmentBuffer
+
+pytestmark = pytest.mark.anyio
+
+MASTER_PLAYLIST = """#EXTM3U
+#EXT-X-STREAM-INF:BANDWIDTH=101760,CODECS="mp4a.40.5"
+audio=96000.m3u8
+"""
+
+MEDIA_PLAYLIST = """#EXTM3U
+#EXT-X-TARGETDURATION:7
+#EXT-X-MEDIA-SEQUENCE:100
+#EXT-X-MAP:URI="init.mp4"
+#EXTINF:6.4,
+seg100.m4s
+#EXTINF:6.4,
+seg101.m4s
+#EXTINF:6.4,
+seg102.m4s
+#EXTINF:6.4,
+https://other.example.com/seg103.m4s
+"""
+
+
+class TestHLSRelay:
+    """Tests for the local prefetching relay"""
+
+    def test_segment_buffer_is_bounded(self):
+        """Test the least recently used segments are evicted"""
+        buffer = SegmentBuffer(max_segments=2)
+        buffer.put("a", b"a")
+        buffer.put("b", b"b")
+        assert buffer.get("a") == b"a"
+        buffer.put("c", b"c")
+        assert "b" not in buffer
+        assert len(buffer) == 2
+
+    def test_shared_buffer_frees_read_segments(self):
+        """Test shared segments are kept until every listener has read them"""
+        buffer = SharedSegmentBuffer(max_segments=4)
+        buffer.add_listener("a")
+        buffer.add_listener("b")
+        data = b"segment"
+        buffer.put("s1", data)
+        buffer.put("s2", b"other")
+        assert buffer.get("s1").obj is data
+
+        buffer.release("s1", "a")
+        assert "s1" in buffer
+        buffer.release("s1", "b")
+        assert "s1" not in buffer
+
+        # A listener leaving frees what only it had left to read
+        buffer.release("s2", "a")
+        buffer.remove_listener("b")
+        assert len(buffer) == 0
+        assert buffer.listeners == {"a"}
+
+    async def test_relays_and_prefetches(self, mock_session, mock_logger):
+        """Test playlists are rewritten and segments prefetched ahead of the player"""
+        throughput = ThroughputEstimator()
+        relay = HLSRelay(
+            session=mock_session,
+            logger=mock_logger,
+            prefetch=2,
+            throughput=throughput,
+        )
+        playlists = {
+            "https://cdn.example.com/live/master.m3u8": MASTER_PLAYLIST,
+            "https://cdn.example.com/live/audio=96000.m3u8": MEDIA_PLAYLIST,
+        }
+        relay._get_html = AsyncMock(side_effect=lambda url: playlists[url])
+        relay._get_bytes = AsyncMock(side_effect=lambda url: url.encode())
+
+        async with relay, aiohttp.ClientSession() as client:
+            local_url = relay.add_stream("https://cdn.example.com/live/master.m3u8")
+            async with client.get(local_url) as resp:
+                master = await resp.text()
+            variant_path = master.splitlines()[-1]
+            assert variant_path.startswith("/playlists/")
+
+            async with client.get(relay.base_url + variant_path) as resp:
+                assert resp.content_type == "application/vnd.apple.mpegurl"
+                media = (await resp.text()).splitlines()
+            assert media[3].startswith('#EXT-X-MAP:URI="/segments/')
+            segment_paths = [line for line in media if line.startswith("/segments/")]
+            assert len(segment_paths) == 4
+
+            async with client.get(relay.base_url + segment_paths[0]) as resp:
+                assert resp.content_type == "audio/mp4"
+                assert await resp.read() == b"https://cdn.example.com/live/seg100.m4s"
+
+            # The next two segments are fetched without being asked for
+            await asyncio.sleep(0.05)
+            fetched = [call.args[0] for call in relay._get_bytes.await_args_list]
+            assert fetched == [
+                "https://cdn.example.com/live/seg100.m4s",
+                "https://cdn.example.com/live/seg101.m4s",
+                "https://cdn.example.com/live/seg102.m4s",
+            ]
+            async with client.get(relay.base_url + segment_paths[1]) as resp:
+                assert await resp.read() == b"https://cdn.example.com/live/seg101.m4s"
+            await asyncio.sleep(0.05)
+            assert relay._get_bytes.await_count == 4
+            assert throughput.bitrate is not None
+
+            # Only hosts of relayed streams are fetched from
+            async with client.get(
+                f"{relay.base_url}/segments/1/aHR0cHM6Ly9ldmlsLmV4YW1wbGUuY29tLw"
+            ) as resp:
+                assert resp.status == 404
+        assert not relay.running
+
+    async def test_fan_out(self, mock_session, mock_logger):
+        """Test listeners share one upstream fetch of each segment"""
+        relay = HLSRelay(
+            session=mock_session, logger=mock_logger, prefetch=0, fan_out=True
+        )
+        relay._get_html = AsyncMock(return_value=MEDIA_PLAYLIST)
+        relay._get_bytes = AsyncMock(side_effect=lambda url: url.encode())
+        stream_url = "https://cdn.example.com/live/audio=96000.m3u8"
+
+        async with relay, aiohttp.ClientSession() as client:
+            local_urls = [
+                relay.add_stream(stream_url, listener=name) for name in ("a", "b")
+            ]
+            assert local_urls[0].endswith("?listener=a")
+            segments = []
+            for local_url in local_urls:
+                async with client.get(local_url) as resp:
+                    media = (await resp.text()).splitlines()
+                segments.append(
+                    [line for line in media if line.startswith("/segments/")][0]
+                )
+            assert segments[0].endswith("?listener=a")
+            assert segments[1].endswith("?listener=b")
+
+            async with client.get(relay.base_url + segments[0]) as resp:
+                assert await resp.read() == b"https://cdn.example.com/live/seg100.m4s"
+            assert len(relay.buffer) == 1
+            async with client.get(relay.base_url + segments[1]) as resp:
+                assert await resp.read() == b"https://cdn.example.com/live/seg100.m4s"
+            assert relay._get_bytes.await_count == 1
+            assert len(relay.buffer) == 0
+
+    async def test_idle_streams_are_pruned(self, mock_session, mock_logger):
+        """Test a stream that's stopped being played is forgotten with its hosts"""
+        relay = HLSRelay(session=mock_session, logger=mock_logger, idle_timeout=60)
+        relay._get_html = AsyncMock(return_value=MEDIA_PLAYLIST)
+        relay.add_stream("https://cdn.example.com/live/master.m3u8")
+        relay._rewrite(relay._playlists["0"], MASTER_PLAYLIST)
+        assert len(relay._playlists) == 2
+
+        relay._playlists["0"].stream.last_used -= 120
+        relay.add_stream("https://next.example.com/live/master.m3u8")
+        assert list(relay._playlists) == ["2"]
+        assert list(relay._playlist_ids) == [
+            "https://next.example.com/live/master.m3u8"
+        ]
+        assert relay._playlists["2"].stream.hosts == {"next.example.com"}
+
+    @pytest.mark.parametrize("error", [TimeoutError(), NetworkError("Offline")])
+    async def test_upstream_failures(self, mock_session, mock_logger, error):
+        """Test timeouts and errors upstream are bad gateways"""
+        relay = HLSRelay(session=mock_session, logger=mock_logger, prefetch=0)
+        relay._get_html = AsyncMock(side_effect=[MEDIA_PLAYLIST, error])
+        relay._get_bytes = AsyncMock(side_effect=error)
+
+        async with relay, aiohttp.ClientSession() as client:
+            local_url = relay.add_stream("https://cdn.example.com/live/audio.m3u8")
+            async with client.get(local_url) as resp:
+                media = (await resp.text()).splitlines()
+            segment_path = [line for line in media if line.startswith("/segments/")][0]
+            async with client.get(relay.base_url + segment_path) as resp:
+                assert resp.status == 502
+            async with client.get(local_url) as resp:
+                assert resp.status == 502
+
+    async def test_stop_waits_for_fetches(self, mock_session, mock_logger):
+        """Test stopping cancels prefetches and waits for them to finish"""
+        relay = HLSRelay(session=mock_session, logger=mock_logger)
+
+        async def stalled(url):
+            await asyncio.sleep(3600)
+
+        relay._get_bytes = AsyncMock(side_effect=stalled)
+        await relay.start()
+        fetch = relay._start_fetch("https://cdn.example.com/live/seg100.m4s")
+        await asyncio.sleep(0)
+        await relay.stop()
+        assert fetch.cancelled()
+        assert relay._tasks == set()
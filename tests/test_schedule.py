@@ -1,8 +1,15 @@
+import math
+import time
+from datetime import UTC, date, timedelta
+from datetime import datetime as dt
 from unittest.mock import AsyncMock
 
 import pytest
+import pytz
 
+from sounds.catalogue import StationIndex
 from sounds.exceptions import InvalidFormatError
+from sounds.models import LiveStation, Schedule, ScheduleItem
 from sounds.schedule import ScheduleService
 
 pytestmark = pytest.mark.anyio
@@ -41,3 +48,126 @@ class TestScheduleService:
             await service.get_schedule("bbc_radio_one", date="2025-01-15")
         except InvalidFormatError:
             pytest.fail("Valid date format raised InvalidFormatError")
+
+    async def test_get_schedules_merges_days(
+        self, mock_session, mock_logger, monkeypatch
+    ):
+        """Test days are merged into one timeline of broadcasts, caching past days"""
+        service = ScheduleService(session=mock_session, logger=mock_logger)
+        today = dt.now(UTC).replace(hour=0, minute=0, second=0, microsecond=0)
+
+        def day_schedule(json_resp, identity_map=None):
+            start = dt.fromisoformat(json_resp["date"]).replace(tzinfo=UTC)
+            return Schedule(
+                id="schedule_items",
+                sub_items=[
+                    # Each day's schedule includes the programme running over midnight
+                    ScheduleItem(
+                        id=f"p{(start - today).days - 1}",
+                        start=start - timedelta(hours=1),
+                        end=start + timedelta(hours=1),
+                    ),
+                    # A repeat of the same episode every day
+                    ScheduleItem(
+                        id=f"p{(start - today).days}",
+                        urn="urn:bbc:radio:episode:m001234",
+                        start=start + timedelta(hours=23),
+                        # Long enough that yesterday hasn't finished airing yet
+                        end=start + timedelta(hours=48),
+                    ),
+                ],
+            )
+
+        monkeypatch.setattr("sounds.schedule.parse_schedule", day_schedule)
+        service._get_json = AsyncMock(
+            side_effect=lambda url_template, url_args: {"date": url_args["date"]}
+        )
+        start_date = (today - timedelta(days=3)).date()
+
+        schedule = await service.get_schedules(
+            "bbc_radio_four", start_date, today.date().isoformat()
+        )
+        assert [item.id for item in schedule.sub_items] == [
+            "p-4",
+            "p-3",
+            "p-2",
+            "p-1",
+            "p0",
+        ]
+        assert service._get_json.await_count == 4
+
+        # Come midnight, the two days which have finished airing aren't fetched again
+        service._schedules = {
+            key: (schedule, expires_at if expires_at == math.inf else 0.0)
+            for key, (schedule, expires_at) in service._schedules.items()
+        }
+        await service.get_schedules("bbc_radio_four", start_date, today.date())
+        assert service._get_json.await_count == 6
+
+    async def test_schedule_cached_until_midnight(
+        self, mock_session, mock_logger, monkeypatch
+    ):
+        """Test today's schedule is kept until midnight in the client's timezone"""
+        timezone = pytz.timezone("Australia/Sydney")
+        service = ScheduleService(
+            session=mock_session, logger=mock_logger, timezone=timezone
+        )
+        now = dt.now(UTC)
+        schedule = Schedule(
+            id="schedule_items",
+            sub_items=[ScheduleItem(id="p1", start=now, end=now + timedelta(hours=1))],
+        )
+        service._get_json = AsyncMock(return_value={})
+        monkeypatch.setattr(
+            "sounds.schedule.parse_schedule", lambda json_resp, identity_map: schedule
+        )
+
+        assert await service.get_schedule("bbc_radio_four") is schedule
+        assert await service.get_schedule("bbc_radio_four") is schedule
+        assert service._get_json.await_count == 1
+
+        _, expires_at = service._schedules[("bbc_radio_four", None)]
+        midnight = dt.fromtimestamp(expires_at, tz=timezone)
+        assert (midnight.hour, midnight.minute) == (0, 0)
+        assert 0 < expires_at - time.time() <= 25 * 3600
+
+        await service.get_schedule("bbc_radio_four", refresh=True)
+        assert service._get_json.await_count == 2
+
+    async def test_recently_played_cached_until_segment_ends(
+        self, mock_session, mock_logger
+    ):
+        """Test now playing is kept until the current segment is expected to end"""
+        service = ScheduleService(session=mock_session, logger=mock_logger)
+        index = StationIndex([LiveStation(id="bbc_6music", progress={"value": 600})])
+        service.catalogue._index._value = index
+        segment = {
+            "type": "segment_item",
+            "id": "track",
+            "segment_type": "music",
+            "titles": {"primary": "Artist", "secondary": "Track"},
+            "image_url": None,
+            "offset": {"start": 480, "end": 720, "now_playing": True},
+            "uris": [],
+        }
+        service._get_json = AsyncMock(return_value={"data": [segment]})
+
+        segments = await service.recently_played_items("bbc_6music", results=1)
+        assert [item.id for item in segments] == ["track"]
+        await service.recently_played_items("bbc_6music", results=1)
+        assert service._get_json.await_count == 1
+
+        # 600s into the programme, the segment ends 720s in
+        _, expires_at = service._segments[("bbc_6music", 1)]
+        assert expires_at == pytest.approx(index.fetched_at + 120)
+
+        await service.recently_played_items("bbc_6music", results=1, refresh=True)
+        assert service._get_json.await_count == 2
+
+    async def test_get_schedules_invalid_range(self, mock_session, mock_logger):
+        """Test an end date before the start date is refused"""
+        service = ScheduleService(session=mock_session, logger=mock_logger)
+        with pytest.raises(InvalidFormatError):
+            await service.get_schedules(
+                "bbc_radio_four", date(2025, 1, 15), "2025-01-14"
+            )
@@ -0,0 +1,71 @@
+import pickle
+
+import pytest
+
+from sounds import serialization
+from sounds.exceptions import InvalidFormatError
+from sounds.models import Menu, MenuItem
+from sounds.parser import parse_menu, parse_schedule
+
+
+class TestSerialization:
+    """Tests for binary snapshots of parsed models"""
+
+    def test_menu_round_trip(self, sample_menu_data):
+        """Test a parsed menu survives a snapshot round trip"""
+        menu = parse_menu(sample_menu_data)
+        restored = serialization.loads(serialization.dumps(menu))
+        assert isinstance(restored, Menu)
+        assert restored == menu
+
+    def test_schedule_round_trip(self, sample_network_data):
+        """Test a parsed schedule keeps its datetimes"""
+        schedule = parse_schedule(sample_network_data)
+        restored = serialization.loads(serialization.dumps(schedule))
+        assert restored.sub_items[0].start == schedule.sub_items[0].start
+
+    def test_file_round_trip(self, tmp_path):
+        """Test snapshots can be written to and read from disk"""
+        item = MenuItem(id="listen_live", title="Listen Live")
+        path = tmp_path / "menu.snapshot"
+        serialization.dump(item, path)
+        assert serialization.load(path) == item
+
+    def test_rejects_non_snapshot(self):
+        """Test loading arbitrary bytes fails"""
+        with pytest.raises(InvalidFormatError):
+            serialization.loads(b"not a snapshot at all")
+
+    def test_rejects_other_model_versions(self, monkeypatch):
+        """Test snapshots from different model definitions are refused"""
+        data = serialization.dumps(MenuItem(id="item"))
+        monkeypatch.setattr(serialization, "_models_fingerprint", lambda: 0)
+        with pytest.raises(InvalidFormatError):
+            serialization.loads(data)
+
+    def test_rejects_disallowed_globals(self):
+        """Test snapshots can't reference arbitrary callables"""
+        header = serialization._HEADER.pack(
+            serialization.MAGIC,
+            serialization.SNAPSHOT_VERSION,
+            serialization._models_fingerprint(),
+        )
+        with pytest.raises(InvalidFormatError):
+            serialization.loads(header + pickle.dumps(print))
+
+    @pytest.mark.parametrize("name", ["pytz.os.getcwd", "pytz", "_parse_datetime"])
+    def test_rejects_non_model_globals(self, name):
+        """Test only classes defined in sounds.models can be referenced from it"""
+        header = serialization._HEADER.pack(
+            serialization.MAGIC,
+            serialization.SNAPSHOT_VERSION,
+            serialization._models_fingerprint(),
+        )
+
+        def unicode(text):
+            return b"\x8c" + bytes([len(text)]) + text.encode()
+
+        # PROTO 4, then call sounds.models.<name>() with no arguments
+        gadget = b"\x80\x04" + unicode("sounds.models") + unicode(name) + b"\x93)R."
+        with pytest.raises(InvalidFormatError):
+            serialization.loads(header + gadget)
@@ -1,12 +1,51 @@
+import time
+from datetime import UTC, timedelta
+from datetime import datetime as dt
 from unittest.mock import AsyncMock
 
 import pytest
 
+from sounds.catalogue import StationIndex
+from sounds.constants import URLs
+from sounds.exceptions import APIResponseError
+from sounds.models import LiveStation, Network, Schedule, ScheduleItem
+from sounds.schedule import ScheduleService
 from sounds.stations import StationService
 
 pytestmark = pytest.mark.anyio
 
 
+def station_node(station_id: str, **extra) -> dict:
+    return {
+        "type": "playable_item",
+        "id": station_id,
+        "urn": f"urn:bbc:radio:network:{station_id}",
+        "synopses": {},
+        **extra,
+    }
+
+
+def stations_payload(national=(), local=()) -> dict:
+    """A station list response, from station IDs or nodes"""
+    return {
+        "data": [
+            {
+                "data": [
+                    node if isinstance(node, dict) else station_node(node)
+                    for node in stations
+                ]
+            }
+            for stations in (national, local)
+        ]
+    }
+
+
+def respond_with(mock_session, payload: dict) -> None:
+    mock_response = AsyncMock()
+    mock_response.json = AsyncMock(return_value=payload)
+    mock_session.request = AsyncMock(return_value=mock_response)
+
+
 class TestStationService:
     """Tests for station service"""
 
@@ -22,32 +61,235 @@ class TestStationService:
             schedules=mock_schedule,
         )
 
-        mock_response = AsyncMock()
-        mock_response.json = AsyncMock(
-            return_value={
-                "data": [
-                    {
-                        "data": [
-                            {
-                                "type": "playable_item",
-                                "id": "national1",
-                                "urn": "urn:bbc:radio:network:radio1",
-                            }
-                        ]
-                    },
-                    {
-                        "data": [
-                            {
-                                "type": "playable_item",
-                                "id": "local1",
-                                "urn": "urn:bbc:radio:network:local1",
-                            }
-                        ]
-                    },
-                ]
-            }
-        )
-        mock_session.request = AsyncMock(return_value=mock_response)
+        respond_with(mock_session, stations_payload(["national1"], ["local1"]))
 
         result = await service.get_stations(include_local=False)
         assert isinstance(result, list)
+
+    async def test_get_stations_enrichment_isolates_failures(
+        self, mock_session, mock_logger
+    ):
+        """Test one station failing to get a stream doesn't fail the others"""
+        mock_streaming = AsyncMock()
+        mock_schedule = AsyncMock()
+
+        async def get_live_stream(station_id):
+            if station_id == "national2":
+                raise RuntimeError("No valid stream found")
+            return f"https://example.com/{station_id}.m3u8"
+
+        mock_streaming.get_live_stream.side_effect = get_live_stream
+        mock_schedule.get_schedule.return_value = None
+
+        service = StationService(
+            session=mock_session,
+            logger=mock_logger,
+            streaming=mock_streaming,
+            schedules=mock_schedule,
+        )
+        respond_with(
+            mock_session,
+            stations_payload([f"national{i}" for i in range(1, 4)]),
+        )
+        progress = []
+
+        result = await service.get_stations(
+            include_streams=True,
+            include_schedules=True,
+            on_progress=lambda station, done, total: progress.append((done, total)),
+        )
+
+        assert [station.stream for station in result] == [
+            "https://example.com/national1.m3u8",
+            None,
+            "https://example.com/national3.m3u8",
+        ]
+        assert mock_schedule.get_schedule.await_count == 3
+        assert progress == [(1, 3), (2, 3), (3, 3)]
+
+        # Stations already enriched get their streams again, which may have expired
+        result[0].stream = "https://example.com/expired.m3u8"
+        result = await service.get_stations(include_streams=True)
+        assert result[0].stream == "https://example.com/national1.m3u8"
+        assert mock_streaming.get_live_stream.await_count == 6
+
+    async def test_get_stations_filters_cached_catalogue(
+        self, mock_session, mock_logger
+    ):
+        """Test national-only and local calls are served from one fetch"""
+        service = StationService(
+            session=mock_session,
+            logger=mock_logger,
+            streaming=AsyncMock(),
+            schedules=AsyncMock(),
+        )
+        national1 = station_node(
+            "national1", duration={"value": 3600}, progress={"value": 3000}
+        )
+        respond_with(mock_session, stations_payload([national1], ["local1"]))
+
+        national = await service.get_stations(include_local=False)
+        everything = await service.get_stations(include_local=True)
+
+        assert [station.id for station in national] == ["national1"]
+        assert [station.id for station in everything] == ["national1", "local1"]
+        # One request for the stations and one for the network aliases
+        assert mock_session.request.await_count == 2
+        # Expires when the current programme on national1 ends
+        assert 590 <= service.catalogue.expires_at - time.time() <= 600
+
+    async def test_get_station_by_alias(self, mock_session, mock_logger):
+        """Test stations can be found by URN, network id, key and service id"""
+        service = StationService(
+            session=mock_session,
+            logger=mock_logger,
+            streaming=AsyncMock(),
+            schedules=AsyncMock(),
+        )
+        stations = stations_payload(
+            [
+                station_node(
+                    "bbc_radio_fourfm",
+                    network={"id": "bbc_radio_four", "key": "radio4"},
+                )
+            ]
+        )
+        networks = {
+            "data": [
+                {
+                    "id": "bbc_radio_four",
+                    "key": "radio4",
+                    "services": [{"type": "service", "id": "bbc_radio_fourlw"}],
+                }
+            ]
+        }
+
+        async def request(method, url, **kwargs):
+            response = AsyncMock()
+            response.json = AsyncMock(
+                return_value=networks if url == URLs.NETWORKS_LIST.value else stations
+            )
+            return response
+
+        mock_session.request = AsyncMock(side_effect=request)
+        station = await service.get_station("bbc_radio_fourfm")
+        assert station is not None
+
+        for key in (
+            "bbc_radio_fourfm",
+            "urn:bbc:radio:network:bbc_radio_fourfm",
+            "bbc_radio_four",
+            "radio4",
+            "bbc_radio_fourlw",
+        ):
+            assert await service.get_station(key) is station
+        assert await service.get_station("bbc_radio_two") is None
+        assert mock_session.request.await_count == 2
+
+    def test_index_prefers_station_ids_to_aliases(self):
+        """Test a station's id isn't shadowed by another station's network id"""
+        fm = LiveStation(
+            id="bbc_radio_fourfm", network=Network(id="bbc_radio_four", key="radio4")
+        )
+        extra = LiveStation(
+            id="bbc_radio_four", network=Network(id="bbc_radio_four_extra")
+        )
+        index = StationIndex([fm, extra])
+        assert index.get("bbc_radio_four") is extra
+        assert index.get("radio4") is fm
+        assert len(index) == 2
+
+    async def test_get_station_schedule_menu(self, mock_session, mock_logger):
+        """Test the schedule menu is built from one fetch with lazy days"""
+        schedules = AsyncMock()
+        schedules.get_schedule = AsyncMock(
+            return_value=Schedule(id="today", sub_items=[ScheduleItem(id="p001")])
+        )
+        service = StationService(
+            session=mock_session,
+            logger=mock_logger,
+            streaming=AsyncMock(),
+            schedules=schedules,
+        )
+        respond_with(
+            mock_session, stations_payload(["bbc_radio_one", "bbc_radio_fourfm"])
+        )
+
+        menu = await service.get_station_schedule_menu(expanded="bbc_radio_fourfm")
+
+        assert [item.id for item in menu.sub_items] == [
+            "bbc_radio_one",
+            "bbc_radio_fourfm",
+        ]
+        assert not menu.get("bbc_radio_one").sub_items.loaded
+        schedules.get_schedule.assert_awaited_once_with("bbc_radio_fourfm")
+
+        today = menu.resolve(["bbc_radio_fourfm", dt.now().strftime("%Y-%m-%d")])
+        assert today.title == "Today"
+        assert [item.id for item in today.sub_items] == ["p001"]
+        assert len(menu.get("bbc_radio_one").sub_items) == 30
+        # One request for the stations and one for the network aliases
+        assert mock_session.request.await_count == 2
+
+    async def test_stations_shared_with_schedules(self, mock_session, mock_logger):
+        """Test listings and current programmes come from one station list"""
+        schedules = ScheduleService(session=mock_session, logger=mock_logger)
+        service = StationService(
+            session=mock_session,
+            logger=mock_logger,
+            streaming=AsyncMock(),
+            schedules=schedules,
+        )
+        respond_with(
+            mock_session, stations_payload(["bbc_radio_one"], ["bbc_radio_york"])
+        )
+
+        assert service.catalogue is schedules.catalogue
+        local = await service.get_local_stations()
+        programmes = await schedules.current_programmes(
+            ["bbc_radio_one", "bbc_radio_york", "bbc_radio_two"]
+        )
+
+        assert [station.id for station in local] == ["bbc_radio_york"]
+        assert programmes["bbc_radio_york"] is local[0]
+        assert programmes["bbc_radio_one"].id == "bbc_radio_one"
+        assert programmes["bbc_radio_two"] is None
+        assert (
+            await schedules.current_programme("bbc_radio_one")
+            is (programmes["bbc_radio_one"])
+        )
+        # One request for the stations and one for the network aliases
+        assert mock_session.request.await_count == 2
+
+    async def test_build_epg_isolates_failures(self, mock_session, mock_logger):
+        """Test a station whose schedules fail is left empty in the guide"""
+        start = dt(2026, 10, 19, 6, 0, tzinfo=UTC)
+        schedules = AsyncMock()
+
+        async def get_schedules(station_id, start_date, end_date):
+            if station_id == "bbc_radio_two":
+                raise APIResponseError("Couldn't get schedule")
+            return Schedule(
+                id="schedule_items",
+                sub_items=[
+                    ScheduleItem(id="p001", start=start, end=start + timedelta(hours=2))
+                ],
+            )
+
+        schedules.get_schedules = AsyncMock(side_effect=get_schedules)
+        service = StationService(
+            session=mock_session,
+            logger=mock_logger,
+            streaming=AsyncMock(),
+            schedules=schedules,
+        )
+        service.catalogue.get_index = AsyncMock(return_value=StationIndex([]))
+
+        epg = await service.build_epg(
+            ["bbc_radio_one", "bbc_radio_two"], start, start + timedelta(hours=1)
+        )
+        assert epg.n_slots == 2
+        assert list(epg.cells) == [0, 0, -1, -1]
+        schedules.get_schedules.assert_any_await(
+            "bbc_radio_one", start.date(), start.date()
+        )
@@ -0,0 +1,60 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from sounds.stream_pool import LiveStreamPool
+
+pytestmark = pytest.mark.anyio
+
+
+class TestLiveStreamPool:
+    """Tests for keeping favourite stations' streams resolved"""
+
+    def test_renewal_delay(self):
+        """Test renewals come a jittered margin before expiry"""
+        pool = LiveStreamPool(streaming=Mock(), margin=120, jitter=0.1)
+        delays = [pool.renewal_delay(time.time() + 600) for _ in range(50)]
+        assert all(430 <= delay <= 480 for delay in delays)
+        assert len({round(delay, 3) for delay in delays}) > 1
+
+        # Short lived streams are renewed halfway through
+        assert 40 <= pool.renewal_delay(time.time() + 100) <= 50
+        assert pool.renewal_delay(time.time() - 10) >= 0.9
+
+    async def test_keeps_streams_warm(self):
+        """Test each station's stream is resolved and renewed in the background"""
+        streaming = Mock()
+        streaming.get_live_stream = AsyncMock(return_value="https://example.com/hls")
+        streaming.live_stream_expires_at = Mock(return_value=time.time() + 600)
+        pool = LiveStreamPool(streaming=streaming)
+        pool.add("bbc_radio_one")
+
+        async with pool:
+            pool.add("bbc_6music")
+            await asyncio.sleep(0)
+            assert sorted(
+                call.args[0] for call in streaming.get_live_stream.await_args_list
+            ) == ["bbc_6music", "bbc_radio_one"]
+            assert all(
+                call.kwargs == {"refresh": True}
+                for call in streaming.get_live_stream.await_args_list
+            )
+            pool.discard("bbc_6music")
+            assert pool.station_ids == {"bbc_radio_one"}
+        assert not pool.running
+
+    async def test_retries_failed_renewals(self):
+        """Test a failed renewal is retried rather than stopping the station"""
+        streaming = Mock()
+        streaming.get_live_stream = AsyncMock(
+            side_effect=[RuntimeError("No valid stream found"), "https://example.com"]
+        )
+        streaming.live_stream_expires_at = Mock(return_value=time.time() + 600)
+        pool = LiveStreamPool(streaming=streaming, retry_after=0.01)
+        pool.add("bbc_radio_one")
+
+        async with pool:
+            await asyncio.sleep(0.05)
+        assert streaming.get_live_stream.await_count == 2
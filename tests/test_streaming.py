@@ -1,8 +1,13 @@
+import base64
+import json
+import time
 from unittest.mock import AsyncMock
 
 import pytest
 
 from sounds.exceptions import APIResponseError
+from sounds.identity import IdentityMap
+from sounds.models import RadioShow
 
 pytestmark = pytest.mark.anyio
 
@@ -31,6 +36,18 @@ class TestStreamingService:
         result = mock_streaming_service.get_best_stream(streams, prefer_type="hls")
         assert result is None
 
+    async def test_get_best_stream_skips_missing_href(self, mock_streaming_service):
+        """Test connections without a URL are skipped"""
+
+        streams = [
+            {"transferFormat": "hls"},
+            {"transferFormat": "hls", "href": "https://example.com/hls"},
+        ]
+
+        result = mock_streaming_service.get_best_stream(streams, prefer_type="hls")
+        assert result == "https://example.com/hls"
+        assert mock_streaming_service.get_best_stream(streams[:1]) is None
+
     async def test_invalid_pid(
         self, mock_user, mock_logger, mock_session, mock_streaming_service
     ):
@@ -54,3 +71,179 @@ class TestStreamingService:
         mock_user.is_uk_listener.return_value = True
         with pytest.raises(APIResponseError):
             await mock_streaming_service.get_by_pid("invalid pid")
+
+    async def test_get_by_pid_from_identity_map(
+        self, mock_streaming_service, sample_playable_item
+    ):
+        """Test get_by_pid reuses an item it fetched recently without a request"""
+        service = mock_streaming_service
+        service.identity_map = IdentityMap()
+        service.user.is_uk_listener = AsyncMock(return_value=False)
+        service._get_json = AsyncMock(return_value=sample_playable_item)
+        pid = sample_playable_item["urn"].split(":")[-1]
+
+        item = await service.get_by_pid(pid)
+        assert await service.get_by_pid(pid) is item
+        service._get_json.assert_awaited_once()
+
+        await service.get_by_pid(pid, max_age=0)
+        assert service._get_json.await_count == 2
+
+    async def test_get_by_pid_ignores_partial_items(
+        self, mock_streaming_service, sample_playable_item
+    ):
+        """Test items only known from listings are fetched in full"""
+        service = mock_streaming_service
+        service.identity_map = IdentityMap()
+        pid = sample_playable_item["urn"].split(":")[-1]
+        partial = RadioShow(id="p0broadcast", urn=sample_playable_item["urn"])
+        service.identity_map.merge(partial)
+        service.user.is_uk_listener = AsyncMock(return_value=False)
+        service._get_json = AsyncMock(return_value=sample_playable_item)
+
+        item = await service.get_by_pid(pid)
+        service._get_json.assert_awaited_once()
+        assert item is not partial
+        assert item.id == sample_playable_item["id"]
+
+    async def test_live_stream_cached_until_token_expires(self, mock_streaming_service):
+        """Test a station's stream is only resolved again once invalidated"""
+        expires = int(time.time()) + 600
+        payload = base64.urlsafe_b64encode(json.dumps({"exp": expires}).encode())
+        mediaset = {
+            "media": [
+                {
+                    "connection": [
+                        {"transferFormat": "dash", "href": "https://example.com/dash"},
+                        {"transferFormat": "hls", "href": "https://example.com/hls"},
+                    ]
+                }
+            ]
+        }
+        mock_streaming_service._get_json = AsyncMock(
+            side_effect=lambda url_template, **kwargs: (
+                {"token": f"header.{payload.decode()}.signature"}
+                if url_template.name == "JWT"
+                else mediaset
+            )
+        )
+
+        service = mock_streaming_service
+        assert await service.get_live_stream("bbc_6music") == "https://example.com/hls"
+        assert (
+            await service.get_live_stream("bbc_6music", stream_format="dash")
+            == "https://example.com/dash"
+        )
+        assert service._get_json.await_count == 2
+        assert service._mediasets["bbc_6music"].expires_at == expires - 30
+
+        service.invalidate_live_stream("bbc_6music")
+        await service.get_live_stream("bbc_6music")
+        assert service._get_json.await_count == 4
+
+    async def test_live_stream_expires_with_urls(self, mock_streaming_service):
+        """Test an expired stream URL is resolved again"""
+        mediaset = {
+            "media": [
+                {
+                    "connection": [
+                        {
+                            "transferFormat": "hls",
+                            "href": f"https://example.com/hls?hdnea=exp={int(time.time())}",
+                        }
+                    ]
+                }
+            ]
+        }
+        mock_streaming_service._get_json = AsyncMock(
+            side_effect=[{"token": "opaque"}, mediaset, {"token": "opaque"}, mediaset]
+        )
+        await mock_streaming_service.get_live_stream("bbc_6music")
+        await mock_streaming_service.get_live_stream("bbc_6music")
+        assert mock_streaming_service._get_json.await_count == 4
+
+    async def test_episode_mediaset_cached(self, mock_streaming_service):
+        """Test an episode's mediaset is reused until its URLs expire or it fails"""
+        expires = int(time.time()) + 600
+        mediaset = {
+            "media": [
+                {
+                    "connection": [
+                        {
+                            "transferFormat": "hls",
+                            "href": f"https://example.com/hls?hdnea=exp={expires}",
+                        }
+                    ]
+                }
+            ]
+        }
+        service = mock_streaming_service
+        service._get_json = AsyncMock(return_value=mediaset)
+        service.hls.select = AsyncMock(side_effect=[None, "selection"])
+
+        assert await service.get_episode_stream("p0abc123") is not None
+        assert await service.get_episode_stream("p0abc123") is not None
+        assert service._get_json.await_count == 1
+        assert service._mediasets["p0abc123"].expires_at == expires - 30
+
+        # A cached mediaset none of whose streams play is resolved again
+        assert await service.get_episode_hls("p0abc123") == "selection"
+        assert service._get_json.await_count == 2
+
+        service.invalidate_stream("p0abc123")
+        await service.get_episode_stream("p0abc123")
+        assert service._get_json.await_count == 3
+
+    async def test_get_podcast_episodes_all_pages(
+        self, mock_streaming_service, sample_playable_item
+    ):
+        """Test every page of a podcast's episodes is fetched when asked for"""
+
+        def page(url_template, url_args):
+            offset = url_args["offset"]
+            return {
+                "total": 5,
+                "limit": 2,
+                "offset": offset,
+                "data": [
+                    {
+                        **sample_playable_item,
+                        "id": f"p{n}",
+                        "urn": f"urn:bbc:radio:episode:p{n}",
+                    }
+                    for n in range(offset, min(offset + 2, 5))
+                ],
+            }
+
+        mock_streaming_service._get_json = AsyncMock(side_effect=page)
+        episodes = await mock_streaming_service.get_podcast_episodes(
+            "p0hhgmp6", all_pages=True
+        )
+        assert [episode.pid for episode in episodes] == [f"p{n}" for n in range(5)]
+        assert mock_streaming_service._get_json.await_count == 3
+
+    async def test_get_podcast_episodes_first_page(
+        self, mock_streaming_service, sample_playable_item
+    ):
+        """Test only the first page of episodes is fetched by default"""
+        mock_streaming_service._get_json = AsyncMock(
+            return_value={"total": 5, "data": [sample_playable_item]}
+        )
+        episodes = await mock_streaming_service.get_podcast_episodes("p0hhgmp6")
+        assert [episode.id for episode in episodes] == [sample_playable_item["id"]]
+        mock_streaming_service._get_json.assert_awaited_once()
+
+    async def test_heartbeat_details_cached(self, mock_streaming_service):
+        """Test a PID's version and resource type are only fetched once"""
+        mock_streaming_service._get_json = AsyncMock(
+            return_value={
+                "defaultAvailableVersion": {"smpConfig": {"items": [{"vpid": "v1"}]}},
+                "statsObject": {"parentPIDType": "episode"},
+            }
+        )
+        for _ in range(3):
+            assert await mock_streaming_service.get_heartbeat_details("p1") == (
+                "v1",
+                "episode",
+            )
+        assert mock_streaming_service._get_json.await_count == 1
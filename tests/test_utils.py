@@ -1,8 +1,18 @@
+import asyncio
+import base64
+import json
+
 import pytest
 from pytest import MarkDecorator
 
 from sounds.constants import ImageType
-from sounds.utils import image_from_recipe, network_logo
+from sounds.utils import (
+    image_from_recipe,
+    jwt_expiry,
+    network_logo,
+    run_concurrently,
+    url_expiry,
+)
 
 pytestmark: MarkDecorator = pytest.mark.anyio
 
@@ -37,3 +47,38 @@ class TestUtils:
         """Test image recipe with None input"""
         result = image_from_recipe(None, 640)
         assert result is None
+
+    async def test_run_concurrently(self):
+        """Test run_concurrently keeps order, limits concurrency and isolates errors"""
+        running = 0
+        most_running = 0
+
+        async def work(item):
+            nonlocal running, most_running
+            running += 1
+            most_running = max(most_running, running)
+            await asyncio.sleep(0)
+            running -= 1
+            if item == 3:
+                raise ValueError(item)
+            return item * 2
+
+        results = await run_concurrently(work, range(6), limit=2)
+
+        assert results[:3] == [0, 2, 4]
+        assert isinstance(results[3], ValueError)
+        assert results[4:] == [8, 10]
+        assert most_running == 2
+
+    def test_jwt_expiry(self):
+        """Test a JWT's exp claim is read without verifying the token"""
+        payload = base64.urlsafe_b64encode(json.dumps({"exp": 1700000000}).encode())
+        token = f"header.{payload.decode().rstrip('=')}.signature"
+        assert jwt_expiry(token) == 1700000000
+        assert jwt_expiry("not a token") is None
+
+    def test_url_expiry(self):
+        """Test the expiry of signed stream URLs is found"""
+        url = "https://example.com/a.m3u8?hdnea=exp=1700000000~acl=/*~hmac=abc"
+        assert url_expiry(url) == 1700000000
+        assert url_expiry("https://example.com/a.m3u8") is None